@@ -0,0 +1,441 @@
+"""
+Measures the collector's loop, listing services and generating and writing
+the router and ui ConfigMaps, against a fake Kubernetes API serving synthetic
+services, for an increasing number of services.
+
+The fake API pages the services as the real one does, answering service
+lists with metadata only, and keeps the ConfigMaps written in memory. For
+each number of services, the collector runs in its own process, so that its
+peak RSS is measured apart from the fake API's and the other runs', over
+three loops: the first, writing every ConfigMap, a steady one, where nothing
+changed, and one after a service was added. With --check, results are
+compared with the thresholds in collector_thresholds.json, exiting with an
+error on a regression. Run with:
+
+    python -m benchmarks.collector --services 1000,10000,100000 --check
+"""
+
+import argparse
+import base64
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pykube
+
+from openapi_collector.collector import PortCache, Spec, collect_specs
+from openapi_collector.config_gen import (
+    ROUTER_MODES,
+    ConfigOptions,
+    build_router_configmaps,
+    build_ui_configmaps,
+)
+from openapi_collector.metrics import PHASE_DURATION
+from openapi_collector.reconcile import ConfigMapReconciler
+
+THRESHOLDS = os.path.join(os.path.dirname(__file__), "collector_thresholds.json")
+LOOPS = ["first", "steady", "changed"]
+PHASES = ["list", "render", "write"]
+SERVICES_PER_NAMESPACE = 50
+# ConfigMaps larger than this are rejected by the API server
+CONFIGMAP_MAX_BYTES = 1024 * 1024
+
+
+def build_service(i, collect_ratio, named_port_ratio, rng):
+    """
+    Builds a service, collected with the given probability, with its port
+    annotated by name (resolved from the service's ports) with the given
+    probability, and by number otherwise. A few collected services also
+    have a path annotation.
+    """
+    metadata = {
+        "name": f"svc-{i}",
+        "namespace": f"ns-{i // SERVICES_PER_NAMESPACE}",
+        "uid": f"uid-{i}",
+        "resourceVersion": "1",
+        "labels": {"app": f"svc-{i}"},
+        "annotations": {},
+    }
+    if rng.random() < collect_ratio:
+        metadata["annotations"]["openapi/collect"] = "true"
+        port = "http" if rng.random() < named_port_ratio else "8080"
+        metadata["annotations"]["openapi/port"] = port
+        if i % 10 == 0:
+            metadata["annotations"]["openapi/path"] = "/api/openapi.json"
+
+    return {
+        "kind": "Service",
+        "apiVersion": "v1",
+        "metadata": metadata,
+        "spec": {"ports": [{"name": "http", "port": 8080, "protocol": "TCP"}]},
+    }
+
+
+def build_services(services, collect_ratio, named_port_ratio, seed=0):
+    rng = random.Random(seed)
+    return [
+        build_service(i, collect_ratio, named_port_ratio, rng) for i in range(services)
+    ]
+
+
+def merge_patch(obj, patch):
+    for key, value in patch.items():
+        if value is None:
+            obj.pop(key, None)
+        elif isinstance(value, dict) and isinstance(obj.get(key), dict):
+            merge_patch(obj[key], value)
+        else:
+            obj[key] = value
+
+
+class FakeKubeAPI(BaseHTTPRequestHandler):
+    """
+    Serves the parts of the Kubernetes API the collector uses, from the
+    services and ConfigMaps of its server, counting the bytes written to it.
+    """
+
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately, which would otherwise wait
+    # for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def send_json(self, obj, status=200):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def not_found(self):
+        self.send_json({"kind": "Status", "code": 404, "reason": "NotFound"}, 404)
+
+    def read_json(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with self.server.lock:
+            self.server.written += len(body)
+        return json.loads(body)
+
+    def route(self):
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+        return parts, parse_qs(url.query)
+
+    def do_GET(self):
+        parts, query = self.route()
+
+        if parts == ["bench", "written"]:
+            # returns, and resets, the bytes written so far
+            with self.server.lock:
+                written, self.server.written = self.server.written, 0
+            return self.send_json({"written": written})
+
+        if parts == ["api", "v1", "services"]:
+            return self.list_services(query)
+
+        if parts[:3] == ["api", "v1", "namespaces"] and len(parts) == 6:
+            _, _, _, namespace, kind, name = parts
+            if kind == "services":
+                obj = self.server.services_by_name.get((namespace, name))
+            else:
+                obj = self.server.configmaps.get(name)
+            return self.send_json(obj) if obj is not None else self.not_found()
+
+        if parts[:3] == ["api", "v1", "namespaces"] and parts[4:] == ["configmaps"]:
+            with self.server.lock:
+                items = list(self.server.configmaps.values())
+            return self.send_json({"kind": "ConfigMapList", "items": items})
+
+        self.not_found()
+
+    def list_services(self, query):
+        limit = int(query.get("limit", ["0"])[0]) or len(self.server.services)
+        start = int(query.get("continue", ["0"])[0])
+        end = start + limit
+
+        items = self.server.services[start:end]
+        if "as=PartialObjectMetadataList" in self.headers.get("Accept", ""):
+            items = [
+                {"kind": "PartialObjectMetadata", "metadata": obj["metadata"]}
+                for obj in items
+            ]
+
+        metadata = {"resourceVersion": "1"}
+        if end < len(self.server.services):
+            metadata["continue"] = str(end)
+        self.send_json({"kind": "ServiceList", "metadata": metadata, "items": items})
+
+    def do_POST(self):
+        parts, _ = self.route()
+
+        if parts == ["bench", "add-service"]:
+            self.server.add_service()
+            return self.send_json({})
+
+        obj = self.read_json()
+        with self.server.lock:
+            self.server.configmaps[obj["metadata"]["name"]] = obj
+        self.send_json(obj, 201)
+
+    def do_PATCH(self):
+        parts, _ = self.route()
+        patch = self.read_json()
+        with self.server.lock:
+            obj = self.server.configmaps.get(parts[-1])
+            if obj is not None:
+                merge_patch(obj, patch)
+        return self.send_json(obj) if obj is not None else self.not_found()
+
+    def do_DELETE(self):
+        parts, _ = self.route()
+        with self.server.lock:
+            obj = self.server.configmaps.pop(parts[-1], None)
+        return self.send_json(obj) if obj is not None else self.not_found()
+
+    def log_message(self, *args):
+        pass
+
+
+def fake_api(services, collect_ratio, named_port_ratio, seed=0):
+    """
+    Starts a fake Kubernetes API holding the given number of services.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeKubeAPI)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.written = 0
+    server.configmaps = {}
+
+    server.services = build_services(services, collect_ratio, named_port_ratio, seed)
+    server.services_by_name = {
+        (obj["metadata"]["namespace"], obj["metadata"]["name"]): obj
+        for obj in server.services
+    }
+
+    def add_service():
+        obj = build_service(len(server.services), 1, 0, random.Random(0))
+        server.services.append(obj)
+        server.services_by_name[
+            (obj["metadata"]["namespace"], obj["metadata"]["name"])
+        ] = obj
+
+    server.add_service = add_service
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def phase_seconds():
+    return {
+        phase: PHASE_DURATION.labels(phase)._sum.get() for phase in PHASES + ["probe"]
+    }
+
+
+def configmap_bytes(obj):
+    """
+    Returns the size of a ConfigMap as limited by the API server: that of its
+    data and its decoded binaryData.
+    """
+    data = obj.get("data") or {}
+    binary_data = obj.get("binaryData") or {}
+    return sum(len(value.encode()) for value in data.values()) + sum(
+        len(base64.b64decode(value)) for value in binary_data.values()
+    )
+
+
+def measure(url, shards, router_mode):
+    """
+    Runs the collector's loops against the fake API at url, served by the
+    parent process, returning the wall time, time per phase, peak RSS and
+    bytes written of each, and the size of the largest ConfigMap. Peak RSS
+    is the whole process' so far, as limited in the collector's container.
+    """
+    api = pykube.HTTPClient(pykube.KubeConfig.from_url(url))
+    options = ConfigOptions(shards=shards, router_mode=router_mode)
+    reconciler = ConfigMapReconciler()
+    port_cache = PortCache()
+
+    results = {}
+    for loop in LOOPS:
+        if loop == "changed":
+            api.session.post(f"{url}/bench/add-service").raise_for_status()
+
+        phases = phase_seconds()
+        start = time.perf_counter()
+        collect_specs(api, reconciler, options=options, port_cache=port_cache)
+        seconds = time.perf_counter() - start
+
+        written = api.session.get(f"{url}/bench/written").json()["written"]
+        results[loop] = {
+            "seconds": seconds,
+            "phases": {
+                phase: after - phases[phase]
+                for (phase, after) in phase_seconds().items()
+            },
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "written_mb": written / 1024 / 1024,
+        }
+
+    resp = api.get(url="configmaps", namespace=api.config.namespace)
+    configmaps = resp.json()["items"]
+    largest = max(configmap_bytes(obj) for obj in configmaps)
+    results["max_configmap_mb"] = largest / 1024 / 1024
+
+    # the ConfigMaps' contents, as listed by the ui ConfigMaps' manifests
+    specs = []
+    for obj in configmaps:
+        for key, value in obj["data"].items():
+            if key.startswith("specs"):
+                specs.extend(json.loads(value)["specs"])
+    results["specs"] = len(specs)
+
+    return results
+
+
+def time_builds(services, shards, router_mode):
+    """
+    Returns the time taken to build the router and ui ConfigMaps alone, for
+    the specs of the given services.
+    """
+    specs = [
+        Spec(
+            obj["metadata"]["name"],
+            obj["metadata"]["namespace"],
+            8080,
+            obj["metadata"]["annotations"].get("openapi/path", "/"),
+        )
+        for obj in services
+        if "openapi/collect" in obj["metadata"]["annotations"]
+    ]
+    options = ConfigOptions(shards=shards, router_mode=router_mode)
+    cluster_domain = (
+        options.cluster_domain if options.router_mode == "dynamic" else None
+    )
+
+    start = time.perf_counter()
+    build_router_configmaps(None, specs, options)
+    router = time.perf_counter() - start
+
+    start = time.perf_counter()
+    build_ui_configmaps(None, specs, options.shards, cluster_domain)
+    ui = time.perf_counter() - start
+
+    return {"router": router, "ui": ui}
+
+
+def run(services, args):
+    server = fake_api(services, args.collect_ratio, args.named_port_ratio)
+    try:
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.collector"]
+            + ["--measure", f"http://127.0.0.1:{server.server_port}"]
+            + ["--shards", str(args.shards), "--router-mode", args.router_mode],
+            check=True,
+            capture_output=True,
+        )
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    results = json.loads(out.stdout)
+    results["builds"] = time_builds(server.services, args.shards, args.router_mode)
+    return results
+
+
+def regressions(services, router_mode, results, thresholds):
+    """
+    Returns the measurements exceeding the thresholds given for the number of
+    services and router mode.
+    """
+    failed = []
+    limits = thresholds.get(router_mode, {}).get(str(services), {})
+    for loop, loop_limits in limits.items():
+        for name, limit in loop_limits.items():
+            value = results[loop][name]
+            if value > limit:
+                failed.append(
+                    f"{services} services, {loop} loop: {name} {value:.2f} > {limit}"
+                )
+    return failed
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--services", default="1000,10000,100000")
+    parser.add_argument(
+        "--collect-ratio",
+        type=float,
+        default=0.5,
+        help="Share of the services annotated to be collected",
+    )
+    parser.add_argument(
+        "--named-port-ratio",
+        type=float,
+        default=0.1,
+        help="Share of the collected services whose port is annotated by name",
+    )
+    parser.add_argument("--shards", type=int, default=1)
+    parser.add_argument("--router-mode", choices=ROUTER_MODES, default="locations")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Fail if a measurement exceeds its threshold",
+    )
+    parser.add_argument("--thresholds", default=THRESHOLDS)
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    args = parser.parse_args(args)
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.shards, args.router_mode)))
+        return
+
+    with open(args.thresholds) as f:
+        thresholds = json.load(f)
+
+    print(
+        f"{'services':>8} {'specs':>7} {'loop':>8} {'wall':>10} {'list':>10} "
+        f"{'render':>10} {'write':>10} {'peak rss':>10} {'written':>10}"
+    )
+    failed = []
+    for services in [int(services) for services in args.services.split(",")]:
+        results = run(services, args)
+        for loop in LOOPS:
+            result = results[loop]
+            phases = result["phases"]
+            print(
+                f"{services:>8} {results['specs']:>7} {loop:>8} "
+                f"{result['seconds'] * 1000:>8.0f}ms "
+                f"{phases['list'] * 1000:>8.0f}ms {phases['render'] * 1000:>8.0f}ms "
+                f"{phases['write'] * 1000:>8.0f}ms "
+                f"{result['peak_rss_mb']:>8.1f}MB {result['written_mb']:>8.2f}MB"
+            )
+
+        builds = results["builds"]
+        print(
+            f"{'':>8} {'':>7} {'builds':>8} router {builds['router'] * 1000:.0f}ms, "
+            f"ui {builds['ui'] * 1000:.0f}ms, "
+            f"largest ConfigMap {results['max_configmap_mb']:.2f}MB"
+            + (
+                " (too large, use more --shards)"
+                if results["max_configmap_mb"] * 1024 * 1024 > CONFIGMAP_MAX_BYTES
+                else ""
+            )
+        )
+
+        if args.check:
+            failed += regressions(services, args.router_mode, results, thresholds)
+
+    for failure in failed:
+        print(f"Regression: {failure}", file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
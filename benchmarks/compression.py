@@ -0,0 +1,84 @@
+"""
+Measures response bytes and CPU time per spec request, for uncompressed
+responses, compressing each response (as a gzip-ing proxy in front would),
+and serving the cached compressed variants.
+
+    python -m benchmarks.compression --sizes 1,10
+"""
+
+import argparse
+import gzip
+import time
+from unittest.mock import MagicMock
+
+from benchmarks.rewrite import build_spec
+from openapi_proxy.compress import GZIP_LEVEL, compress
+from openapi_proxy.main import app, spec_cache, upstream
+
+
+def serve(body):
+    """
+    Points the proxy's upstream at a fake service returning body.
+    """
+    session = MagicMock()
+
+    def get(**kwargs):
+        response = MagicMock(status_code=200, headers={})
+        response.content = body
+        return response
+
+    session.get = get
+    upstream.session = session
+    spec_cache.clear()
+
+
+def cpu_per_request(client, accept_encoding, requests, transform=None):
+    headers = {"ServerHost": "svc.ns", "Accept-Encoding": accept_encoding}
+    # the first request fills the cache
+    resp = client.get("/svc-ns/openapi.json", headers=headers)
+
+    start = time.process_time()
+    for _ in range(requests):
+        resp = client.get("/svc-ns/openapi.json", headers=headers)
+        data = transform(resp.data) if transform else resp.data
+    return len(data), (time.process_time() - start) / requests
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="1,10", help="Spec sizes in MB")
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args(args)
+
+    client = app.test_client()
+
+    print(f"{'size':>6} {'response':>22} {'bytes':>12} {'cpu/request':>12}")
+    for size in [int(size) for size in args.sizes.split(",")]:
+        body = build_spec(size, "first")
+        serve(body)
+
+        start = time.process_time()
+        variants = compress(body)
+        print(
+            f"{size:>4}MB {'compress once':>22} {'':>12} "
+            f"{(time.process_time() - start) * 1000:>10.1f}ms"
+        )
+
+        cases = [
+            ("identity", "identity", None),
+            (
+                "gzip per request",
+                "identity",
+                lambda data: gzip.compress(data, compresslevel=GZIP_LEVEL),
+            ),
+        ] + [(f"cached {encoding}", encoding, None) for encoding in variants]
+
+        for name, accept_encoding, transform in cases:
+            size_bytes, cpu = cpu_per_request(
+                client, accept_encoding, args.requests, transform
+            )
+            print(f"{size:>4}MB {name:>22} {size_bytes:>12} {cpu * 1000:>10.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
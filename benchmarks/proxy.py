@@ -0,0 +1,369 @@
+"""
+Load tests getting specs through the proxy, directly and through the router,
+from stub backends serving synthetic specs of increasing size.
+
+Each run starts the proxy, served by gunicorn as in its image, in its own
+process, so that its peak RSS is measured alone, and concurrent clients
+request the specs of --services services, at random, for --duration seconds.
+Requests are sent to the proxy as the router sends them (direct), and, with
+nginx on the PATH, through the router's nginx.conf with the config generated
+by the collector (router). Each is measured with a warm cache, serving the
+specs from the cache, and a cold one, with --cache-ttl=0 and backends sending
+no validators, so that every request gets the spec from its backend and
+rewrites it. Results can be saved as a baseline, and compared with one,
+exiting with an error when throughput or p99 latency regressed by more than
+--max-regression percent. Run with:
+
+    python -m benchmarks.proxy --sizes 1KB,1MB,50MB --latency 50 --clients 16
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.router import NAMESPACE, Router, percentile, stub_server
+from openapi_collector.collector import Spec
+
+PATHS = ["direct", "router"]
+# The proxy's arguments, and whether backends send an ETag, for each cache
+CACHES = {
+    "warm": ([], True),
+    "revalidate": (["--cache-ttl=0"], True),
+    "cold": (["--cache-ttl=0"], False),
+}
+UNITS = {"KB": 1024, "MB": 1024 * 1024}
+
+
+def parse_size(size):
+    """
+    Returns the number of bytes of a size such as 1KB or 50MB.
+    """
+    return int(size[:-2]) * UNITS[size[-2:].upper()]
+
+
+def build_spec(size):
+    """
+    Builds a spec of roughly size bytes.
+    """
+    operation = {
+        "summary": "Get a thing",
+        "parameters": [
+            {"name": "id", "in": "path", "required": True, "schema": {"type": "string"}}
+        ],
+        "responses": {"200": {"description": "OK"}},
+    }
+    count = max(1, size // len(json.dumps({"/things/0/{id}": {"get": operation}})))
+
+    spec = {
+        "openapi": "3.0.0",
+        "info": {"title": "Benchmark", "version": "1.0.0"},
+        "servers": [{"url": "/api"}],
+        "paths": {f"/things/{i}/{{id}}": {"get": operation} for i in range(count)},
+    }
+    return json.dumps(spec).encode()
+
+
+class BackendHandler(BaseHTTPRequestHandler):
+    """
+    Serves the server's spec at any path, after its latency, and answers
+    revalidations with 304 when the server has an ETag.
+    """
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+
+        if self.server.etag and self.headers.get("If-None-Match") == self.server.etag:
+            self.send_response(304)
+            self.send_header("ETag", self.server.etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.server.spec)))
+        if self.server.etag:
+            self.send_header("ETag", self.server.etag)
+        self.end_headers()
+        self.wfile.write(self.server.spec)
+
+    def log_message(self, *args):
+        pass
+
+
+def backend_server(spec, latency, etag=True):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), BackendHandler)
+    server.daemon_threads = True
+    server.spec = spec
+    server.etag = f'"{len(spec)}"' if etag else None
+    server.latency = latency
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def free_port():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), BaseHTTPRequestHandler)
+    port = server.server_port
+    server.server_close()
+    return port
+
+
+class Proxy:
+    """
+    The proxy, served by gunicorn in its own process.
+    """
+
+    def __init__(self, args):
+        self.port = free_port()
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "openapi_proxy", "--port", str(self.port)] + args,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", self.port)
+                conn.request("GET", "/healthz")
+                if conn.getresponse().status == 200:
+                    return
+            except OSError:
+                time.sleep(0.1)
+        self.stop()
+        raise RuntimeError("The proxy did not start")
+
+    def peak_rss_mb(self):
+        """
+        Returns the peak RSS of the gunicorn arbiter and its workers.
+        """
+        pids = [self.process.pid]
+        with open(f"/proc/{self.process.pid}/task/{self.process.pid}/children") as f:
+            pids += [int(pid) for pid in f.read().split()]
+
+        peak = 0
+        for pid in pids:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        peak += int(line.split()[1])
+        return peak / 1024
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+def client(port, paths, headers, stop, results):
+    """
+    Requests random paths over a keep-alive connection until stop is set,
+    recording the latency, success and cache status of each request. The
+    connection is reopened after an error.
+    """
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    while not stop.is_set():
+        path = random.choice(paths)
+        start = time.perf_counter()
+        try:
+            conn.request("GET", path, headers=headers)
+            resp = conn.getresponse()
+            while resp.read(1024 * 1024):
+                pass
+            status = resp.status
+        except (http.client.HTTPException, OSError):
+            status = None
+            conn.close()
+        latency = time.perf_counter() - start
+
+        if status == 200:
+            results.append((latency, True, resp.headers.get("X-Cache-Status")))
+        else:
+            results.append((latency, False, None))
+    conn.close()
+
+
+def load(port, paths, headers, clients, duration):
+    """
+    Runs the clients against port for duration seconds, after requesting
+    every path once.
+    """
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    for path in paths:
+        conn.request("GET", path, headers=headers)
+        conn.getresponse().read()
+    conn.close()
+
+    stop = threading.Event()
+    results = []
+    threads = [
+        threading.Thread(target=client, args=(port, paths, headers, stop, results))
+        for _ in range(clients)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for (latency, _, _) in results]
+    ok = sum(1 for (_, success, _) in results if success)
+    hits = sum(1 for (_, _, status) in results if status in {"hit", "coalesced"})
+    return {
+        "rps": len(results) / elapsed,
+        "p50": percentile(latencies, 0.5),
+        "p99": percentile(latencies, 0.99),
+        "errors": 1 - ok / len(results),
+        "hits": hits / max(ok, 1),
+    }
+
+
+def run(path, size, cache, args):
+    specs = [
+        Spec(f"svc-{i}", NAMESPACE, 8000, f"/svc-{i}") for i in range(args.services)
+    ]
+    paths = [
+        f"/{spec.name}-{spec.namespace}/{spec.name}/openapi.json" for spec in specs
+    ]
+    headers = {"Accept-Encoding": "gzip"}
+    cache_args, etag = CACHES[cache]
+    backend = backend_server(
+        build_spec(parse_size(size)), args.latency / 1000, etag=etag
+    )
+
+    prefix = tempfile.mkdtemp()
+    # nginx workers run as an unprivileged user when started as root
+    os.chmod(prefix, 0o755)
+    proxy_args = ["--threads", str(args.threads)] + cache_args + args.proxy_arg
+    if path == "router" and args.router_mode == "dynamic":
+        proxy_args += ["--routes", os.path.join(prefix, "routes.json")]
+
+    proxy = Proxy(proxy_args)
+    try:
+        if path == "direct":
+            headers["ServerHost"] = f"http://127.0.0.1:{backend.server_port}"
+            result = load(proxy.port, paths, headers, args.clients, args.duration)
+
+        else:
+            ui = stub_server("ui")
+            router = Router(
+                prefix, free_port(), ui.server_port, proxy.port, backend.server_port
+            )
+            router.write_config(specs, args.router_mode)
+            router.nginx()
+            try:
+                # wait for the workers to start
+                time.sleep(0.5)
+                result = load(router.port, paths, headers, args.clients, args.duration)
+            finally:
+                router.nginx("-s", "quit")
+
+        result["proxy_rss_mb"] = proxy.peak_rss_mb()
+    finally:
+        proxy.stop()
+        backend.shutdown()
+        shutil.rmtree(prefix)
+
+    return result
+
+
+def regressions(results, baseline, max_regression):
+    """
+    Returns the runs whose throughput dropped, or p99 latency rose, by more
+    than max_regression percent from the baseline.
+    """
+    failed = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        rps = (baseline[key]["rps"] - result["rps"]) / baseline[key]["rps"] * 100
+        p99 = (result["p99"] - baseline[key]["p99"]) / baseline[key]["p99"] * 100
+        if rps > max_regression:
+            failed.append(f"{key}: rps {rps:.0f}% lower than the baseline")
+        if p99 > max_regression:
+            failed.append(f"{key}: p99 {p99:.0f}% higher than the baseline")
+    return failed
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="1KB,100KB,1MB,10MB,50MB")
+    parser.add_argument("--paths", default=",".join(PATHS))
+    parser.add_argument(
+        "--caches",
+        default="warm,cold",
+        help=f"Comma separated, of {', '.join(CACHES)}",
+    )
+    parser.add_argument("--services", type=int, default=10)
+    parser.add_argument(
+        "--latency", type=float, default=0, help="Backend latency in milliseconds"
+    )
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per run")
+    parser.add_argument("--threads", type=int, default=32, help="Proxy threads")
+    parser.add_argument(
+        "--proxy-arg",
+        action="append",
+        default=[],
+        help="Extra argument for the proxy, e.g. --proxy-arg=--cache-ttl=0",
+    )
+    parser.add_argument(
+        "--router-mode", choices=["locations", "map", "dynamic"], default="locations"
+    )
+    parser.add_argument("--save-baseline", help="Save the results to this file")
+    parser.add_argument("--baseline", help="Compare the results with this file")
+    parser.add_argument("--max-regression", type=float, default=20, help="Percent")
+    args = parser.parse_args(args)
+
+    paths = args.paths.split(",")
+    if "router" in paths and shutil.which("nginx") is None:
+        print("nginx is not installed, only measuring the direct path")
+        paths.remove("router")
+
+    print(
+        f"{'path':>8} {'size':>6} {'cache':>10} {'rps':>8} {'p50':>10} {'p99':>10} "
+        f"{'errors':>7} {'hits':>7} {'proxy rss':>10}"
+    )
+    results = {}
+    runs = itertools.product(args.sizes.split(","), args.caches.split(","), paths)
+    for size, cache, path in runs:
+        result = run(path, size, cache, args)
+        results[f"{path} {size} {cache}"] = result
+        print(
+            f"{path:>8} {size:>6} {cache:>10} {result['rps']:>8.0f} "
+            f"{result['p50'] * 1000:>8.1f}ms {result['p99'] * 1000:>8.1f}ms "
+            f"{result['errors']:>7.1%} {result['hits']:>7.1%} "
+            f"{result['proxy_rss_mb']:>8.0f}MB"
+        )
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        failed = regressions(results, baseline, args.max_regression)
+        for failure in failed:
+            print(f"Regression: {failure}", file=sys.stderr)
+        if failed:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
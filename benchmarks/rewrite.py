@@ -0,0 +1,150 @@
+"""
+Compares the streaming servers rewrite with parsing and serializing whole
+specs, for synthetic specs of increasing size.
+
+Specs are built, and each measurement run, in their own processes, so that
+peak RSS is not affected by the others (it is inherited across exec). Run with:
+
+    python -m benchmarks.rewrite --sizes 1,10,50
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from openapi_proxy.rewrite import replace_servers, rewrite_servers
+
+PLACEMENTS = ["first", "last", "missing"]
+
+
+def build_spec(size_mb, placement):
+    """
+    Builds a spec of roughly size_mb megabytes, with its servers placed
+    before all other members, after them, or missing. Descriptions span
+    several lines and include non-ASCII text, so the spec is full of escapes
+    as in real specs.
+    """
+    operation = {
+        "summary": "Get a thing",
+        "description": "Returns the thing.\n\n"
+        + "Les détails de la chose, « entre guillemets ».\n" * 5
+        + '```json\n{"id": "[1]"}\n```',
+        "parameters": [
+            {"name": "id", "in": "path", "required": True, "schema": {"type": "string"}}
+        ],
+        "responses": {
+            "200": {
+                "description": "OK",
+                "content": {
+                    "application/json": {
+                        "schema": {"$ref": "#/components/schemas/Thing"}
+                    }
+                },
+            }
+        },
+    }
+    operation_size = len(json.dumps(operation))
+    count = max(1, size_mb * 1024 * 1024 // operation_size)
+
+    spec = {}
+    servers = [{"url": "https://example.com/api", "description": "production"}]
+    if placement == "first":
+        spec["servers"] = servers
+    spec["openapi"] = "3.0.0"
+    spec["info"] = {"title": "Benchmark", "version": "1.0.0"}
+    spec["paths"] = {f"/things/{i}/{{id}}": {"get": operation} for i in range(count)}
+    spec["components"] = {"schemas": {"Thing": {"type": "object"}}}
+    if placement == "last":
+        spec["servers"] = servers
+
+    return json.dumps(spec, indent=1).encode()
+
+
+def full_parse(body, base_path):
+    return json.dumps(replace_servers(json.loads(body), base_path)).encode()
+
+
+def measure(method, path):
+    """
+    Runs one rewrite of the spec at path, returning its latency and the peak
+    RSS it added on top of the raw body.
+    """
+    with open(path, "rb") as f:
+        body = f.read()
+
+    rewrite = rewrite_servers if method == "streaming" else full_parse
+
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    result = rewrite(body, "svc-ns")
+    latency = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    assert json.loads(result)["servers"][0]["url"].startswith("/svc-ns")
+    return {"latency": latency, "peak_rss_kb": peak - baseline}
+
+
+def run(method, path, repeat):
+    results = []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.rewrite", "--measure", method, path],
+            check=True,
+            capture_output=True,
+        )
+        results.append(json.loads(out.stdout))
+
+    return {
+        "latency": min(result["latency"] for result in results),
+        "peak_rss_kb": min(result["peak_rss_kb"] for result in results),
+    }
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="1,10,20,50", help="Spec sizes in MB")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--build", nargs=3, help=argparse.SUPPRESS)
+    parser.add_argument("--measure", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args(args)
+
+    if args.build:
+        size, placement, path = args.build
+        with open(path, "wb") as f:
+            f.write(build_spec(int(size), placement))
+        return
+
+    if args.measure:
+        print(json.dumps(measure(*args.measure)))
+        return
+
+    print(f"{'size':>6} {'servers':>8} {'method':>10} {'latency':>10} {'peak rss':>10}")
+    for size in [int(size) for size in args.sizes.split(",")]:
+        for placement in PLACEMENTS:
+            fd, path = tempfile.mkstemp(suffix=".json")
+            os.close(fd)
+
+            try:
+                subprocess.run(
+                    [sys.executable, "-m", "benchmarks.rewrite", "--build"]
+                    + [str(size), placement, path],
+                    check=True,
+                )
+                for method in ["full", "streaming"]:
+                    result = run(method, path, args.repeat)
+                    print(
+                        f"{size:>4}MB {placement:>8} {method:>10} "
+                        f"{result['latency'] * 1000:>8.1f}ms "
+                        f"{result['peak_rss_kb'] / 1024:>8.1f}MB"
+                    )
+            finally:
+                os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
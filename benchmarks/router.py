@@ -0,0 +1,309 @@
+"""
+Measures nginx config test time, reload time and request routing latency of
+the router, with the config generated in locations, map and dynamic mode, for
+an increasing number of services. Routing latency is measured again while
+services are added and removed at --churn changes per second, each change
+being reloaded (locations and map mode) or picked up by the proxy's routing
+table (dynamic mode).
+
+Needs nginx on the PATH. The router's nginx.conf is run from a temporary
+prefix, with the ui and every service served by local stub servers, and the
+proxy's routes served by the proxy app.
+
+    python -m benchmarks.router --services 100,1000,10000 --churn 5
+"""
+
+import argparse
+import http.client
+import itertools
+import logging
+import os
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock
+
+from werkzeug.serving import make_server
+
+from openapi_collector.collector import Spec
+from openapi_collector.config_gen import (
+    ConfigOptions,
+    build_router_configmaps,
+    build_ui_configmaps,
+)
+from openapi_proxy import main as proxy
+from openapi_proxy.routes import RouteTable
+
+NGINX_CONF = os.path.join(
+    os.path.dirname(__file__), "..", "docker", "router", "nginx.conf"
+)
+NAMESPACE = "bench"
+MODES = ["locations", "map", "dynamic"]
+BACKEND = re.compile(rf"[a-z0-9-]+\.{NAMESPACE}(\.svc\.cluster\.local)?:\d+")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = self.server.name.encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def stub_server(name):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.name = name
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def proxy_server():
+    """
+    Serves the proxy app, whose routing table is set per run.
+    """
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, proxy.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class Router:
+    """
+    The router's nginx, running from a temporary prefix.
+    """
+
+    def __init__(self, prefix, port, ui_port, proxy_port, backend_port):
+        self.prefix = prefix
+        self.port = port
+        self.backend_port = backend_port
+
+        os.makedirs(os.path.join(prefix, "conf.d"))
+        os.makedirs(os.path.join(prefix, "logs"))
+        os.makedirs(os.path.join(prefix, "www"))
+
+        with open(NGINX_CONF) as f:
+            conf = f.read()
+        conf = conf.replace("localhost:8080", f"127.0.0.1:{ui_port}")
+        conf = conf.replace("localhost:5000", f"127.0.0.1:{proxy_port}")
+        conf = conf.replace("listen            80;", f"listen 127.0.0.1:{port};")
+        conf = conf.replace("/www/data/", os.path.join(prefix, "www") + "/")
+
+        with open(os.path.join(prefix, "nginx.conf"), "w") as f:
+            f.write(conf)
+        with open(os.path.join(prefix, "resolver.conf"), "w") as f:
+            f.write("resolver 127.0.0.1 valid=10s;\n")
+
+    def nginx(self, *args):
+        return subprocess.run(
+            ["nginx", "-p", self.prefix, "-c", "nginx.conf"]
+            + ["-g", f"pid {self.prefix}/nginx.pid;"]
+            + list(args),
+            check=True,
+            capture_output=True,
+        )
+
+    def write_config(self, specs, mode):
+        """
+        Writes the router config, and the proxy's routes, for the specs, with
+        every service pointed at the stub backend, as the benchmark has no
+        cluster DNS. Files are replaced atomically, as in a ConfigMap volume.
+        """
+        conf_dir = os.path.join(self.prefix, "conf.d")
+        for filename in os.listdir(conf_dir):
+            os.unlink(os.path.join(conf_dir, filename))
+
+        options = ConfigOptions(router_mode=mode)
+        for cm in build_router_configmaps(MagicMock(), specs, options):
+            for filename, data in cm.obj["data"].items():
+                self.write(os.path.join(conf_dir, filename), data)
+
+        if mode == "dynamic":
+            (cm,) = build_ui_configmaps(
+                MagicMock(), specs, cluster_domain="cluster.local"
+            )
+            self.write(
+                os.path.join(self.prefix, "routes.json"), cm.obj["data"]["routes.json"]
+            )
+
+    def write(self, path, data):
+        data = BACKEND.sub(f"127.0.0.1:{self.backend_port}", data)
+        with open(f"{path}.tmp", "w") as f:
+            f.write(data)
+        os.rename(f"{path}.tmp", path)
+
+    def apply(self, mode):
+        """
+        Makes nginx route by the config last written.
+        """
+        if mode != "dynamic":
+            self.nginx("-s", "reload")
+
+    def get(self, conn, path):
+        conn.request("GET", path)
+        resp = conn.getresponse()
+        return resp.read()
+
+    def test_time(self):
+        start = time.perf_counter()
+        self.nginx("-t")
+        return time.perf_counter() - start
+
+    def reload_time(self, specs, mode, new_spec):
+        """
+        Returns the time from applying the config with one more service,
+        until requests for it are routed to its backend.
+        """
+        self.write_config(specs + [new_spec], mode)
+        path = f"/{new_spec.name}-{new_spec.namespace}/things"
+
+        start = time.perf_counter()
+        self.apply(mode)
+        while True:
+            conn = http.client.HTTPConnection("127.0.0.1", self.port)
+            if self.get(conn, path) == b"backend":
+                return time.perf_counter() - start
+            conn.close()
+            time.sleep(0.001)
+
+    def routing_latencies(self, specs, requests):
+        """
+        Returns the latencies of requests to random services, and the number
+        of requests that failed, over a keep-alive connection that is
+        reopened when nginx closes it.
+        """
+        conn = http.client.HTTPConnection("127.0.0.1", self.port)
+        latencies = []
+        errors = 0
+        for _ in range(requests):
+            spec = random.choice(specs)
+            path = f"/{spec.name}-{spec.namespace}/things"
+
+            start = time.perf_counter()
+            try:
+                body = self.get(conn, path)
+            except (http.client.HTTPException, OSError):
+                body = None
+                conn.close()
+            latencies.append(time.perf_counter() - start)
+            if body != b"backend":
+                errors += 1
+
+        conn.close()
+        return latencies, errors
+
+    def churn(self, specs, mode, rate, stop):
+        """
+        Adds a service, and removes the oldest one added, rate times per
+        second, until stop is set.
+        """
+        added = []
+        for i in itertools.count():
+            if stop.wait(1 / rate):
+                return
+
+            added.append(Spec(f"churn-{i}", NAMESPACE, 8000, "/"))
+            if len(added) > 10:
+                added.pop(0)
+            self.write_config(specs + added, mode)
+            self.apply(mode)
+
+
+def percentile(latencies, p):
+    latencies = sorted(latencies)
+    return latencies[int(len(latencies) * p)]
+
+
+def run(services, mode, requests, churn, ports):
+    specs = [Spec(f"svc-{i}", NAMESPACE, 8000, "/") for i in range(services)]
+    new_spec = Spec("svc-new", NAMESPACE, 8000, "/")
+
+    prefix = tempfile.mkdtemp()
+    # nginx workers run as an unprivileged user when started as root
+    os.chmod(prefix, 0o755)
+    try:
+        router = Router(prefix, *ports)
+        proxy.route_table = RouteTable(os.path.join(prefix, "routes.json"))
+        router.write_config(specs, mode)
+
+        test_time = router.test_time()
+        router.nginx()
+        try:
+            # wait for the workers to start
+            time.sleep(0.5)
+            reload_time = router.reload_time(specs, mode, new_spec)
+            latencies, _ = router.routing_latencies(specs, requests)
+
+            stop = threading.Event()
+            churner = threading.Thread(
+                target=router.churn, args=(specs, mode, churn, stop)
+            )
+            churner.start()
+            try:
+                churn_latencies, churn_errors = router.routing_latencies(
+                    specs, requests
+                )
+            finally:
+                stop.set()
+                churner.join()
+        finally:
+            router.nginx("-s", "quit")
+
+    finally:
+        shutil.rmtree(prefix)
+
+    return {
+        "test": test_time,
+        "reload": reload_time,
+        "mean": statistics.mean(latencies),
+        "p99": percentile(latencies, 0.99),
+        "churn_p99": percentile(churn_latencies, 0.99),
+        "churn_errors": churn_errors,
+    }
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--services", default="100,1000,10000")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--churn", type=float, default=5, help="changes per second")
+    parser.add_argument("--port", type=int, default=18080)
+    args = parser.parse_args(args)
+
+    if shutil.which("nginx") is None:
+        parser.error("nginx is not installed")
+
+    ui = stub_server("ui")
+    proxy_app = proxy_server()
+    backend = stub_server("backend")
+    ports = (args.port, ui.server_port, proxy_app.server_port, backend.server_port)
+
+    print(
+        f"{'services':>8} {'mode':>10} {'nginx -t':>10} {'reload':>10} "
+        f"{'mean':>10} {'p99':>10} {'churn p99':>10} {'errors':>8}"
+    )
+    for services in [int(services) for services in args.services.split(",")]:
+        for mode in MODES:
+            result = run(services, mode, args.requests, args.churn, ports)
+            print(
+                f"{services:>8} {mode:>10} "
+                f"{result['test'] * 1000:>8.1f}ms {result['reload'] * 1000:>8.1f}ms "
+                f"{result['mean'] * 1e6:>8.0f}us {result['p99'] * 1e6:>8.0f}us "
+                f"{result['churn_p99'] * 1e6:>8.0f}us {result['churn_errors']:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
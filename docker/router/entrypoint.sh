@@ -1,22 +1,11 @@
 #!/bin/bash
-echo "Start nginx"
-nginx -g 'daemon off;' & 2>&1
+# nginx does not read /etc/resolv.conf, so point it at the same nameserver
+nameserver=$(awk '/^nameserver/ { print $2; exit }' /etc/resolv.conf)
+if [[ "$nameserver" == *:* ]]
+then
+        nameserver="[$nameserver]"
+fi
+echo "resolver ${nameserver:-127.0.0.11} valid=10s;" > /etc/nginx/resolver.conf
 
-echo "Wait until conf dir exists..."
-while [ ! -d /etc/nginx/conf.d ]
-do
-  sleep 2
-done
-
-while true
-do
-        inotifywait --exclude .swp -e create -e modify -e delete -e move  /etc/nginx/conf.d
-        # Check NGINX Configuration Test
-        # Only Reload NGINX If NGINX Configuration Test Pass
-        nginx -t
-        if [ $? -eq 0 ]
-        then
-                echo "Reloading Nginx Configuration"
-                service nginx reload
-        fi
-done
+# Runs nginx, and reloads it when the generated config changes
+exec python3 -m openapi_router "$@"
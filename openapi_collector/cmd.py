@@ -1,5 +1,11 @@
 import argparse
 
+from openapi_collector.config_gen import DEFAULT_CLUSTER_DOMAIN, ROUTER_MODES
+from openapi_collector import leader, probe, schedule
+from openapi_collector.discovery import DEFAULT_PAGE_SIZE
+
+DEFAULT_METRICS_PORT = 9102
+
 
 def get_parser():
     parser = argparse.ArgumentParser()
@@ -9,4 +15,131 @@ def get_parser():
     parser.add_argument(
         "--interval", type=int, help="Loop interval (default: 30s)", default=30
     )
+    parser.add_argument(
+        "--min-interval",
+        type=int,
+        help="Loop interval after the config changed (default: --interval)",
+    )
+    parser.add_argument(
+        "--max-interval",
+        type=int,
+        help="Longest loop interval, reached by doubling the interval while nothing changes, and longest "
+        f"delay before retrying after failures (default: {schedule.DEFAULT_MAX_INTERVAL_SECONDS}s)",
+        default=schedule.DEFAULT_MAX_INTERVAL_SECONDS,
+    )
+    parser.add_argument(
+        "--stretch-after",
+        type=int,
+        help="Number of loops in a row without changes after which the interval is doubled "
+        f"(default: {schedule.DEFAULT_STRETCH_AFTER})",
+        default=schedule.DEFAULT_STRETCH_AFTER,
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help=f"Port to serve Prometheus metrics on, at /metrics, 0 to disable (default: {DEFAULT_METRICS_PORT})",
+        default=DEFAULT_METRICS_PORT,
+    )
+    parser.add_argument(
+        "--watch",
+        help="Watch mode: watch services instead of polling every interval",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--label-selector",
+        help="Only discover services matching this label selector, e.g. openapi/collect=true",
+    )
+    parser.add_argument(
+        "--namespace",
+        dest="namespaces",
+        action="append",
+        help="Only discover services in this namespace (can be repeated)",
+    )
+    parser.add_argument(
+        "--exclude-namespace",
+        dest="exclude_namespaces",
+        action="append",
+        help="Do not discover services in this namespace (can be repeated)",
+    )
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        help=f"Number of services listed per API request (default: {DEFAULT_PAGE_SIZE})",
+        default=DEFAULT_PAGE_SIZE,
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        help="Number of router and ui ConfigMaps the config is split across, by namespace (default: 1)",
+        default=1,
+    )
+    parser.add_argument(
+        "--router-mode",
+        choices=ROUTER_MODES,
+        help="How the router config is generated: a location per service, map entries looked up by a "
+        "single location, or none, with requests looked up in the proxy's routing table (default: locations)",
+        default="locations",
+    )
+    parser.add_argument(
+        "--cluster-domain",
+        help=f"Cluster domain services are resolved in, in map and dynamic mode (default: {DEFAULT_CLUSTER_DOMAIN})",
+        default=DEFAULT_CLUSTER_DOMAIN,
+    )
+    parser.add_argument(
+        "--output-dir",
+        help="Also write the router and ui config into this directory, shared with the pod's other containers, "
+        "one sub-directory per ConfigMap (default: ConfigMaps only)",
+    )
+    parser.add_argument(
+        "--no-configmaps",
+        dest="configmaps",
+        help="Do not write ConfigMaps, only the output directory",
+        action="store_false",
+    )
+    parser.add_argument(
+        "--leader-elect",
+        help="Elect a leader with a Lease, so that only one replica discovers services and writes ConfigMaps",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--leader-elect-lease-name",
+        help=f"Name of the Lease (default: {leader.DEFAULT_LEASE_NAME})",
+        default=leader.DEFAULT_LEASE_NAME,
+    )
+    parser.add_argument(
+        "--leader-elect-lease-duration",
+        type=float,
+        help=f"Seconds after which a lease that was not renewed is taken over "
+        f"(default: {leader.DEFAULT_LEASE_DURATION_SECONDS}s)",
+        default=leader.DEFAULT_LEASE_DURATION_SECONDS,
+    )
+    parser.add_argument(
+        "--leader-elect-renew-interval",
+        type=float,
+        help=f"Seconds between renewals of the lease (default: {leader.DEFAULT_RENEW_INTERVAL_SECONDS}s)",
+        default=leader.DEFAULT_RENEW_INTERVAL_SECONDS,
+    )
+    parser.add_argument(
+        "--probe",
+        help="Only list specs in the ui whose service has ready endpoints, and whose spec can be fetched",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--probe-concurrency",
+        type=int,
+        help=f"Maximum number of specs probed at once (default: {probe.DEFAULT_CONCURRENCY})",
+        default=probe.DEFAULT_CONCURRENCY,
+    )
+    parser.add_argument(
+        "--probe-timeout",
+        type=float,
+        help=f"Seconds a probe may take (default: {probe.DEFAULT_TIMEOUT_SECONDS}s)",
+        default=probe.DEFAULT_TIMEOUT_SECONDS,
+    )
+    parser.add_argument(
+        "--probe-ttl",
+        type=float,
+        help=f"Seconds an available spec is not probed again for (default: {probe.DEFAULT_TTL_SECONDS}s)",
+        default=probe.DEFAULT_TTL_SECONDS,
+    )
     return parser
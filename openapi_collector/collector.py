@@ -3,7 +3,16 @@ from collections import namedtuple
 
 import pykube
 
-from openapi_collector.config_gen import build_router_configmap, build_ui_configmap
+from openapi_collector.config_gen import (
+    ROUTER_CONFIGMAP_NAME,
+    UI_CONFIGMAP_NAME,
+    ConfigOptions,
+    build_router_configmaps,
+    build_ui_configmaps,
+)
+from openapi_collector.discovery import ServiceQuery
+from openapi_collector.metrics import PHASE_DURATION, PORT_PARSE_FAILURES, SERVICES
+from openapi_collector.reconcile import ConfigMapReconciler, name_pattern
 
 logger = logging.getLogger(__name__)
 
@@ -16,8 +25,44 @@ PORT_ANNOTATION = "openapi/port"
 Spec = namedtuple("Spec", ["name", "namespace", "port", "path"])
 
 
+class PortCache:
+    """
+    The ports of services listed with their metadata only, by uid, as of the
+    resourceVersion they were fetched at, so that a service is only fetched
+    in full again to resolve its named port when it changed.
+    """
+
+    def __init__(self):
+        self._ports = {}
+
+    def ports(self, svc):
+        metadata = svc.obj["metadata"]
+        uid = metadata.get("uid")
+        cached = self._ports.get(uid)
+        if cached is not None and cached[0] == metadata.get("resourceVersion"):
+            return cached[1]
+
+        svc.reload()
+        ports = svc.obj["spec"].get("ports") or []
+        if uid is not None:
+            self._ports[uid] = (svc.obj["metadata"].get("resourceVersion"), ports)
+        return ports
+
+    def retain(self, uids):
+        """
+        Forgets the services whose uid is not in uids.
+        """
+        self._ports = {uid: self._ports[uid] for uid in uids if uid in self._ports}
+
+    def forget(self, uid):
+        self._ports.pop(uid, None)
+
+
 def should_collect(svc):
-    return svc.annotations.get(COLLECT_ANNOTATION, "false").lower() == "true"
+    value = svc.annotations.get(COLLECT_ANNOTATION) or svc.labels.get(
+        COLLECT_ANNOTATION, "false"
+    )
+    return value.lower() == "true"
 
 
 def parse_port(svc):
@@ -41,26 +86,119 @@ def parse_path(svc):
     return svc.annotations.get(PATH_ANNOTATION, "/")
 
 
-def collect_specs(api):
+def spec_from_service(svc, port_cache=None):
+    """
+    Builds the Spec for a collectable service, or returns None if the
+    service's port cannot be parsed. A service listed with its metadata only
+    is fetched in full to resolve a named port, unless port_cache has its
+    ports already.
+    """
+    port_value = svc.annotations.get(PORT_ANNOTATION, "80")
+    if "spec" not in svc.obj and not port_value.isdigit():
+        # only the metadata was listed, but resolving a port name needs the
+        # service's ports
+        svc.obj["spec"] = {"ports": (port_cache or PortCache()).ports(svc)}
+
+    path = parse_path(svc)
+    port = parse_port(svc)
+    if port is None:
+        logger.warning(f"Cannot parse port for service {svc.namespace}/{svc.name}")
+        PORT_PARSE_FAILURES.inc()
+        return None
+
+    return Spec(svc.name, svc.namespace, port, path)
+
+
+def write_configmaps(api, specs, reconciler=None, options=None, prober=None):
+    """
+    Writes the router and ui ConfigMaps for the given specs, split across
+    shards, skipping those whose data is unchanged, and deletes shards left
+    over from a different number of shards. With a prober, only the specs
+    found available are listed in the ui. Returns whether any ConfigMap was
+    written.
+    """
+    if reconciler is None:
+        reconciler = ConfigMapReconciler()
+    if options is None:
+        options = ConfigOptions()
+
+    SERVICES.labels("collected").set(len(specs))
+
+    ui_specs = specs
+    if prober is not None:
+        with PHASE_DURATION.labels("probe").time():
+            ui_specs = prober.available(api, specs)
+
+    # the routes are only served by the proxy in dynamic mode
+    cluster_domain = (
+        options.cluster_domain if options.router_mode == "dynamic" else None
+    )
+    with PHASE_DURATION.labels("render").time():
+        cms = build_router_configmaps(api, specs, options) + build_ui_configmaps(
+            api, ui_specs, options.shards, cluster_domain
+        )
+
+    with PHASE_DURATION.labels("write").time():
+        written = False
+        for cm in cms:
+            written |= reconciler.apply(cm)
+
+        reconciler.prune(
+            api, [cm.name for cm in cms], [ROUTER_CONFIGMAP_NAME, UI_CONFIGMAP_NAME]
+        )
+
+    return written
+
+
+def mirror_configmaps(api, writer):
+    """
+    Copies the ConfigMaps written by the leading replica to the writer, e.g.
+    a replica's own output directory. Returns whether anything was written.
+    """
+    prefixes = [ROUTER_CONFIGMAP_NAME, UI_CONFIGMAP_NAME]
+    pattern = name_pattern(prefixes)
+
+    with PHASE_DURATION.labels("mirror").time():
+        resp = api.get(url="configmaps", namespace=api.config.namespace)
+        api.raise_for_status(resp)
+
+        written = False
+        names = []
+        for obj in resp.json().get("items", []):
+            if pattern.match(obj["metadata"]["name"]):
+                cm = pykube.ConfigMap(api, obj)
+                written |= writer.apply(cm)
+                names.append(cm.name)
+
+        writer.prune(api, names, prefixes)
+
+    return written
+
+
+def collect_specs(
+    api, reconciler=None, query=None, options=None, prober=None, port_cache=None
+):
+    if query is None:
+        query = ServiceQuery()
+    if port_cache is None:
+        port_cache = PortCache()
+
     specs = []
-    for svc in pykube.Service.objects(api, namespace=pykube.all):
-        if should_collect(svc):
-            logger.info(f"Collecting {svc.namespace}/{svc.name}")
-
-            path = parse_path(svc)
-            port = parse_port(svc)
-            if port is None:
-                logger.warning(
-                    f"Cannot parse port for service {svc.namespace}/{svc.name}"
-                )
-                continue
-
-            specs.append(Spec(svc.name, svc.namespace, port, path))
-
-    router_cm = build_router_configmap(api, specs)
-    ui_cm = build_ui_configmap(api, specs)
-
-    for cm in [router_cm, ui_cm]:
-        if cm.exists():
-            cm.delete()
-        cm.create()
+    uids = []
+    scanned = 0
+    # services are listed a page at a time, as they are scanned
+    with PHASE_DURATION.labels("list").time():
+        for svc in query.services(api):
+            scanned += 1
+            if should_collect(svc):
+                logger.info(f"Collecting {svc.namespace}/{svc.name}")
+
+                uids.append(svc.obj["metadata"].get("uid"))
+                spec = spec_from_service(svc, port_cache)
+                if spec is not None:
+                    specs.append(spec)
+
+    SERVICES.labels("scanned").set(scanned)
+    port_cache.retain(uids)
+
+    return write_configmaps(api, specs, reconciler, options, prober)
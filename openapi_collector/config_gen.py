@@ -1,4 +1,8 @@
+import base64
+import gzip
 import json
+import zlib
+from collections import namedtuple
 
 import pykube
 
@@ -6,6 +10,9 @@ import pykube
 ROUTER_CONFIGMAP_NAME = "openapi-collector-router-config"
 UI_CONFIGMAP_NAME = "openapi-collector-ui-config"
 
+# Lists the specs for the proxy to prefetch, alongside the swagger-ui config.
+SPECS_MANIFEST_KEY = "specs.json"
+
 NGINX_UPSTREAM_TMPL = """
 upstream {host} {{
   server {name}.{namespace}:{port};
@@ -23,6 +30,26 @@ location /{host} {{
 }}
 """
 
+ROUTER_MODES = ["locations", "map", "dynamic"]
+DEFAULT_CLUSTER_DOMAIN = "cluster.local"
+
+# In map mode, the router looks up the backend of a request by the first
+# segment of its path, and resolves it at request time.
+NGINX_BACKEND_MAP_TMPL = '{host} "{name}.{namespace}.svc.{cluster_domain}:{port}";\n'
+NGINX_SPEC_MAP_TMPL = '/{host}/{spec_path} "http://{name}.{namespace}:{port}";\n'
+
+# In dynamic mode, the router looks every request up in a routing table
+# served by the proxy, which re-reads it from the ui ConfigMap when it
+# changes, so the router config does not change with the services.
+NGINX_DYNAMIC_MAP = '"~^/" 1;\n'
+ROUTES_KEY = "routes.json"
+
+ConfigOptions = namedtuple(
+    "ConfigOptions",
+    ["shards", "router_mode", "cluster_domain"],
+    defaults=[1, "locations", DEFAULT_CLUSTER_DOMAIN],
+)
+
 
 def urljoin(*args):
     """
@@ -39,8 +66,65 @@ def get_spec_path(spec):
         return spec.path.lstrip("/")
 
 
-def build_router_configmap(api, specs):
-    cm_spec = {"metadata": {"name": ROUTER_CONFIGMAP_NAME}}
+def get_server_host(spec):
+    return f"http://{spec.name}.{spec.namespace}:{spec.port}"
+
+
+def shard_for(namespace, shards):
+    """
+    Returns the shard the namespace's specs are written to. The assignment
+    only depends on the namespace, so it is stable across runs and replicas.
+    """
+    return zlib.crc32(namespace.encode()) % shards
+
+
+def shard_name(name, shard, shards):
+    """
+    Returns the name of a shard's ConfigMap, which is the unsharded name when
+    there is a single shard.
+    """
+    return name if shards == 1 else f"{name}-{shard}"
+
+
+def split_specs(specs, shards):
+    sharded = [[] for _ in range(shards)]
+    for spec in specs:
+        sharded[shard_for(spec.namespace, shards)].append(spec)
+    return sharded
+
+
+def build_router_configmaps(api, specs, options=None):
+    if options is None:
+        options = ConfigOptions()
+
+    cms = []
+    for shard, shard_specs in enumerate(split_specs(specs, options.shards)):
+        name = shard_name(ROUTER_CONFIGMAP_NAME, shard, options.shards)
+        if options.router_mode == "map":
+            cm = build_router_map_configmap(
+                api, shard_specs, name, shard, options.cluster_domain
+            )
+        elif options.router_mode == "dynamic":
+            cm = build_router_dynamic_configmap(api, name, shard)
+        else:
+            cm = build_router_configmap(api, shard_specs, name=name)
+        cms.append(cm)
+
+    return cms
+
+
+def build_ui_configmaps(api, specs, shards=1, cluster_domain=None):
+    if shards == 1:
+        return [build_ui_configmap(api, specs, cluster_domain=cluster_domain)]
+
+    return [
+        build_ui_configmap(api, shard_specs, shard=shard, cluster_domain=cluster_domain)
+        for (shard, shard_specs) in enumerate(split_specs(specs, shards))
+    ]
+
+
+def build_router_configmap(api, specs, name=ROUTER_CONFIGMAP_NAME):
+    cm_spec = {"metadata": {"name": name}}
 
     cm_data = {}
 
@@ -67,19 +151,121 @@ def build_router_configmap(api, specs):
     return pykube.ConfigMap(api, cm_spec)
 
 
-def build_ui_configmap(api, specs):
-    cm_spec = {"metadata": {"name": UI_CONFIGMAP_NAME}}
+def build_router_map_configmap(
+    api,
+    specs,
+    name=ROUTER_CONFIGMAP_NAME,
+    shard=0,
+    cluster_domain=DEFAULT_CLUSTER_DOMAIN,
+):
+    """
+    Builds a router ConfigMap for map mode, holding the entries of the
+    router's backend and spec maps rather than per service blocks.
+    """
+    backends = []
+    spec_servers = []
+    for spec in specs:
+        params = dict(
+            host=f"{spec.name}-{spec.namespace}",
+            name=spec.name,
+            namespace=spec.namespace,
+            port=spec.port,
+            spec_path=get_spec_path(spec),
+            cluster_domain=cluster_domain,
+        )
+        backends.append(NGINX_BACKEND_MAP_TMPL.format(**params))
+        spec_servers.append(NGINX_SPEC_MAP_TMPL.format(**params))
 
-    urls = []
+    cm_spec = {
+        "metadata": {"name": name},
+        "data": {
+            f"{shard}-backends.map": "".join(sorted(backends)),
+            f"{shard}-specs.map": "".join(sorted(spec_servers)),
+        },
+    }
+
+    return pykube.ConfigMap(api, cm_spec)
+
+
+def build_router_dynamic_configmap(api, name=ROUTER_CONFIGMAP_NAME, shard=0):
+    """
+    Builds a router ConfigMap for dynamic mode, which only switches the
+    router to looking requests up in the proxy's routing table.
+    """
+    cm_spec = {
+        "metadata": {"name": name},
+        "data": {f"{shard}-dynamic.map": NGINX_DYNAMIC_MAP},
+    }
+
+    return pykube.ConfigMap(api, cm_spec)
+
+
+def build_routes(specs, cluster_domain=DEFAULT_CLUSTER_DOMAIN):
+    """
+    Builds the routing table the proxy answers the router's lookups from in
+    dynamic mode.
+    """
+    routes = []
     for spec in specs:
         host = f"{spec.name}-{spec.namespace}"
-        urls.append(
+        routes.append(
             {
-                "name": f"{spec.namespace}/{spec.name}",
-                "url": f"/{urljoin(host, get_spec_path(spec))}",
+                "host": host,
+                "backend": f"{spec.name}.{spec.namespace}.svc.{cluster_domain}:{spec.port}",
+                "spec_path": f"/{urljoin(host, get_spec_path(spec))}",
+                "server_host": get_server_host(spec),
             }
         )
+    routes.sort(key=lambda route: route["host"])
+
+    return json.dumps({"routes": routes})
+
+
+def build_ui_configmap(api, specs, shard=None, cluster_domain=None):
+    """
+    Builds the ui ConfigMap, or one shard of it. A shard holds a fragment of
+    the swagger-ui config, named after the shard, that the proxy merges with
+    the other shards' fragments. When a cluster domain is given, for dynamic
+    mode, the ConfigMap also holds the specs' routes.
+    """
+    if shard is not None:
+        cm_spec = {"metadata": {"name": f"{UI_CONFIGMAP_NAME}-{shard}"}}
+    else:
+        cm_spec = {"metadata": {"name": UI_CONFIGMAP_NAME}}
+
+    urls = []
+    manifest = []
+    for spec in specs:
+        host = f"{spec.name}-{spec.namespace}"
+        url = f"/{urljoin(host, get_spec_path(spec))}"
+
+        urls.append({"name": f"{spec.namespace}/{spec.name}", "url": url})
+        manifest.append({"path": url, "server_host": get_server_host(spec)})
+
+    swagger_config = json.dumps({"urls": urls})
+    if shard is not None:
+        cm_spec["data"] = {
+            f"swagger-config-{shard}.json": swagger_config,
+            f"specs-{shard}.json": json.dumps({"specs": manifest}),
+        }
+        if cluster_domain is not None:
+            cm_spec["data"][f"routes-{shard}.json"] = build_routes(
+                specs, cluster_domain
+            )
+        return pykube.ConfigMap(api, cm_spec)
 
-    cm_spec["data"] = {"swagger-config.json": json.dumps({"urls": urls})}
+    cm_spec["data"] = {
+        "swagger-config.json": swagger_config,
+        SPECS_MANIFEST_KEY: json.dumps({"specs": manifest}),
+    }
+    if cluster_domain is not None:
+        cm_spec["data"][ROUTES_KEY] = build_routes(specs, cluster_domain)
+    # served by nginx's gzip_static; mtime is fixed so that unchanged configs
+    # compress to the same bytes, and are not rewritten
+    cm_spec["binaryData"] = {
+        "swagger-config.json.gz": base64.b64encode(
+            gzip.compress(swagger_config.encode(), mtime=0)
+        ).decode()
+    }
 
     return pykube.ConfigMap(api, cm_spec)
@@ -0,0 +1,96 @@
+import pykube
+
+# Ask for metadata only, falling back to full objects on API servers that do
+# not support partial object metadata.
+METADATA_LIST_ACCEPT = (
+    "application/json;as=PartialObjectMetadataList;g=meta.k8s.io;v=v1,"
+    "application/json"
+)
+METADATA_WATCH_ACCEPT = (
+    "application/json;as=PartialObjectMetadata;g=meta.k8s.io;v=v1,application/json"
+)
+
+DEFAULT_PAGE_SIZE = 500
+
+
+class ServiceQuery:
+    """
+    Describes which services are discovered. Filtering is done server side
+    where the API allows it, and services are listed page by page, fetching
+    only their metadata.
+    """
+
+    def __init__(
+        self,
+        label_selector=None,
+        namespaces=None,
+        exclude_namespaces=None,
+        page_size=DEFAULT_PAGE_SIZE,
+    ):
+        self.label_selector = label_selector
+        self.namespaces = sorted(set(namespaces or []))
+        self.exclude_namespaces = sorted(set(exclude_namespaces or []))
+        self.page_size = page_size
+
+    def params(self):
+        params = {}
+        if self.label_selector:
+            params["labelSelector"] = self.label_selector
+        if self.exclude_namespaces:
+            params["fieldSelector"] = ",".join(
+                f"metadata.namespace!={namespace}"
+                for namespace in self.exclude_namespaces
+            )
+        return params
+
+    def allows(self, namespace):
+        if self.namespaces and namespace not in self.namespaces:
+            return False
+        return namespace not in self.exclude_namespaces
+
+    def watch_namespace(self):
+        """
+        Returns the namespace a single list and watch can be scoped to, or
+        None if all namespaces have to be listed and filtered client side.
+        """
+        if len(self.namespaces) == 1:
+            return self.namespaces[0]
+        return None
+
+    def list_pages(self, api, namespace=None):
+        """
+        Lists the services in the given namespace, or all namespaces, yielding
+        the items and resourceVersion of each page.
+        """
+        params = self.params()
+        if self.page_size:
+            params["limit"] = self.page_size
+
+        while True:
+            resp = api.get(
+                url="services",
+                namespace=namespace,
+                params=params,
+                headers={"Accept": METADATA_LIST_ACCEPT},
+            )
+            api.raise_for_status(resp)
+            data = resp.json()
+            metadata = data.get("metadata") or {}
+
+            yield data.get("items") or [], metadata.get("resourceVersion")
+
+            if not metadata.get("continue"):
+                return
+            params = dict(params, **{"continue": metadata["continue"]})
+
+    def services(self, api):
+        """
+        Yields the matching services, one page at a time.
+        """
+        for namespace in self.namespaces or [None]:
+            if namespace is not None and not self.allows(namespace):
+                continue
+
+            for items, _ in self.list_pages(api, namespace):
+                for obj in items:
+                    yield pykube.Service(api, obj)
@@ -1,6 +1,17 @@
+import logging
 import os
 
 import pykube
+import requests
+from pykube.exceptions import HTTPError
+
+logger = logging.getLogger(__name__)
+
+
+SERVICE_ACCOUNT_TOKEN_PATH = "/var/run/secrets/kubernetes.io/serviceaccount/token"
+
+AUTH_BACKOFF_BASE_SECONDS = 1
+AUTH_BACKOFF_MAX_SECONDS = 300
 
 
 def get_kube_api():
@@ -12,3 +23,66 @@ def get_kube_api():
 
     api = pykube.HTTPClient(config)
     return api
+
+
+def credentials_mtime():
+    """
+    Returns the modification time of the file the credentials are read from,
+    the (projected) service account token, or the kubeconfig file.
+    """
+    for path in [
+        SERVICE_ACCOUNT_TOKEN_PATH,
+        os.path.expanduser(os.getenv("KUBECONFIG", "~/.kube/config")),
+    ]:
+        try:
+            return os.stat(path).st_mtime
+        except FileNotFoundError:
+            continue
+
+    return None
+
+
+def is_auth_error(e):
+    if isinstance(e, HTTPError):
+        return e.code == 401
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        return e.response.status_code == 401
+    return False
+
+
+class KubeClient:
+    """
+    Keeps a single HTTPClient, and with it its pool of keep-alive connections,
+    across loops. The client is only rebuilt when the credentials file changes
+    on disk, or after an authentication failure.
+    """
+
+    def __init__(self):
+        self._api = None
+        self._mtime = None
+        self._auth_failures = 0
+
+    def get(self):
+        mtime = credentials_mtime()
+        if self._api is None or mtime != self._mtime:
+            if self._api is not None:
+                logger.info("Credentials changed, reloading Kubernetes client")
+            self._api = get_kube_api()
+            self._mtime = mtime
+
+        return self._api
+
+    def auth_failed(self):
+        """
+        Drops the client so that it is rebuilt from fresh credentials, and
+        returns how long to back off before trying again.
+        """
+        self._api = None
+        self._auth_failures += 1
+        return min(
+            AUTH_BACKOFF_BASE_SECONDS * 2 ** (self._auth_failures - 1),
+            AUTH_BACKOFF_MAX_SECONDS,
+        )
+
+    def reset_backoff(self):
+        self._auth_failures = 0
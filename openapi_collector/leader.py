@@ -0,0 +1,200 @@
+import datetime
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+import pykube
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE_NAME = "openapi-collector"
+DEFAULT_LEASE_DURATION_SECONDS = 8
+DEFAULT_RENEW_INTERVAL_SECONDS = 2
+
+
+class Lease(pykube.objects.NamespacedAPIObject):
+    version = "coordination.k8s.io/v1"
+    endpoint = "leases"
+    kind = "Lease"
+
+
+def micro_time():
+    return datetime.datetime.now(datetime.timezone.utc).strftime(
+        "%Y-%m-%dT%H:%M:%S.%fZ"
+    )
+
+
+def default_identity():
+    return os.getenv("POD_NAME") or socket.gethostname()
+
+
+class LeaderElector:
+    """
+    Elects a single leader among the collector's replicas with a Lease. The
+    leader renews the lease every renew_interval seconds, and steps down if it
+    could not for lease_duration seconds. Other replicas take the lease over
+    once it has not changed for its duration, timed by their own clock, so
+    clock skew between nodes does not matter.
+    """
+
+    def __init__(
+        self,
+        client,
+        name=DEFAULT_LEASE_NAME,
+        identity=None,
+        lease_duration=DEFAULT_LEASE_DURATION_SECONDS,
+        renew_interval=DEFAULT_RENEW_INTERVAL_SECONDS,
+        clock=time.monotonic,
+    ):
+        self.client = client
+        self.name = name
+        self.identity = identity or default_identity()
+        self.lease_duration = lease_duration
+        self.renew_interval = renew_interval
+        self.clock = clock
+
+        self._observed = None
+        self._observed_at = None
+        self._renewed_at = None
+        self._leading = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def is_leader(self):
+        return self._leading.is_set()
+
+    def wait_leading(self, timeout):
+        """
+        Waits up to timeout seconds for this replica to lead, returning
+        whether it does.
+        """
+        return self._leading.wait(timeout)
+
+    def _lease(self, api, obj=None):
+        return Lease(api, obj or {"metadata": {"name": self.name}})
+
+    def try_acquire(self):
+        """
+        Acquires the lease if it is free or expired, or renews it if held.
+        Returns whether this replica holds the lease.
+        """
+        api = self.client.get()
+        now = self.clock()
+
+        resp = api.get(**self._lease(api).api_kwargs())
+        if resp.status_code == 404:
+            lease = self._lease(api)
+            lease.obj["spec"] = self._spec({}, now)
+            try:
+                lease.create()
+            except pykube.exceptions.HTTPError as e:
+                if e.code == 409:
+                    return False
+                raise
+            return self._acquired(lease.obj, now)
+
+        api.raise_for_status(resp)
+        obj = resp.json()
+        spec = obj.get("spec", {})
+
+        observed = (spec.get("holderIdentity"), spec.get("renewTime"))
+        if observed != self._observed:
+            self._observed = observed
+            self._observed_at = now
+
+        holder = spec.get("holderIdentity")
+        duration = spec.get("leaseDurationSeconds") or self.lease_duration
+        if holder and holder != self.identity and now - self._observed_at < duration:
+            return False
+
+        obj["spec"] = self._spec(spec, now)
+        # the update fails with a conflict if the lease changed since it was
+        # read, e.g. when another replica took it over meanwhile
+        resp = api.put(**self._lease(api, obj).api_kwargs(data=json.dumps(obj)))
+        if resp.status_code == 409:
+            return False
+        api.raise_for_status(resp)
+
+        return self._acquired(resp.json(), now)
+
+    def _spec(self, spec, now):
+        spec = dict(spec)
+        if spec.get("holderIdentity") != self.identity:
+            logger.info(f"Acquiring lease {self.name} as {self.identity}")
+            spec["acquireTime"] = micro_time()
+            spec["leaseTransitions"] = spec.get("leaseTransitions", -1) + 1
+        spec["holderIdentity"] = self.identity
+        spec["leaseDurationSeconds"] = int(self.lease_duration)
+        spec["renewTime"] = micro_time()
+        return spec
+
+    def _acquired(self, obj, now):
+        spec = obj.get("spec", {})
+        self._observed = (spec.get("holderIdentity"), spec.get("renewTime"))
+        self._observed_at = now
+        self._renewed_at = now
+        return True
+
+    def run_once(self):
+        try:
+            leading = self.try_acquire()
+        except Exception as e:
+            logger.warning(f"Cannot acquire or renew lease {self.name}: {e}")
+            # keep leading until the lease may have been taken over
+            leading = (
+                self.is_leader
+                and self.clock() - self._renewed_at
+                < self.lease_duration - self.renew_interval
+            )
+
+        if leading and not self.is_leader:
+            logger.info(f"Leading as {self.identity}")
+            self._leading.set()
+        elif not leading and self.is_leader:
+            logger.warning(f"Lost lease {self.name}, no longer leading")
+            self._leading.clear()
+
+    def release(self):
+        """
+        Gives the lease up, so that another replica takes over straight away.
+        """
+        if not self.is_leader:
+            return
+
+        self._leading.clear()
+        try:
+            api = self.client.get()
+            resp = api.get(**self._lease(api).api_kwargs())
+            api.raise_for_status(resp)
+            obj = resp.json()
+            if obj.get("spec", {}).get("holderIdentity") != self.identity:
+                return
+
+            obj["spec"]["holderIdentity"] = None
+            resp = api.put(**self._lease(api, obj).api_kwargs(data=json.dumps(obj)))
+            api.raise_for_status(resp)
+            logger.info(f"Released lease {self.name}")
+
+        except Exception as e:
+            logger.warning(f"Cannot release lease {self.name}: {e}")
+
+    def run(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.renew_interval)
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self.run, name="leader-elector", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.release()
@@ -1,9 +1,26 @@
 import logging
+import math
 import time
 
+from prometheus_client import start_http_server
+
 from openapi_collector import __version__, cmd, shutdown
-from openapi_collector.collector import collect_specs
-from openapi_collector.helpers import get_kube_api
+from openapi_collector.collector import (
+    PortCache,
+    collect_specs,
+    mirror_configmaps,
+    write_configmaps,
+)
+from openapi_collector.config_gen import ConfigOptions
+from openapi_collector.discovery import ServiceQuery
+from openapi_collector.helpers import KubeClient, is_auth_error
+from openapi_collector.leader import LeaderElector
+from openapi_collector.metrics import LOOP_DURATION, LOOP_OVERRUNS
+from openapi_collector.output import DirectoryWriter, MultiWriter
+from openapi_collector.probe import SpecProber
+from openapi_collector.reconcile import ConfigMapReconciler
+from openapi_collector.schedule import AdaptiveInterval
+from openapi_collector.watch import WATCH_TIMEOUT_SECONDS, ServiceWatcher
 
 logger = logging.getLogger("collector")
 
@@ -19,21 +36,277 @@ def main(args=None):
 
     logger.info(f"Collector v{__version__} started")
 
-    return run_loop(args.interval)
+    if args.metrics_port:
+        start_http_server(args.metrics_port)
+
+    query = ServiceQuery(
+        label_selector=args.label_selector,
+        namespaces=args.namespaces,
+        exclude_namespaces=args.exclude_namespaces,
+        page_size=args.page_size,
+    )
+
+    options = ConfigOptions(
+        shards=args.shards,
+        router_mode=args.router_mode,
+        cluster_domain=args.cluster_domain,
+    )
+
+    if not args.configmaps and not args.output_dir:
+        parser.error("--no-configmaps requires --output-dir")
+    if not args.configmaps and args.leader_elect:
+        parser.error("--no-configmaps cannot be used with --leader-elect")
+
+    writers = []
+    directory_writer = None
+    if args.output_dir:
+        directory_writer = DirectoryWriter(args.output_dir)
+        writers.append(directory_writer)
+    if args.configmaps:
+        writers.append(ConfigMapReconciler())
+    reconciler = MultiWriter(writers)
+
+    prober = None
+    if args.probe:
+        prober = SpecProber(
+            concurrency=args.probe_concurrency,
+            timeout=args.probe_timeout,
+            ttl=args.probe_ttl,
+        )
+
+    schedule = AdaptiveInterval(
+        args.interval,
+        min_interval=args.min_interval,
+        max_interval=args.max_interval,
+        stretch_after=args.stretch_after,
+    )
+
+    elector = None
+    if args.leader_elect:
+        elector = LeaderElector(
+            KubeClient(),
+            name=args.leader_elect_lease_name,
+            lease_duration=args.leader_elect_lease_duration,
+            renew_interval=args.leader_elect_renew_interval,
+        )
+        elector.start()
 
+    try:
+        if args.watch:
+            return run_watch(
+                args.interval,
+                query,
+                options,
+                reconciler,
+                elector,
+                directory_writer,
+                prober,
+                schedule,
+            )
 
-def run_loop(interval):
+        return run_loop(
+            args.interval,
+            query,
+            options,
+            reconciler,
+            elector,
+            directory_writer,
+            prober,
+            schedule,
+        )
+
+    finally:
+        if elector is not None:
+            elector.stop()
+
+
+def run_loop(
+    interval,
+    query,
+    options=None,
+    reconciler=None,
+    elector=None,
+    mirror=None,
+    prober=None,
+    schedule=None,
+):
+    """
+    Collects specs every interval, as adapted by schedule: stretched while
+    nothing changes, and backed off after failures. With leader election,
+    only the leading replica collects, the others copy its ConfigMaps to
+    mirror, if given.
+    """
     handler = shutdown.GracefulShutdown()
+    if reconciler is None:
+        reconciler = ConfigMapReconciler()
+    if schedule is None:
+        schedule = AdaptiveInterval(interval)
+    # the ports of services with named ports, kept across loops
+    port_cache = PortCache()
+    client = KubeClient()
+    was_leading = False
     while True:
+        start = time.monotonic()
         try:
-            api = get_kube_api()
-            collect_specs(api)
+            api = client.get()
+            changed = False
+            leading = elector is None or elector.is_leader
+            if leading and not was_leading:
+                # another leader may have written the ConfigMaps meanwhile
+                reconciler.forget()
+            was_leading = leading
+            if leading:
+                changed = collect_specs(
+                    api, reconciler, query, options, prober, port_cache
+                )
+            elif mirror is not None:
+                changed = mirror_configmaps(api, mirror)
+            client.reset_backoff()
+            delay = schedule.succeeded(changed)
 
         except Exception as e:
             logger.exception("Failed to collect specs: %s", e)
+            delay = schedule.failed()
+            if is_auth_error(e):
+                delay = max(delay, client.auth_failed())
+
+        # the interval collections are now scheduled at, which may differ
+        # from --interval
+        observe_loop(time.monotonic() - start, schedule.interval)
 
         if handler.shutdown_now:
             return
 
         with handler.safe_exit():
-            time.sleep(interval)
+            wait(delay, elector)
+
+
+def observe_loop(duration, interval):
+    LOOP_DURATION.observe(duration)
+    if duration > interval:
+        logger.warning(
+            f"Collecting specs took {duration:.1f}s, longer than the {interval}s interval"
+        )
+        LOOP_OVERRUNS.inc()
+
+
+def wait(delay, elector=None):
+    """
+    Sleeps for delay seconds, or until this replica starts leading.
+    """
+    if elector is not None and not elector.is_leader:
+        elector.wait_leading(delay)
+    else:
+        time.sleep(delay)
+
+
+def watch_timeout(prober):
+    """
+    Returns how long a watch may last, which is until the prober's first
+    result expires.
+    """
+    due = prober.next_due() if prober is not None else None
+    if due is None:
+        return WATCH_TIMEOUT_SECONDS
+    return min(max(math.ceil(due), 1), WATCH_TIMEOUT_SECONDS)
+
+
+def run_watch(
+    interval,
+    query,
+    options=None,
+    reconciler=None,
+    elector=None,
+    mirror=None,
+    prober=None,
+    schedule=None,
+):
+    """
+    Keeps the configuration up to date by watching services, only writing it
+    when the collected specs change. With a prober, a watch also ends when a
+    probe result expires, to probe the specs again, so that services become
+    available without any other change. Failures are retried as backed off
+    by schedule. With leader election, only the leading replica watches, the
+    others copy its ConfigMaps to mirror, if given, every interval, as
+    adapted by schedule.
+    """
+    handler = shutdown.GracefulShutdown()
+    watcher = ServiceWatcher(query)
+    if reconciler is None:
+        reconciler = ConfigMapReconciler()
+    if schedule is None:
+        schedule = AdaptiveInterval(interval)
+    client = KubeClient()
+    was_leading = False
+    while True:
+        try:
+            api = client.get()
+            if elector is not None and not elector.is_leader:
+                was_leading = False
+                changed = False
+                if mirror is not None:
+                    changed = mirror_configmaps(api, mirror)
+                delay = schedule.succeeded(changed)
+
+                if handler.shutdown_now:
+                    return
+
+                with handler.safe_exit():
+                    wait(delay, elector)
+                continue
+
+            if not was_leading:
+                # another leader may have written the ConfigMaps meanwhile,
+                # and services were not watched while following
+                reconciler.forget()
+                watcher.restart()
+                was_leading = True
+
+            watcher.timeout = watch_timeout(prober)
+            watch_ends = time.monotonic() + watcher.timeout
+            changes = watcher.changes(api)
+            while True:
+                # nothing is written while waiting for events, so it is safe
+                # to exit straight away
+                with handler.safe_exit():
+                    specs = next(changes, None)
+
+                if specs is None:
+                    break
+                if elector is not None and not elector.is_leader:
+                    logger.info("No longer leading, stopped watching services")
+                    changes.close()
+                    break
+
+                write_configmaps(api, specs, reconciler, options, prober)
+
+                if handler.shutdown_now:
+                    return
+
+                if time.monotonic() + watch_timeout(prober) < watch_ends:
+                    # a spec is due to be probed before the watch ends
+                    changes.close()
+                    break
+
+            if prober is not None and (elector is None or elector.is_leader):
+                write_configmaps(
+                    api, watcher.index.specs(), reconciler, options, prober
+                )
+
+            client.reset_backoff()
+            schedule.succeeded(True)
+
+        except Exception as e:
+            logger.exception("Failed to watch services: %s", e)
+            delay = schedule.failed()
+            if is_auth_error(e):
+                delay = max(delay, client.auth_failed())
+
+            if handler.shutdown_now:
+                return
+
+            with handler.safe_exit():
+                time.sleep(delay)
+
+        if handler.shutdown_now:
+            return
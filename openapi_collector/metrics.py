@@ -0,0 +1,57 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+# Listing thousands of services can take tens of seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+CONFIGMAP_WRITES = Counter(
+    "openapi_collector_configmap_writes_total",
+    "ConfigMap writes, by whether the write was applied, skipped as unchanged, or deleted a stale shard",
+    ["configmap", "result"],
+)
+
+FILE_WRITES = Counter(
+    "openapi_collector_file_writes_total",
+    "Files written to the output directory, by whether the file was written, skipped as unchanged, or deleted",
+    ["directory", "result"],
+)
+
+PROBES = Counter(
+    "openapi_collector_probes_total",
+    "Spec probes, by whether the spec was available, its service had no ready endpoints, or fetching it failed",
+    ["result"],
+)
+
+PHASE_DURATION = Histogram(
+    "openapi_collector_phase_duration_seconds",
+    "Time spent in each phase of collecting specs: listing services, probing specs, rendering the config, "
+    "writing it, or mirroring the leader's",
+    ["phase"],
+    buckets=DURATION_BUCKETS,
+)
+
+LOOP_DURATION = Histogram(
+    "openapi_collector_loop_duration_seconds",
+    "Time taken by each iteration of the collect loop",
+    buckets=DURATION_BUCKETS,
+)
+
+LOOP_OVERRUNS = Counter(
+    "openapi_collector_loop_overruns_total",
+    "Iterations of the collect loop that took longer than the interval",
+)
+
+SERVICES = Gauge(
+    "openapi_collector_services",
+    "Services seen by the last collection, by whether they were scanned, or collected",
+    ["state"],
+)
+
+PORT_PARSE_FAILURES = Counter(
+    "openapi_collector_port_parse_failures_total",
+    "Collected services whose port annotation could not be resolved to a port",
+)
+
+INTERVAL = Gauge(
+    "openapi_collector_interval_seconds",
+    "Seconds until the next collection, stretched while nothing changes, or backed off after failures",
+)
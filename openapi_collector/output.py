@@ -0,0 +1,130 @@
+import base64
+import logging
+import os
+import re
+
+from openapi_collector.metrics import FILE_WRITES
+from openapi_collector.reconcile import configmap_data
+
+logger = logging.getLogger(__name__)
+
+SHARD_SUFFIX = re.compile(r"-\d+$")
+
+
+def configmap_files(cm):
+    """
+    Returns the files of a ConfigMap, by name, as they appear when it is
+    mounted.
+    """
+    data = configmap_data(cm.obj)
+    files = {key: value.encode() for (key, value) in data["data"].items()}
+    files.update(
+        {key: base64.b64decode(value) for (key, value) in data["binaryData"].items()}
+    )
+    return files
+
+
+def write_atomic(path, content):
+    """
+    Writes content to path through a temporary file, so that readers only
+    ever see the old or the new content.
+    """
+    directory, name = os.path.split(path)
+    tmp_path = os.path.join(directory, f".{name}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+class DirectoryWriter:
+    """
+    Writes the ConfigMaps' files into a directory shared with the pod's other
+    containers, e.g. an emptyDir, which they see straight away instead of
+    after kubelet's next ConfigMap sync. Each ConfigMap's files are written to
+    a sub-directory named after it, without its shard number, so all shards
+    of a ConfigMap share a directory. Files are only written when changed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._written = {}
+
+    def apply(self, cm):
+        """
+        Writes the ConfigMap's changed files. Returns whether anything was
+        written.
+        """
+        directory = SHARD_SUFFIX.sub("", cm.name)
+        os.makedirs(os.path.join(self.path, directory), exist_ok=True)
+
+        written = False
+        for name, content in configmap_files(cm).items():
+            path = os.path.join(self.path, directory, name)
+            self._written.setdefault(directory, set()).add(name)
+
+            try:
+                with open(path, "rb") as f:
+                    unchanged = f.read() == content
+            except FileNotFoundError:
+                unchanged = False
+
+            if unchanged:
+                FILE_WRITES.labels(directory, "skipped").inc()
+                continue
+
+            logger.info(f"Writing {directory}/{name}")
+            write_atomic(path, content)
+            FILE_WRITES.labels(directory, "written").inc()
+            written = True
+
+        return written
+
+    def prune(self, api, names, prefixes):
+        """
+        Deletes the files in the prefixes' directories that were not written
+        since the last prune, i.e. that no ConfigMap has anymore.
+        """
+        for directory in prefixes:
+            kept = self._written.get(directory, set())
+            try:
+                existing = os.listdir(os.path.join(self.path, directory))
+            except FileNotFoundError:
+                continue
+
+            for name in existing:
+                if name not in kept:
+                    logger.info(f"Deleting stale {directory}/{name}")
+                    os.unlink(os.path.join(self.path, directory, name))
+                    FILE_WRITES.labels(directory, "deleted").inc()
+
+        self._written = {}
+
+    def forget(self):
+        """
+        Files are always compared with those on disk, so there is nothing to
+        forget.
+        """
+
+
+class MultiWriter:
+    """
+    Applies ConfigMaps with each of several writers, e.g. to a directory and
+    to the Kubernetes API.
+    """
+
+    def __init__(self, writers):
+        self.writers = writers
+
+    def apply(self, cm):
+        written = False
+        for writer in self.writers:
+            written |= writer.apply(cm)
+        return written
+
+    def prune(self, api, names, prefixes):
+        for writer in self.writers:
+            writer.prune(api, names, prefixes)
+
+    def forget(self):
+        for writer in self.writers:
+            writer.forget()
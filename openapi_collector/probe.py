@@ -0,0 +1,133 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from openapi_collector.config_gen import get_server_host, get_spec_path
+from openapi_collector.metrics import PROBES
+
+logger = logging.getLogger(__name__)
+
+# The Kubernetes client keeps 10 connections, more concurrent probes would
+# open connections that are thrown away
+DEFAULT_CONCURRENCY = 10
+DEFAULT_TIMEOUT_SECONDS = 3
+DEFAULT_TTL_SECONDS = 60
+
+# Unavailable specs are probed again sooner, so that new services appear
+# shortly after they become ready
+FAILURE_TTL_SECONDS = 10
+
+
+def endpoints_ready(api, spec, timeout):
+    """
+    Returns whether the spec's service has at least one ready endpoint.
+    """
+    resp = api.get(
+        url=f"endpoints/{spec.name}", namespace=spec.namespace, timeout=timeout
+    )
+    if resp.status_code == 404:
+        return False
+    api.raise_for_status(resp)
+
+    return any(subset.get("addresses") for subset in resp.json().get("subsets") or [])
+
+
+class SpecProber:
+    """
+    Checks that the specs' services have ready endpoints, and that their
+    specs can be fetched, probing up to concurrency specs at once. Results are
+    cached for ttl seconds, so only new specs, and those whose result expired,
+    are probed on each run.
+    """
+
+    def __init__(
+        self,
+        concurrency=DEFAULT_CONCURRENCY,
+        timeout=DEFAULT_TIMEOUT_SECONDS,
+        ttl=DEFAULT_TTL_SECONDS,
+        clock=time.monotonic,
+    ):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.ttl = ttl
+        self.clock = clock
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=concurrency, pool_maxsize=concurrency
+        )
+        self.session.mount("http://", adapter)
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def probe(self, api, spec):
+        """
+        Returns whether the spec is available.
+        """
+        try:
+            if not endpoints_ready(api, spec, self.timeout):
+                logger.info(
+                    f"Service {spec.namespace}/{spec.name} has no ready endpoints"
+                )
+                PROBES.labels("no-endpoints").inc()
+                return False
+
+            url = f"{get_server_host(spec)}/{get_spec_path(spec)}"
+            # the body is not needed, so it is not downloaded
+            with self.session.get(
+                url, timeout=self.timeout, stream=True, allow_redirects=False
+            ) as resp:
+                if resp.status_code >= 300:
+                    raise Exception(f"{url} returned {resp.status_code}")
+
+        except Exception as e:
+            logger.info(f"Spec of {spec.namespace}/{spec.name} is unavailable: {e}")
+            PROBES.labels("error").inc()
+            return False
+
+        PROBES.labels("ok").inc()
+        return True
+
+    def next_due(self):
+        """
+        Returns the seconds until the first cached result expires, or None if
+        nothing was probed.
+        """
+        with self._lock:
+            if not self._results:
+                return None
+            return (
+                min(expires for (_, expires) in self._results.values()) - self.clock()
+            )
+
+    def available(self, api, specs):
+        """
+        Returns the specs that are available, in the given order.
+        """
+        now = self.clock()
+        with self._lock:
+            # forget the specs that are no longer collected
+            self._results = {
+                spec: self._results[spec] for spec in specs if spec in self._results
+            }
+            due = [
+                spec
+                for spec in set(specs)
+                if spec not in self._results or self._results[spec][1] <= now
+            ]
+
+            if due:
+                with ThreadPoolExecutor(
+                    max_workers=self.concurrency, thread_name_prefix="probe"
+                ) as executor:
+                    results = executor.map(lambda spec: self.probe(api, spec), due)
+                    for spec, ok in zip(due, results):
+                        ttl = self.ttl if ok else FAILURE_TTL_SECONDS
+                        self._results[spec] = (ok, now + ttl)
+
+                logger.info(f"Probed {len(due)} specs in {self.clock() - now:.1f}s")
+
+            return [spec for spec in specs if self._results[spec][0]]
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import logging
+import re
+import time
+
+import pykube
+
+from openapi_collector.metrics import CONFIGMAP_WRITES
+
+logger = logging.getLogger(__name__)
+
+
+# How long the hash of applied data is trusted before it is checked against
+# the live object again, so that out of band changes are eventually repaired.
+RESYNC_SECONDS = 300
+
+DATA_FIELDS = ["data", "binaryData"]
+
+
+def data_hash(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+def configmap_data(obj):
+    return {field: obj.get(field) or {} for field in DATA_FIELDS}
+
+
+def data_patch(live_data, data):
+    """
+    Builds a JSON merge patch turning live_data into data, where removed keys
+    are set to None.
+    """
+    patch = {key: value for key, value in data.items() if live_data.get(key) != value}
+    patch.update({key: None for key in live_data if key not in data})
+    return patch
+
+
+def name_pattern(prefixes):
+    """
+    Matches the names of ConfigMaps named after one of the prefixes,
+    optionally followed by a shard number.
+    """
+    return re.compile(
+        "^(" + "|".join(re.escape(prefix) for prefix in prefixes) + r")(-\d+)?$"
+    )
+
+
+class ConfigMapReconciler:
+    """
+    Writes ConfigMaps only when their data has changed, remembering a hash of
+    the data last applied to each ConfigMap.
+    """
+
+    def __init__(self, resync_seconds=RESYNC_SECONDS):
+        self.resync_seconds = resync_seconds
+        self._applied = {}
+        self._kept = None
+
+    def forget(self):
+        """
+        Forgets the data applied so far, so that every ConfigMap is checked
+        against the live object again, e.g. after another replica may have
+        written them.
+        """
+        self._applied = {}
+        self._kept = None
+
+    def apply(self, cm):
+        """
+        Creates or patches the given ConfigMap if its data differs from the
+        live object. Returns whether anything was written.
+        """
+        name = cm.name
+        data = configmap_data(cm.obj)
+        new_hash = data_hash(data)
+
+        applied_hash, applied_at = self._applied.get(name, (None, 0))
+        if applied_hash == new_hash and (
+            time.monotonic() - applied_at < self.resync_seconds
+        ):
+            CONFIGMAP_WRITES.labels(name, "skipped").inc()
+            return False
+
+        written = self._write(cm, data, new_hash)
+        CONFIGMAP_WRITES.labels(name, "applied" if written else "skipped").inc()
+
+        self._applied[name] = (new_hash, time.monotonic())
+        return written
+
+    def _write(self, cm, data, new_hash):
+        resp = cm.api.get(**cm.api_kwargs())
+        if resp.status_code == 404:
+            logger.info(f"Creating ConfigMap {cm.name}")
+            cm.create()
+            return True
+
+        cm.api.raise_for_status(resp)
+        live_data = configmap_data(resp.json())
+        if data_hash(live_data) == new_hash:
+            logger.debug(f"ConfigMap {cm.name} is up to date")
+            return False
+
+        logger.info(f"Updating ConfigMap {cm.name}")
+        cm.patch(
+            {
+                field: data_patch(live_data[field], data[field])
+                for field in DATA_FIELDS
+                if live_data[field] != data[field]
+            }
+        )
+        return True
+
+    def prune(self, api, names, prefixes):
+        """
+        Deletes the ConfigMaps named after one of the prefixes, optionally
+        followed by a shard number, that are not in names. These are left
+        behind when the number of shards changes, so the ConfigMaps are only
+        listed when names differ from those of the last prune.
+        """
+        names = set(names)
+        if names == self._kept:
+            return
+
+        pattern = name_pattern(prefixes)
+
+        resp = api.get(url="configmaps", namespace=api.config.namespace)
+        api.raise_for_status(resp)
+
+        for obj in resp.json().get("items", []):
+            name = obj["metadata"]["name"]
+            if pattern.match(name) and name not in names:
+                logger.info(f"Deleting stale ConfigMap {name}")
+                pykube.ConfigMap(api, obj).delete()
+                self._applied.pop(name, None)
+                CONFIGMAP_WRITES.labels(name, "deleted").inc()
+
+        self._kept = names
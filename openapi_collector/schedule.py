@@ -0,0 +1,68 @@
+import logging
+import random
+
+from openapi_collector.metrics import INTERVAL
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_INTERVAL_SECONDS = 300
+DEFAULT_STRETCH_AFTER = 3
+
+
+class AdaptiveInterval:
+    """
+    Decides how long to wait before the next collection. After a change,
+    collections run every min_interval seconds; once stretch_after
+    collections in a row changed nothing, the interval doubles, up to
+    max_interval. Failures are retried with exponential backoff and full
+    jitter, so that collectors failing together do not retry together.
+    """
+
+    def __init__(
+        self,
+        interval,
+        min_interval=None,
+        max_interval=DEFAULT_MAX_INTERVAL_SECONDS,
+        stretch_after=DEFAULT_STRETCH_AFTER,
+        uniform=random.uniform,
+    ):
+        self.min_interval = interval if min_interval is None else min_interval
+        self.max_interval = max(max_interval, self.min_interval)
+        self.stretch_after = stretch_after
+        self.uniform = uniform
+
+        self.interval = min(max(interval, self.min_interval), self.max_interval)
+        self.unchanged = 0
+        self.failures = 0
+
+    def succeeded(self, changed):
+        """
+        Returns the delay after a collection that succeeded, and changed the
+        config or not.
+        """
+        self.failures = 0
+        if changed:
+            self.unchanged = 0
+            self.interval = self.min_interval
+        else:
+            self.unchanged += 1
+            if self.unchanged >= self.stretch_after:
+                self.unchanged = 0
+                interval = min(self.interval * 2, self.max_interval)
+                if interval != self.interval:
+                    logger.debug(f"Nothing changed, collecting every {interval}s")
+                self.interval = interval
+
+        INTERVAL.set(self.interval)
+        return self.interval
+
+    def failed(self):
+        """
+        Returns the delay after a failed collection.
+        """
+        self.failures += 1
+        cap = min(self.min_interval * 2 ** self.failures, self.max_interval)
+        delay = self.uniform(0, cap)
+
+        INTERVAL.set(delay)
+        return delay
@@ -20,5 +20,7 @@ class GracefulShutdown:
     @contextlib.contextmanager
     def safe_exit(self):
         self.safe_to_exit = True
-        yield
-        self.safe_to_exit = False
+        try:
+            yield
+        finally:
+            self.safe_to_exit = False
@@ -0,0 +1,210 @@
+import json
+import logging
+
+import pykube
+from pykube.exceptions import HTTPError
+
+from openapi_collector.collector import PortCache, should_collect, spec_from_service
+from openapi_collector.discovery import METADATA_WATCH_ACCEPT, ServiceQuery
+from openapi_collector.metrics import PHASE_DURATION, SERVICES
+
+logger = logging.getLogger(__name__)
+
+
+# Server side timeout of a single watch request, after which the watch is
+# resumed from the last seen resourceVersion.
+WATCH_TIMEOUT_SECONDS = 300
+
+
+class ResourceExpired(Exception):
+    """
+    Raised when the resourceVersion a watch was started from is too old
+    (410 Gone), meaning the services have to be listed again.
+    """
+
+
+class ServiceIndex:
+    """
+    In-memory index of the collectable services, keyed by namespace and name,
+    along with the ports of those with named ports, while they are indexed.
+    """
+
+    def __init__(self):
+        self._specs = {}
+        self.port_cache = PortCache()
+
+    def specs(self):
+        return [self._specs[key] for key in sorted(self._specs)]
+
+    def update(self, svc):
+        """
+        Adds, updates or removes the given service. Returns whether the set
+        of collected specs changed.
+        """
+        key = (svc.namespace, svc.name)
+
+        spec = spec_from_service(svc, self.port_cache) if should_collect(svc) else None
+        if spec is None:
+            return self.remove(svc)
+
+        if self._specs.get(key) == spec:
+            return False
+
+        logger.info(f"Collecting {svc.namespace}/{svc.name}")
+        self._specs[key] = spec
+        return True
+
+    def remove(self, svc):
+        self.port_cache.forget(svc.obj["metadata"].get("uid"))
+        if self._specs.pop((svc.namespace, svc.name), None) is None:
+            return False
+
+        logger.info(f"No longer collecting {svc.namespace}/{svc.name}")
+        return True
+
+    def replace(self, services):
+        """
+        Replaces the whole index with the given services. Returns whether the
+        set of collected specs changed.
+        """
+        old_specs = self._specs
+        self._specs = {}
+        uids = []
+        for svc in services:
+            if should_collect(svc):
+                uids.append(svc.obj["metadata"].get("uid"))
+                spec = spec_from_service(svc, self.port_cache)
+                if spec is not None:
+                    self._specs[(svc.namespace, svc.name)] = spec
+        self.port_cache.retain(uids)
+
+        return old_specs != self._specs
+
+
+def list_services(api, query):
+    """
+    Lists the services matching the query, returning them along with the
+    resourceVersion of the list.
+    """
+    services = []
+    resource_version = None
+    for items, resource_version in query.list_pages(api, query.watch_namespace()):
+        for obj in items:
+            svc = pykube.Service(api, obj)
+            if query.allows(svc.namespace):
+                services.append(svc)
+
+    return services, resource_version
+
+
+def watch_services(api, query, resource_version, timeout=WATCH_TIMEOUT_SECONDS):
+    """
+    Watches the services matching the query, starting at the given
+    resourceVersion. Yields (event type, object) tuples until the server
+    closes the watch.
+    """
+    params = query.params()
+    params.update(
+        {
+            "watch": "true",
+            "resourceVersion": resource_version,
+            "allowWatchBookmarks": "true",
+            "timeoutSeconds": timeout,
+        }
+    )
+
+    # the client side read timeout must outlast the server side timeout
+    resp = api.get(
+        url="services",
+        namespace=query.watch_namespace(),
+        params=params,
+        headers={"Accept": METADATA_WATCH_ACCEPT},
+        stream=True,
+        timeout=timeout + 30,
+    )
+    if resp.status_code == 410:
+        raise ResourceExpired(resource_version)
+    api.raise_for_status(resp)
+
+    # closing the generator early must also close the streamed connection
+    try:
+        for line in resp.iter_lines():
+            if not line:
+                continue
+
+            event = json.loads(line)
+            if event["type"] == "ERROR":
+                status = event["object"]
+                if status.get("code") == 410:
+                    raise ResourceExpired(resource_version)
+                raise HTTPError(status.get("code"), status.get("message"))
+
+            yield event["type"], event["object"]
+    finally:
+        resp.close()
+
+
+class ServiceWatcher:
+    """
+    Keeps a ServiceIndex up to date using a single list followed by a watch,
+    re-listing only when the watch's resourceVersion has expired.
+    """
+
+    def __init__(self, query=None, timeout=WATCH_TIMEOUT_SECONDS):
+        self.query = query or ServiceQuery()
+        self.timeout = timeout
+        self.index = ServiceIndex()
+        self.resource_version = None
+        self.listed = False
+
+    def changes(self, api):
+        """
+        Yields the collected specs every time they change, until the watch
+        is closed by the server. The first call always yields the result of
+        the initial list.
+        """
+        if self.resource_version is None:
+            changed = self.relist(api)
+            if changed or not self.listed:
+                self.listed = True
+                yield self.index.specs()
+
+        try:
+            for event_type, obj in watch_services(
+                api, self.query, self.resource_version, self.timeout
+            ):
+                self.resource_version = obj["metadata"]["resourceVersion"]
+                if event_type == "BOOKMARK":
+                    continue
+
+                svc = pykube.Service(api, obj)
+                if not self.query.allows(svc.namespace):
+                    continue
+
+                if event_type == "DELETED":
+                    changed = self.index.remove(svc)
+                else:
+                    changed = self.index.update(svc)
+
+                if changed:
+                    yield self.index.specs()
+
+        except ResourceExpired:
+            logger.info("Watch expired, services will be listed again")
+            self.resource_version = None
+
+    def restart(self):
+        """
+        Lists the services again on the next call to changes, which then
+        yields the result even if it did not change.
+        """
+        self.resource_version = None
+        self.listed = False
+
+    def relist(self, api):
+        with PHASE_DURATION.labels("list").time():
+            services, self.resource_version = list_services(api, self.query)
+            changed = self.index.replace(services)
+
+        SERVICES.labels("scanned").set(len(services))
+        return changed
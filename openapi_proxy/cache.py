@@ -0,0 +1,157 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from openapi_proxy import tracing
+from openapi_proxy.compress import compress
+
+DEFAULT_TTL_SECONDS = 60
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+def body_etag(body):
+    return hashlib.sha1(body).hexdigest()
+
+
+class CacheEntry:
+    """
+    A rewritten spec and its compressed variants, along with the validators
+    needed to revalidate it against the upstream service.
+    """
+
+    def __init__(self, body, upstream_etag=None, upstream_last_modified=None):
+        self.body = body
+        with tracing.current().phase("compress"):
+            self.variants = compress(body)
+        self.etag = body_etag(body)
+        self.upstream_etag = upstream_etag
+        self.upstream_last_modified = upstream_last_modified
+        self.fetched_at = time.monotonic()
+
+    @property
+    def size(self):
+        return len(self.body) + sum(len(variant) for variant in self.variants.values())
+
+    def encoded(self, encoding):
+        """
+        Returns the body and ETag of the variant for the given content coding,
+        or of the uncompressed body if encoding is None.
+        """
+        if encoding is None:
+            return self.body, self.etag
+        return self.variants[encoding], f"{self.etag}-{encoding}"
+
+    def age(self):
+        return time.monotonic() - self.fetched_at
+
+    def revalidated(self):
+        """
+        Marks the entry as fresh again, after the upstream service confirmed
+        it has not changed.
+        """
+        self.fetched_at = time.monotonic()
+        return self
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.entry = None
+        self.error = None
+
+
+class SpecCache:
+    """
+    Bounded, least recently used cache of rewritten specs. Entries are fresh
+    for ttl seconds, after which they are revalidated. Concurrent misses for
+    the same key are collapsed into a single load.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL_SECONDS, max_bytes=DEFAULT_MAX_BYTES):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size(self):
+        return self._size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            old_entry = self._entries.pop(key, None)
+            if old_entry is not None:
+                self._size -= old_entry.size
+
+            if entry.size > self.max_bytes:
+                return
+
+            self._entries[key] = entry
+            self._size += entry.size
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+
+    def fetch(self, key, load, max_age=None):
+        """
+        Returns a fresh entry for the key. On a miss, or when the entry is
+        stale, load is called with the stale entry (or None) and must return
+        the entry to cache. Only one load per key runs at a time; concurrent
+        callers wait for, and share, its result.
+
+        max_age, when given, is used instead of the ttl to decide whether the
+        entry is stale.
+        """
+        if max_age is None:
+            max_age = self.ttl
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.age() < max_age:
+                self._entries.move_to_end(key)
+                tracing.current().cache_status = "hit"
+                return entry
+
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            tracing.current().cache_status = "coalesced"
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.entry
+
+        try:
+            call.entry = load(entry)
+            self.put(key, call.entry)
+            return call.entry
+
+        except Exception as e:
+            call.error = e
+            raise
+
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
@@ -0,0 +1,177 @@
+import argparse
+
+from openapi_proxy import history, prefetch, search, upstream
+from openapi_proxy.cache import DEFAULT_MAX_BYTES, DEFAULT_TTL_SECONDS
+
+
+def get_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--debug", "-d", help="Debug mode: print more information", action="store_true"
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=int,
+        help=f"Seconds a cached spec is served before being revalidated (default: {DEFAULT_TTL_SECONDS}s)",
+        default=DEFAULT_TTL_SECONDS,
+    )
+    parser.add_argument(
+        "--cache-max-bytes",
+        type=int,
+        help=f"Maximum total size of the cached specs (default: {DEFAULT_MAX_BYTES})",
+        default=DEFAULT_MAX_BYTES,
+    )
+    parser.add_argument(
+        "--server",
+        choices=["gunicorn", "development"],
+        help="Server to run the proxy with (default: gunicorn)",
+        default="gunicorn",
+    )
+    parser.add_argument(
+        "--port", type=int, help="Port to listen on (default: 5000)", default=5000
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Number of worker processes, each with its own spec cache (default: 1)",
+        default=1,
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        help="Number of request handling threads per worker (default: 32)",
+        default=32,
+    )
+    parser.add_argument(
+        "--max-connections",
+        type=int,
+        help="Maximum number of concurrent connections per worker (default: 1000)",
+        default=1000,
+    )
+    parser.add_argument(
+        "--max-requests",
+        type=int,
+        help="Restart a worker after this many requests, 0 to disable (default: 0)",
+        default=0,
+    )
+    parser.add_argument(
+        "--timeout",
+        type=int,
+        help="Restart a worker that is silent for this many seconds (default: 60s)",
+        default=60,
+    )
+    parser.add_argument(
+        "--graceful-timeout",
+        type=int,
+        help="Seconds in-flight requests are given to finish on shutdown (default: 25s)",
+        default=25,
+    )
+    parser.add_argument(
+        "--keep-alive",
+        type=int,
+        help="Seconds to wait for the next request on a keep-alive connection (default: 5s)",
+        default=5,
+    )
+    parser.add_argument(
+        "--upstream-connect-timeout",
+        type=float,
+        help=f"Seconds to wait for a connection to a service (default: {upstream.DEFAULT_CONNECT_TIMEOUT}s)",
+        default=upstream.DEFAULT_CONNECT_TIMEOUT,
+    )
+    parser.add_argument(
+        "--upstream-read-timeout",
+        type=float,
+        help=f"Seconds to wait for data from a service (default: {upstream.DEFAULT_READ_TIMEOUT}s)",
+        default=upstream.DEFAULT_READ_TIMEOUT,
+    )
+    parser.add_argument(
+        "--upstream-total-timeout",
+        type=float,
+        help=f"Seconds a spec has to be fully fetched in (default: {upstream.DEFAULT_TOTAL_TIMEOUT}s)",
+        default=upstream.DEFAULT_TOTAL_TIMEOUT,
+    )
+    parser.add_argument(
+        "--upstream-pool-size",
+        type=int,
+        help=f"Keep-alive connections kept per service (default: {upstream.DEFAULT_POOL_SIZE})",
+        default=upstream.DEFAULT_POOL_SIZE,
+    )
+    parser.add_argument(
+        "--upstream-pool-hosts",
+        type=int,
+        help=f"Number of services connections are kept to (default: {upstream.DEFAULT_POOL_HOSTS})",
+        default=upstream.DEFAULT_POOL_HOSTS,
+    )
+    parser.add_argument(
+        "--prefetch-manifest",
+        help="Specs manifests written by the collector, listing the specs to prefetch, as a glob pattern "
+        "(default: no prefetching)",
+    )
+    parser.add_argument(
+        "--prefetch-interval",
+        type=float,
+        help=f"Seconds between refreshes of each prefetched spec, across all workers, keep "
+        f"times --workers below --cache-ttl "
+        f"(default: {prefetch.DEFAULT_INTERVAL_SECONDS}s)",
+        default=prefetch.DEFAULT_INTERVAL_SECONDS,
+    )
+    parser.add_argument(
+        "--prefetch-concurrency",
+        type=int,
+        help=f"Maximum number of specs prefetched at once (default: {prefetch.DEFAULT_CONCURRENCY})",
+        default=prefetch.DEFAULT_CONCURRENCY,
+    )
+    parser.add_argument(
+        "--swagger-config",
+        help="swagger-ui config fragments written by a sharded collector, as a glob pattern, "
+        "served merged at /-/swagger-config.json",
+    )
+    parser.add_argument(
+        "--search",
+        help="Index the prefetched specs' operations, tags and schemas, searchable at /-/search "
+        "(needs --prefetch-manifest)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--search-max-postings",
+        type=int,
+        help=f"Maximum number of (word, document) pairs indexed, bounding the index's memory usage "
+        f"(default: {search.DEFAULT_MAX_POSTINGS})",
+        default=search.DEFAULT_MAX_POSTINGS,
+    )
+    parser.add_argument(
+        "--merged-spec",
+        help="Merge the prefetched OpenAPI 3 specs into a single spec, served at /-/merged/openapi.json "
+        "(needs --prefetch-manifest)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--history-dir",
+        help="Directory to keep the versions of the prefetched specs in, listed and diffed at "
+        "/-/history/<name>-<namespace> (needs --prefetch-manifest)",
+    )
+    parser.add_argument(
+        "--history-max-versions",
+        type=int,
+        help=f"Versions kept per service, the oldest are deleted first (default: {history.DEFAULT_MAX_VERSIONS})",
+        default=history.DEFAULT_MAX_VERSIONS,
+    )
+    parser.add_argument(
+        "--no-metrics-by-service",
+        dest="metrics_by_service",
+        help="Do not label the proxy's phase, size and cache metrics by service, to keep the number of "
+        "series down with many services",
+        action="store_false",
+    )
+    parser.add_argument(
+        "--tracing",
+        help="Record OpenTelemetry spans of spec requests, propagated to services "
+        "(needs opentelemetry-api, and an SDK configured to export them)",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--routes",
+        help="Routes files written by a collector in dynamic router mode, as a glob pattern, "
+        "looked up by the router at /-/route",
+    )
+    return parser
@@ -0,0 +1,69 @@
+import gzip
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+# Bodies smaller than this are not worth compressing
+MIN_SIZE = 1024
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+ZSTD_LEVEL = 3
+
+
+def _compressors():
+    """
+    Returns the available compressors, by content coding, most preferred
+    first.
+    """
+    compressors = {}
+    if zstandard is not None:
+        # compressors are not thread safe, so one is created per body
+        compressors["zstd"] = lambda body: zstandard.ZstdCompressor(
+            level=ZSTD_LEVEL
+        ).compress(body)
+    if brotli is not None:
+        compressors["br"] = lambda body: brotli.compress(body, quality=BROTLI_QUALITY)
+    # mtime is fixed so that the same spec always compresses to the same bytes
+    compressors["gzip"] = lambda body: gzip.compress(
+        body, compresslevel=GZIP_LEVEL, mtime=0
+    )
+    return compressors
+
+
+COMPRESSORS = _compressors()
+
+
+def compress(body):
+    """
+    Compresses the body with every available coding, returning the variants
+    by content coding. Codings that do not make the body smaller are left
+    out.
+    """
+    if len(body) < MIN_SIZE:
+        return {}
+
+    variants = {}
+    for encoding, compressor in COMPRESSORS.items():
+        variant = compressor(body)
+        if len(variant) < len(body):
+            variants[encoding] = variant
+
+    return variants
+
+
+def negotiate(accept_encodings, variants):
+    """
+    Returns the content coding of the variant best matching the request's
+    Accept-Encoding, or None to send the body uncompressed.
+    """
+    return accept_encodings.best_match(
+        [encoding for encoding in COMPRESSORS if encoding in variants]
+    )
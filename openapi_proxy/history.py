@@ -0,0 +1,259 @@
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from openapi_proxy.merge import host_key
+from openapi_proxy.metrics import SPEC_CHANGES
+from openapi_proxy.search import HTTP_METHODS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_VERSIONS = 20
+DEFAULT_LIMIT = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS versions (
+    service TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (service, fetched_at)
+);
+CREATE INDEX IF NOT EXISTS versions_hash ON versions (hash);
+CREATE TABLE IF NOT EXISTS diffs (
+    old TEXT NOT NULL,
+    new TEXT NOT NULL,
+    diff TEXT NOT NULL,
+    PRIMARY KEY (old, new)
+);
+"""
+
+
+def _pointer(path, key):
+    key = str(key).replace("~", "~0").replace("/", "~1")
+    return f"{path}/{key}"
+
+
+def diff_values(old, new, path=""):
+    """
+    Yields the changes from old to new, as JSON pointers to the members
+    added, removed or changed. Objects are compared member by member, and
+    other values as a whole.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in old.keys() - new.keys():
+            yield {"op": "removed", "path": _pointer(path, key)}
+        for key in new.keys() - old.keys():
+            yield {"op": "added", "path": _pointer(path, key)}
+        for key in old.keys() & new.keys():
+            yield from diff_values(old[key], new[key], _pointer(path, key))
+    elif old != new:
+        yield {"op": "changed", "path": path}
+
+
+def operations(spec):
+    return {
+        f"{method.upper()} {path}"
+        for (path, path_item) in (spec.get("paths") or {}).items()
+        if isinstance(path_item, dict)
+        for method in path_item
+        if method in HTTP_METHODS
+    }
+
+
+def diff_specs(old, new):
+    """
+    Returns the structural diff of two versions of a spec: the operations
+    added and removed, and every member added, removed or changed.
+    """
+    old_operations = operations(old)
+    new_operations = operations(new)
+    return {
+        "operations": {
+            "added": sorted(new_operations - old_operations),
+            "removed": sorted(old_operations - new_operations),
+        },
+        "changes": sorted(diff_values(old, new), key=lambda change: change["path"]),
+    }
+
+
+class SpecHistory:
+    """
+    Versions of the specs, by service, kept in directory. Spec contents are
+    stored once per hash, compressed, and an SQLite index lists the versions
+    of each service by time. A version is only recorded when the spec
+    changed, at most max_versions are kept per service, and contents no
+    version refers to are deleted. Diffs are computed when first requested,
+    and stored in the index.
+    """
+
+    def __init__(self, directory, max_versions=DEFAULT_MAX_VERSIONS, clock=time.time):
+        self.directory = directory
+        self.max_versions = max_versions
+        self.clock = clock
+
+        os.makedirs(os.path.join(directory, "specs"), exist_ok=True)
+        self._db = sqlite3.connect(
+            os.path.join(directory, "index.db"),
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def _spec_path(self, spec_hash):
+        return os.path.join(
+            self.directory, "specs", spec_hash[:2], f"{spec_hash}.json.gz"
+        )
+
+    def _write_spec(self, spec_hash, body):
+        path = self._spec_path(spec_hash)
+        if os.path.exists(path):
+            return
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # each worker writes to its own temporary file
+        with tempfile.NamedTemporaryFile(
+            dir=os.path.dirname(path), suffix=".tmp", delete=False
+        ) as f:
+            f.write(gzip.compress(body, mtime=0))
+        os.replace(f.name, path)
+
+    def _delete_spec(self, spec_hash):
+        try:
+            os.unlink(self._spec_path(spec_hash))
+        except FileNotFoundError:
+            pass
+
+    def record(self, spec_path, entry):
+        """
+        Records the cached entry of the spec at spec_path as the latest
+        version of its service, if it differs from the current one. Returns
+        whether it did.
+        """
+        service = host_key(spec_path)
+        with self._lock:
+            # every worker records into the same directory, so the latest
+            # version is checked in the transaction recording the new one
+            with self._db:
+                self._db.execute("BEGIN IMMEDIATE")
+                latest = self._db.execute(
+                    "SELECT hash FROM versions WHERE service = ? ORDER BY fetched_at DESC LIMIT 1",
+                    (service,),
+                ).fetchone()
+                if latest is not None and latest[0] == entry.etag:
+                    return False
+
+                # the content is written first, so the index never refers to
+                # a missing one
+                self._write_spec(entry.etag, entry.body)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO versions VALUES (?, ?, ?)",
+                    (service, self.clock(), entry.etag),
+                )
+                # contents are deleted before other workers can record them
+                # again
+                for spec_hash in self._evict(service):
+                    self._delete_spec(spec_hash)
+
+        if latest is not None:
+            logger.info(f"Spec of {service} changed")
+            SPEC_CHANGES.inc()
+        return True
+
+    def _evict(self, service):
+        """
+        Deletes the versions of service beyond max_versions, returning the
+        hashes no version refers to anymore.
+        """
+        evicted = self._db.execute(
+            "SELECT fetched_at, hash FROM versions WHERE service = ? "
+            "ORDER BY fetched_at DESC LIMIT -1 OFFSET ?",
+            (service, self.max_versions),
+        ).fetchall()
+        self._db.executemany(
+            "DELETE FROM versions WHERE service = ? AND fetched_at = ?",
+            [(service, fetched_at) for (fetched_at, _) in evicted],
+        )
+
+        unreferenced = []
+        for spec_hash in {spec_hash for (_, spec_hash) in evicted}:
+            referenced = self._db.execute(
+                "SELECT 1 FROM versions WHERE hash = ? LIMIT 1", (spec_hash,)
+            ).fetchone()
+            if referenced is None:
+                self._db.execute(
+                    "DELETE FROM diffs WHERE old = ? OR new = ?",
+                    (spec_hash, spec_hash),
+                )
+                unreferenced.append(spec_hash)
+        return unreferenced
+
+    def versions(self, service, before=None, limit=None):
+        """
+        Returns the last limit (default DEFAULT_LIMIT) versions of service
+        recorded before the given time (by default, now), latest first.
+        """
+        if limit is None:
+            limit = DEFAULT_LIMIT
+
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT hash, fetched_at FROM versions WHERE service = ? AND fetched_at < ? "
+                "ORDER BY fetched_at DESC LIMIT ?",
+                (service, float("inf") if before is None else before, limit),
+            ).fetchall()
+        return [
+            {"hash": spec_hash, "fetched_at": fetched_at}
+            for (spec_hash, fetched_at) in rows
+        ]
+
+    def has_version(self, service, spec_hash):
+        with self._lock:
+            return (
+                self._db.execute(
+                    "SELECT 1 FROM versions WHERE service = ? AND hash = ? LIMIT 1",
+                    (service, spec_hash),
+                ).fetchone()
+                is not None
+            )
+
+    def spec(self, spec_hash):
+        """
+        Returns the content of a version.
+        """
+        with open(self._spec_path(spec_hash), "rb") as f:
+            return gzip.decompress(f.read())
+
+    def diff(self, old_hash, new_hash):
+        """
+        Returns the diff between two versions, as JSON.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT diff FROM diffs WHERE old = ? AND new = ?", (old_hash, new_hash)
+            ).fetchone()
+        if row is not None:
+            return row[0]
+
+        diff = json.dumps(
+            diff_specs(json.loads(self.spec(old_hash)), json.loads(self.spec(new_hash)))
+        )
+        with self._lock:
+            # unless either version was evicted meanwhile
+            if os.path.exists(self._spec_path(old_hash)) and os.path.exists(
+                self._spec_path(new_hash)
+            ):
+                self._db.execute(
+                    "INSERT OR REPLACE INTO diffs VALUES (?, ?, ?)",
+                    (old_hash, new_hash, diff),
+                )
+        return diff
+
+    def close(self):
+        self._db.close()
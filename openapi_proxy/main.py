@@ -2,10 +2,103 @@ import logging
 
 import requests
 from flask import Flask, jsonify, request
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from openapi_proxy import cmd, tracing
+from openapi_proxy.cache import CacheEntry, SpecCache, body_etag
+from openapi_proxy.compress import negotiate
+from openapi_proxy.history import SpecHistory
+from openapi_proxy.metrics import CACHE_RESULTS, RESPONSE_SIZE
+from openapi_proxy.merge import MergedSpec
+from openapi_proxy.prefetch import Prefetcher
+from openapi_proxy.rewrite import rewrite_servers
+from openapi_proxy.routes import RouteTable
+from openapi_proxy.search import SearchIndex
+from openapi_proxy.server import ProxyServer, gunicorn_options
+from openapi_proxy.swagger_config import SwaggerConfig
+from openapi_proxy.upstream import Upstream
 
 app = Flask(__name__)
 app.logger = logging.getLogger("openapi_proxy")
 
+spec_cache = SpecCache()
+upstream = Upstream()
+prefetcher = None
+swagger_config = None
+route_table = None
+search_index = None
+merged_spec = None
+spec_history = None
+
+# Forwarded headers that can change the spec returned by the upstream service,
+# and so are part of the cache key.
+CACHE_KEY_HEADERS = {"authorization", "cookie"}
+
+# Conditional headers sent by clients refer to the proxy's own ETag, not the
+# upstream service's, and so are not forwarded.
+CONDITIONAL_HEADERS = {"if-none-match", "if-modified-since"}
+
+
+def spec_loader(url, base_path, headers=None, cookies=None):
+    """
+    Returns the function loading the spec at url into the cache, with its
+    servers rewritten for base_path.
+    """
+
+    def load(stale_entry):
+        upstream_headers = dict(headers or {})
+        if stale_entry is not None:
+            if stale_entry.upstream_etag:
+                upstream_headers["If-None-Match"] = stale_entry.upstream_etag
+            if stale_entry.upstream_last_modified:
+                upstream_headers[
+                    "If-Modified-Since"
+                ] = stale_entry.upstream_last_modified
+
+        resp = upstream.get(
+            url=url,
+            headers=upstream_headers,
+            cookies=cookies,
+            allow_redirects=False,
+        )
+        trace = tracing.current()
+        if stale_entry is not None and resp.status_code == 304:
+            trace.cache_status = "revalidated"
+            return stale_entry.revalidated()
+        resp.raise_for_status()
+
+        body = rewrite_servers(resp.content, base_path)
+        upstream_etag = resp.headers.get("ETag")
+        upstream_last_modified = resp.headers.get("Last-Modified")
+
+        if stale_entry is not None and stale_entry.etag == body_etag(body):
+            # unchanged, though the upstream service could not tell, so the
+            # compressed variants are kept
+            trace.cache_status = "revalidated"
+            stale_entry.upstream_etag = upstream_etag
+            stale_entry.upstream_last_modified = upstream_last_modified
+            return stale_entry.revalidated()
+
+        trace.cache_status = "miss" if stale_entry is None else "refreshed"
+
+        return CacheEntry(
+            body,
+            upstream_etag=upstream_etag,
+            upstream_last_modified=upstream_last_modified,
+        )
+
+    return load
+
+
+def cache_key(url, headers):
+    return (url,) + tuple(
+        sorted(
+            (key.lower(), value)
+            for (key, value) in headers.items()
+            if key.lower() in CACHE_KEY_HEADERS
+        )
+    )
+
 
 @app.route("/<path:base_path>/openapi.json", methods=["GET"])
 @app.route("/<path:base_path>/swagger.json", methods=["GET"])
@@ -21,40 +114,222 @@ def get_spec(base_path):
         base_path += "/"
     url = url.replace(base_path, new_path)
 
+    headers = {
+        key: value
+        for (key, value) in request.headers
+        if key.lower() not in {"host", "serverhost"} | CONDITIONAL_HEADERS
+    }
+    load = spec_loader(url, base_path, headers, request.cookies)
+
+    service = base_path.split("/")[0]
+    with tracing.Trace("get_spec", service, request.headers) as trace:
+        try:
+            entry = spec_cache.fetch(cache_key(url, headers), load)
+
+        except requests.Timeout as e:
+            app.logger.warning("Timed out getting spec: %s", e)
+            CACHE_RESULTS.labels(trace.service, "error").inc()
+            return jsonify({"msg": "upstream timeout"}), 504
+
+        except Exception as e:
+            app.logger.exception("Error getting spec: %s", e)
+            CACHE_RESULTS.labels(trace.service, "error").inc()
+            return jsonify({"msg": "error"}), 500
+
+        resp = entry_response(entry)
+
+    CACHE_RESULTS.labels(trace.service, trace.cache_status).inc()
+    RESPONSE_SIZE.labels(trace.service).observe(resp.content_length or 0)
+    resp.headers["X-Cache-Status"] = trace.cache_status
+    return resp
+
+
+@app.route("/-/swagger-config.json", methods=["GET"])
+def get_swagger_config():
+    if swagger_config is None:
+        return jsonify({"msg": "swagger config is not configured"}), 404
+
+    return entry_response(swagger_config.entry())
+
+
+@app.route("/-/merged/openapi.json", methods=["GET"])
+def get_merged_spec():
+    """
+    Returns a single spec holding the paths and components of every
+    prefetched spec.
+    """
+    if merged_spec is None:
+        return jsonify({"msg": "merged spec is not configured"}), 404
+
+    return entry_response(merged_spec.entry())
+
+
+@app.route("/-/history/<service>", methods=["GET"])
+def get_spec_versions(service):
+    """
+    Lists the versions of a service's spec, latest first, optionally only
+    those recorded before a unix timestamp.
+    """
+    if spec_history is None:
+        return jsonify({"msg": "history is not configured"}), 404
+
+    versions = spec_history.versions(
+        service,
+        before=request.args.get("before", type=float),
+        limit=request.args.get("limit", type=int),
+    )
+    return jsonify({"versions": versions})
+
+
+@app.route("/-/history/<service>/diff", methods=["GET"])
+def get_spec_diff(service):
+    """
+    Returns the diff between two versions of a service's spec, by default
+    between the latest and the one before.
+    """
+    if spec_history is None:
+        return jsonify({"msg": "history is not configured"}), 404
+
+    old_hash = request.args.get("from")
+    new_hash = request.args.get("to")
+    if old_hash is None or new_hash is None:
+        latest = [
+            version["hash"] for version in spec_history.versions(service, limit=2)
+        ]
+        if len(latest) < 2:
+            return jsonify({"msg": "no previous version"}), 404
+        new_hash = new_hash or latest[0]
+        old_hash = old_hash or latest[1]
+
+    if not (
+        spec_history.has_version(service, old_hash)
+        and spec_history.has_version(service, new_hash)
+    ):
+        return jsonify({"msg": "version not found"}), 404
+
     try:
-        resp = requests.get(
-            url=url,
-            headers={
-                key: value
-                for (key, value) in request.headers
-                if key.lower() not in {"host", "serverhost"}
-            },
-            cookies=request.cookies,
-            allow_redirects=False,
-        )
-        resp.raise_for_status()
+        diff = spec_history.diff(old_hash, new_hash)
+    except FileNotFoundError:
+        # evicted since it was looked up
+        return jsonify({"msg": "version not found"}), 404
 
-    except Exception as e:
-        app.logger.exception("Error getting spec: %s", e)
-        return jsonify({"msg": "error"}), 500
+    return app.response_class(diff, mimetype="application/json")
 
-    spec = resp.json()
-    servers = spec.get("servers") or [{"url": "", "description": ""}]
-    for server in servers:
-        url = server.get("url", "")
-        url = f"/{base_path.split('/')[0]}{url}"
 
-        description = server.get("description", "")
-        if description:
-            description += " - "
-        description += "Not real base path"
+@app.route("/-/history/<service>/<spec_hash>", methods=["GET"])
+def get_spec_version(service, spec_hash):
+    if spec_history is None:
+        return jsonify({"msg": "history is not configured"}), 404
+    if not spec_history.has_version(service, spec_hash):
+        return jsonify({"msg": "version not found"}), 404
 
-        server["url"] = url
-        server["description"] = description
+    try:
+        body = spec_history.spec(spec_hash)
+    except FileNotFoundError:
+        # evicted since it was looked up
+        return jsonify({"msg": "version not found"}), 404
 
-    spec["servers"] = servers
+    resp = app.response_class(body, mimetype="application/json")
+    # versions never change
+    resp.set_etag(spec_hash)
+    resp.cache_control.max_age = 86400
+    resp.cache_control.immutable = True
+    return resp.make_conditional(request)
 
-    return jsonify(spec), 200
+
+@app.route("/-/route", methods=["GET"])
+def get_route():
+    """
+    Looks up where the router sends the request in the X-Original-URI header,
+    in dynamic mode. The router reads the answer from the response headers.
+    """
+    if route_table is None:
+        return jsonify({"msg": "routes are not configured"}), 404
+
+    destination = route_table.destination(request.headers.get("X-Original-URI", "/"))
+
+    resp = app.response_class(status=204)
+    resp.headers["X-Openapi-Backend"] = destination.backend
+    resp.headers["X-Openapi-Uri"] = destination.uri
+    if destination.server_host:
+        resp.headers["X-Openapi-Server-Host"] = destination.server_host
+    return resp
+
+
+@app.route("/-/search", methods=["GET"])
+def search_specs():
+    """
+    Searches the operations, tags and schemas of the prefetched specs.
+    """
+    if search_index is None:
+        return jsonify({"msg": "search is not configured"}), 404
+
+    documents = search_index.search(
+        request.args.get("q", ""), limit=request.args.get("limit", type=int)
+    )
+    return jsonify({"results": [document._asdict() for document in documents]})
+
+
+@app.route("/-/search/stats", methods=["GET"])
+def search_stats():
+    if search_index is None:
+        return jsonify({"msg": "search is not configured"}), 404
+
+    return jsonify(search_index.stats())
+
+
+def entry_response(entry):
+    """
+    Returns the response for a cached entry, in the encoding best matching
+    the request.
+    """
+    encoding = negotiate(request.accept_encodings, entry.variants)
+    body, etag = entry.encoded(encoding)
+
+    resp = app.response_class(body, mimetype="application/json")
+    if encoding is not None:
+        resp.content_encoding = encoding
+    resp.vary.add("Accept-Encoding")
+    resp.set_etag(etag)
+    # let clients cache the entry, but always revalidate it
+    resp.cache_control.no_cache = True
+    return resp.make_conditional(request)
+
+
+def prefetch_spec(target):
+    """
+    Loads the spec of a manifest target into the cache, under the same key as
+    a request for it without credentials, unless it was refreshed within the
+    prefetch interval. If enabled, it is also indexed for search, merged, and
+    recorded in the history.
+    """
+    base_path, _ = target.path.strip("/").rsplit("/", 1)
+    new_path = "/".join(target.path.strip("/").split("/")[1:])
+    url = f"{target.server_host}/{new_path}"
+
+    with tracing.Trace("prefetch", base_path.split("/")[0]):
+        entry = spec_cache.fetch(
+            cache_key(url, {}),
+            spec_loader(url, base_path),
+            max_age=prefetcher.interval if prefetcher else None,
+        )
+    if search_index is not None:
+        search_index.update(target.path, entry)
+    if merged_spec is not None:
+        merged_spec.update(target.path, entry)
+    if spec_history is not None:
+        spec_history.record(target.path, entry)
+
+
+def forget_spec(target):
+    """
+    Drops a spec no longer in the manifest from the search index and merged
+    spec.
+    """
+    if search_index is not None:
+        search_index.remove(target.path)
+    if merged_spec is not None:
+        merged_spec.remove(target.path)
 
 
 @app.route("/healthz", methods=["GET"])
@@ -62,8 +337,80 @@ def healthz():
     return "", 200
 
 
-def main():  # pragma: no cover
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return generate_latest(), 200, {"Content-Type": CONTENT_TYPE_LATEST}
+
+
+def main(args=None):  # pragma: no cover
+    global prefetcher, swagger_config, route_table, search_index, merged_spec
+    global spec_history
+
+    parser = cmd.get_parser()
+    args = parser.parse_args(args)
+
     logging.basicConfig(
-        format="%(asctime)s %(levelname)s: %(message)s", level=logging.INFO
+        format="%(asctime)s %(levelname)s: %(message)s",
+        level=logging.DEBUG if args.debug else logging.INFO,
+    )
+
+    tracing.metrics_by_service = args.metrics_by_service
+    if args.tracing and not tracing.enable_tracing():
+        parser.error("--tracing requires the opentelemetry-api package")
+
+    spec_cache.ttl = args.cache_ttl
+    spec_cache.max_bytes = args.cache_max_bytes
+    upstream.configure(
+        connect_timeout=args.upstream_connect_timeout,
+        read_timeout=args.upstream_read_timeout,
+        total_timeout=args.upstream_total_timeout,
+        pool_size=args.upstream_pool_size,
+        pool_hosts=args.upstream_pool_hosts,
     )
-    app.run(host="0.0.0.0", debug=False)
+
+    if args.swagger_config:
+        swagger_config = SwaggerConfig(args.swagger_config)
+
+    if args.routes:
+        route_table = RouteTable(args.routes)
+
+    if args.search:
+        if not args.prefetch_manifest:
+            parser.error("--search requires --prefetch-manifest")
+        search_index = SearchIndex(max_postings=args.search_max_postings)
+
+    if args.merged_spec:
+        if not args.prefetch_manifest:
+            parser.error("--merged-spec requires --prefetch-manifest")
+        merged_spec = MergedSpec()
+
+    if args.history_dir:
+        if not args.prefetch_manifest:
+            parser.error("--history-dir requires --prefetch-manifest")
+        spec_history = SpecHistory(
+            args.history_dir, max_versions=args.history_max_versions
+        )
+
+    options = gunicorn_options(args)
+    if args.prefetch_manifest:
+        # each gunicorn worker has its own cache, and so its own prefetcher,
+        # which refreshes its specs as many times less often as there are
+        # workers, so that services see the same load as with one
+        interval = args.prefetch_interval
+        if args.server != "development":
+            interval *= args.workers
+        prefetcher = Prefetcher(
+            args.prefetch_manifest,
+            prefetch_spec,
+            interval=interval,
+            concurrency=args.prefetch_concurrency,
+            removed=forget_spec,
+        )
+        options["post_worker_init"] = lambda worker: prefetcher.start()
+
+    if args.server == "development":
+        if prefetcher:
+            prefetcher.start()
+        app.run(host="0.0.0.0", port=args.port, debug=False)
+    else:
+        ProxyServer(app, options).run()
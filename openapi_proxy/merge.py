@@ -0,0 +1,264 @@
+import json
+import logging
+import threading
+from urllib.parse import urlparse
+
+from openapi_proxy.cache import CacheEntry
+from openapi_proxy.metrics import MERGED_SPEC_BUILDS, SKIPPED_SPECS
+from openapi_proxy.rewrite import rewrite_server_list
+from openapi_proxy.search import HTTP_METHODS
+
+logger = logging.getLogger(__name__)
+
+OPENAPI_VERSION = "3.0.3"
+INFO = {"title": "All services", "version": "1"}
+
+COMPONENTS_REF = "#/components/"
+
+
+def host_key(spec_path):
+    """
+    Returns the {name}-{namespace} key of the service a spec path belongs to.
+    """
+    return spec_path.strip("/").split("/")[0]
+
+
+def base_path(spec, key):
+    """
+    Returns the path the spec's operations are routed under, from its first
+    server, which is rewritten to /{key} followed by the service's own url.
+    """
+    servers = spec.get("servers") or [{"url": f"/{key}"}]
+    url = servers[0].get("url", "")
+    if url.startswith(f"/{key}"):
+        url = url.split(f"/{key}", 1)[1]
+    if not url.startswith("/"):
+        url = urlparse(url).path
+    return f"/{key}{url}".rstrip("/")
+
+
+def _rename_ref(ref, prefix):
+    if not isinstance(ref, str) or not ref.startswith(COMPONENTS_REF):
+        return ref
+    _, _, component_type, name = ref.split("/", 3)
+    return f"{COMPONENTS_REF}{component_type}/{prefix}{name}"
+
+
+def _namespace_discriminator(discriminator, prefix):
+    mapping = discriminator.get("mapping")
+    if isinstance(mapping, dict):
+        # discriminator mappings are references, or schema names
+        discriminator["mapping"] = {
+            name: _rename_ref(ref, prefix) if "/" in str(ref) else f"{prefix}{ref}"
+            for (name, ref) in mapping.items()
+        }
+    return discriminator
+
+
+def namespace(value, prefix):
+    """
+    Returns value with its references to components, and its discriminator
+    mappings, prefixed, so that they do not collide with other services'.
+    """
+    if isinstance(value, list):
+        return [namespace(item, prefix) for item in value]
+    if not isinstance(value, dict):
+        return value
+
+    namespaced = {}
+    for key, item in value.items():
+        if key == "$ref":
+            item = _rename_ref(item, prefix)
+        else:
+            item = namespace(item, prefix)
+            # a discriminator object, rather than a property of that name
+            if (
+                key == "discriminator"
+                and isinstance(item, dict)
+                and isinstance(item.get("propertyName"), str)
+            ):
+                item = _namespace_discriminator(item, prefix)
+        namespaced[key] = item
+    return namespaced
+
+
+def _namespace_operation_id(value, prefix):
+    if isinstance(value, dict) and isinstance(value.get("operationId"), str):
+        value["operationId"] = f"{prefix}{value['operationId']}"
+
+
+def _namespace_links(links, prefix):
+    for link in links.values() if isinstance(links, dict) else []:
+        _namespace_operation_id(link, prefix)
+
+
+def _namespace_response(response, prefix):
+    if isinstance(response, dict):
+        _namespace_links(response.get("links"), prefix)
+
+
+def _namespace_path_item(path_item, prefix):
+    """
+    Prefixes the operation ids of an already namespaced path item, and the
+    ones its links and callbacks refer to.
+    """
+    if not isinstance(path_item, dict):
+        return
+    for method, operation in path_item.items():
+        if method not in HTTP_METHODS or not isinstance(operation, dict):
+            continue
+        _namespace_operation_id(operation, prefix)
+        responses = operation.get("responses")
+        for response in responses.values() if isinstance(responses, dict) else []:
+            _namespace_response(response, prefix)
+        callbacks = operation.get("callbacks")
+        for callback in callbacks.values() if isinstance(callbacks, dict) else []:
+            _namespace_callback(callback, prefix)
+
+
+def _namespace_callback(callback, prefix):
+    for path_item in callback.values() if isinstance(callback, dict) else []:
+        _namespace_path_item(path_item, prefix)
+
+
+# How operation ids are found in each type of components
+COMPONENT_OPERATION_IDS = {
+    "links": _namespace_operation_id,
+    "responses": _namespace_response,
+    "callbacks": _namespace_callback,
+    "pathItems": _namespace_path_item,
+}
+
+
+def _namespace_security(requirements, prefix):
+    return [
+        {f"{prefix}{name}": scopes for (name, scopes) in requirement.items()}
+        for requirement in requirements
+        if isinstance(requirement, dict)
+    ]
+
+
+def _member(key, value):
+    return f"{json.dumps(key)}: {json.dumps(value)}"
+
+
+def spec_members(spec_path, spec):
+    """
+    Returns the paths and components of a spec, namespaced by its service,
+    as serialized JSON object members by the object of the merged spec they
+    belong to: paths, or a type of components.
+    """
+    key = host_key(spec_path)
+    prefix = f"{key}."
+    security = spec.get("security")
+    base = base_path(spec, key)
+
+    members = {"paths": []}
+    for path, path_item in (spec.get("paths") or {}).items():
+        if not isinstance(path_item, dict):
+            continue
+        path_item = namespace(path_item, prefix)
+        _namespace_path_item(path_item, prefix)
+        for method, operation in path_item.items():
+            if method not in HTTP_METHODS or not isinstance(operation, dict):
+                continue
+            # the spec's default security now only applies to its operations
+            requirements = operation.get("security", security)
+            if requirements is not None:
+                operation["security"] = _namespace_security(requirements, prefix)
+        members["paths"].append(_member(f"{base}{path}", path_item))
+
+    for component_type, components in (spec.get("components") or {}).items():
+        if not isinstance(components, dict) or component_type.startswith("x-"):
+            continue
+        operation_ids = COMPONENT_OPERATION_IDS.get(component_type)
+        members[component_type] = []
+        for name, component in components.items():
+            component = namespace(component, prefix)
+            if operation_ids is not None:
+                operation_ids(component, prefix)
+            members[component_type].append(_member(f"{prefix}{name}", component))
+
+    return members
+
+
+def _object(members):
+    return "{" + ", ".join(members) + "}"
+
+
+class MergedSpec:
+    """
+    A single OpenAPI 3 document holding the paths and components of every
+    spec, with paths routed through the router, and components and
+    operation ids prefixed by their service. Each spec's share is serialized
+    once, when its content changes; the document is then joined from them,
+    only when requested after a change. Swagger 2 specs are left out.
+    """
+
+    def __init__(self):
+        self._specs = {}
+        self._entry = None
+        self._lock = threading.Lock()
+
+    def update(self, spec_path, entry):
+        """
+        Merges the cached entry of the spec at spec_path, unless it is merged
+        already.
+        """
+        with self._lock:
+            merged = self._specs.get(spec_path)
+            if merged is not None and merged[0] == entry.etag:
+                return
+
+        spec = json.loads(entry.body)
+        if not isinstance(spec, dict):
+            logger.warning(f"Not merging {spec_path}, it is not a JSON object")
+            SKIPPED_SPECS.labels("merge").inc()
+            members = {}
+        elif str(spec.get("openapi", "")).startswith("3"):
+            members = spec_members(spec_path, spec)
+        else:
+            logger.debug(f"Not merging {spec_path}, it is not an OpenAPI 3 spec")
+            members = {}
+
+        with self._lock:
+            self._specs[spec_path] = (entry.etag, members)
+            self._entry = None
+
+    def remove(self, spec_path):
+        with self._lock:
+            if self._specs.pop(spec_path, None) is not None:
+                self._entry = None
+
+    def entry(self):
+        with self._lock:
+            if self._entry is None:
+                self._entry = CacheEntry(self._build().encode())
+                MERGED_SPEC_BUILDS.inc()
+            return self._entry
+
+    def _build(self):
+        paths = []
+        components = {}
+        for spec_path in sorted(self._specs):
+            _, members = self._specs[spec_path]
+            for name, values in members.items():
+                if name == "paths":
+                    paths.extend(values)
+                else:
+                    components.setdefault(name, []).extend(values)
+
+        return _object(
+            [
+                _member("openapi", OPENAPI_VERSION),
+                _member("info", INFO),
+                # paths include the service's base path
+                _member("servers", rewrite_server_list(None, "")),
+                f'"paths": {_object(paths)}',
+                '"components": '
+                + _object(
+                    f"{json.dumps(name)}: {_object(members)}"
+                    for (name, members) in sorted(components.items())
+                ),
+            ]
+        )
@@ -0,0 +1,60 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+UPSTREAM_REQUESTS = Counter(
+    "openapi_proxy_upstream_requests_total",
+    "Requests made to upstream services",
+)
+UPSTREAM_CONNECTIONS = Counter(
+    "openapi_proxy_upstream_connections_total",
+    "Connections opened to upstream services, requests not opening one reused a pooled connection",
+)
+UPSTREAM_TIMEOUTS = Counter(
+    "openapi_proxy_upstream_timeouts_total",
+    "Upstream requests that timed out, by the timeout that expired",
+    ["timeout"],
+)
+PREFETCHES = Counter(
+    "openapi_proxy_prefetches_total",
+    "Specs prefetched into the cache, by result",
+    ["result"],
+)
+SEARCH_SPECS = Gauge(
+    "openapi_proxy_search_specs",
+    "Specs in the search index",
+)
+SEARCH_POSTINGS = Gauge(
+    "openapi_proxy_search_postings",
+    "(token, document) pairs in the search index, which bound its memory usage",
+)
+SKIPPED_SPECS = Counter(
+    "openapi_proxy_skipped_specs_total",
+    "Prefetched specs left out of a feature as they are not a JSON object, by feature",
+    ["feature"],
+)
+MERGED_SPEC_BUILDS = Counter(
+    "openapi_proxy_merged_spec_builds_total",
+    "Times the merged spec was rebuilt, after specs changed",
+)
+SPEC_CHANGES = Counter(
+    "openapi_proxy_spec_changes_total",
+    "Changes to the specs recorded in the history",
+)
+PHASE_DURATION = Histogram(
+    "openapi_proxy_phase_duration_seconds",
+    "Time spent getting specs, by service and phase: connecting to the service, waiting for its response "
+    "(ttfb), downloading the body, and parsing, rewriting, serializing and compressing the spec",
+    ["service", "phase"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+RESPONSE_SIZE = Histogram(
+    "openapi_proxy_response_size_bytes",
+    "Size of the specs served, as sent, by service",
+    ["service"],
+    buckets=tuple(1024 * 4 ** i for i in range(9)),
+)
+CACHE_RESULTS = Counter(
+    "openapi_proxy_cache_results_total",
+    "Spec requests by service, and cache status: hit, miss, revalidated, refreshed, coalesced with a "
+    "concurrent load, or error",
+    ["service", "status"],
+)
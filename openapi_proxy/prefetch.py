@@ -0,0 +1,181 @@
+import glob
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from openapi_proxy.metrics import PREFETCHES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL_SECONDS = 30
+DEFAULT_CONCURRENCY = 4
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 600
+
+# How often the manifest is checked, and due specs are scheduled
+TICK_SECONDS = 1
+
+Target = namedtuple("Target", ["path", "server_host"])
+
+
+def read_manifest(path):
+    """
+    Reads the specs manifest written by the collector, returning its targets.
+    """
+    with open(path) as f:
+        manifest = json.load(f)
+
+    return {
+        Target(spec["path"], spec["server_host"]) for spec in manifest.get("specs", [])
+    }
+
+
+def backoff(failures):
+    """
+    Returns the seconds to wait before retrying a spec that failed to be
+    fetched the given number of times in a row, with jitter.
+    """
+    delay = min(BACKOFF_BASE_SECONDS * 2 ** (failures - 1), BACKOFF_MAX_SECONDS)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class Prefetcher:
+    """
+    Fetches every spec in the manifests matching manifest_path, a glob
+    pattern, on a schedule, so that they are cached before anyone opens them.
+    At most concurrency specs are fetched at once, each is refreshed every
+    interval seconds (with jitter), and specs that fail are retried with
+    exponential backoff.
+    """
+
+    def __init__(
+        self,
+        manifest_path,
+        prefetch,
+        interval=DEFAULT_INTERVAL_SECONDS,
+        concurrency=DEFAULT_CONCURRENCY,
+        removed=None,
+    ):
+        self.manifest_path = manifest_path
+        self.prefetch = prefetch
+        self.removed = removed
+        self.interval = interval
+        self.concurrency = concurrency
+
+        self.targets = set()
+        self._manifests = None
+        self._due = {}
+        self._failures = {}
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def load_manifest(self):
+        """
+        Re-reads the manifests if any changed. New specs are scheduled at a
+        random point within the next interval, to spread the first fetches.
+        Specs no longer listed are passed to removed, if given.
+        """
+        try:
+            manifests = tuple(
+                (path, os.stat(path).st_mtime)
+                for path in sorted(glob.glob(self.manifest_path))
+            )
+        except FileNotFoundError:
+            # a manifest was removed while being listed, try again next tick
+            return
+
+        if manifests == self._manifests:
+            return
+
+        targets = set()
+        for path, _ in manifests:
+            try:
+                targets |= read_manifest(path)
+            except Exception as e:
+                logger.warning(f"Cannot read specs manifest {path}: {e}")
+                return
+
+        self._manifests = manifests
+
+        now = time.monotonic()
+        with self._lock:
+            removed = self.targets - targets
+            for target in targets - self.targets:
+                self._due[target] = now + random.uniform(0, self.interval)
+            for target in removed:
+                self._due.pop(target, None)
+                self._failures.pop(target, None)
+            self.targets = targets
+
+        if self.removed is not None:
+            for target in removed:
+                self.removed(target)
+
+        logger.info(f"Prefetching {len(targets)} specs")
+
+    def due(self, now):
+        """
+        Returns the specs due to be fetched, that are not being fetched.
+        """
+        with self._lock:
+            return [
+                target
+                for (target, due) in self._due.items()
+                if due <= now and target not in self._in_flight
+            ]
+
+    def fetch(self, target):
+        try:
+            self.prefetch(target)
+
+        except Exception as e:
+            failures = self._failures.get(target, 0) + 1
+            self._failures[target] = failures
+            delay = backoff(failures)
+            logger.warning(
+                f"Error prefetching {target.path}, retrying in {delay:.0f}s: {e}"
+            )
+            PREFETCHES.labels("error").inc()
+
+        else:
+            self._failures.pop(target, None)
+            delay = self.interval * random.uniform(1, 1.1)
+            PREFETCHES.labels("ok").inc()
+
+        with self._lock:
+            # the spec may have been removed from the manifest meanwhile
+            if target in self._due:
+                self._due[target] = time.monotonic() + delay
+            self._in_flight.discard(target)
+
+    def run_once(self, executor):
+        self.load_manifest()
+
+        for target in self.due(time.monotonic()):
+            with self._lock:
+                self._in_flight.add(target)
+            executor.submit(self.fetch, target)
+
+    def run(self):
+        with ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="prefetch"
+        ) as executor:
+            while not self._stop.is_set():
+                self.run_once(executor)
+                self._stop.wait(TICK_SECONDS)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="prefetcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,217 @@
+import json
+import re
+
+from flask import json as flask_json
+
+from openapi_proxy import tracing
+
+WHITESPACE = re.compile(rb"[ \t\n\r]*")
+STRING = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+SCALAR = re.compile(rb"[^,}\]\s]+")
+# Everything up to, and including, the next string or bracket. What precedes
+# them can contain neither, so a failed match gives up in linear time.
+STRUCTURE = re.compile(rb'[^"{}\[\]]*(?:' + STRING.pattern + rb"|[{}\[\]])", re.DOTALL)
+# The bytes a body is reduced to, to find the brackets outside of strings
+STRUCTURE_BYTES = b'"{}[]'
+NOT_STRUCTURE_BYTES = bytes(sorted(set(range(256)) - set(STRUCTURE_BYTES)))
+
+SERVERS_KEY = b'"servers"'
+# Specs mentioning servers more often are parsed in full
+MAX_SERVERS_KEYS = 16
+
+
+class NotRewritable(Exception):
+    """
+    Raised when a spec cannot be rewritten without parsing it fully.
+    """
+
+
+def rewrite_server_list(servers, base_path):
+    servers = servers or [{"url": "", "description": ""}]
+    for server in servers:
+        url = server.get("url", "")
+        url = f"/{base_path.split('/')[0]}{url}"
+
+        description = server.get("description", "")
+        if description:
+            description += " - "
+        description += "Not real base path"
+
+        server["url"] = url
+        server["description"] = description
+
+    return servers
+
+
+def replace_servers(spec, base_path):
+    spec["servers"] = rewrite_server_list(spec.get("servers"), base_path)
+    return spec
+
+
+def rewrite_servers(body, base_path):
+    """
+    Rewrites the servers of the given JSON spec, returning the new body. Only
+    the top level servers member is parsed and replaced, all other bytes are
+    copied through unchanged. Specs that cannot be rewritten this way, or that
+    are not a complete object, e.g. truncated ones, are parsed and serialized
+    in full.
+    """
+    trace = tracing.current()
+    try:
+        with trace.phase("rewrite"):
+            return _rewrite_servers_in_place(body, base_path)
+    except NotRewritable:
+        with trace.phase("parse"):
+            spec = json.loads(body)
+        with trace.phase("rewrite"):
+            spec = replace_servers(spec, base_path)
+        with trace.phase("serialize"):
+            return flask_json.dumps(spec).encode()
+
+
+def _peek(body, pos):
+    end = pos + 1
+    return body[pos:end]
+
+
+def _skip_whitespace(body, pos):
+    return WHITESPACE.match(body, pos).end()
+
+
+def _skip_value(body, pos):
+    """
+    Returns the position just after the JSON value starting at pos.
+    """
+    start = _peek(body, pos)
+    if start == b'"':
+        match = STRING.match(body, pos)
+        if match is None:
+            raise NotRewritable("unterminated string")
+        return match.end()
+
+    if start not in (b"{", b"["):
+        match = SCALAR.match(body, pos)
+        if match is None:
+            raise NotRewritable(f"unexpected value at {pos}")
+        return match.end()
+
+    depth = 0
+    while True:
+        match = STRUCTURE.match(body, pos)
+        if match is None:
+            raise NotRewritable("unterminated object or array")
+
+        pos = match.end()
+        end = body[pos - 1]
+        if end in b"{[":
+            depth += 1
+        elif end in b"}]":
+            depth -= 1
+            if depth == 0:
+                return pos
+
+
+def _brackets(body):
+    """
+    Returns the brackets of body outside of strings, in order, or None if
+    body ends within a string.
+    """
+    if b"\\" in body:
+        # escapes are dropped whole, so the escaped character is never taken
+        # for a quote. Escaped backslashes go first, so that each backslash
+        # left escapes the character after it, of which only quotes matter.
+        body = body.replace(b"\\\\", b"").replace(b'\\"', b"")
+    structure = body.translate(None, NOT_STRUCTURE_BYTES)
+    # without escapes, every quote opens or closes a string, and two adjacent
+    # ones can be dropped without moving any bracket in or out
+    structure = structure.replace(b'""', b"")
+    structure = STRING.sub(b"", structure)
+    if b'"' in structure:
+        return None
+    return structure
+
+
+def _depth(brackets):
+    return (
+        brackets.count(b"{")
+        + brackets.count(b"[")
+        - brackets.count(b"}")
+        - brackets.count(b"]")
+    )
+
+
+def _servers_key(body, start):
+    """
+    Returns the position of the servers key of the top level object, whose
+    members start at start, or None if it has none. Each mention of servers is
+    placed by the depth of the brackets before it, counted from the last one
+    found outside of a string.
+    """
+    pos = start
+    depth = 1
+    key = body.find(SERVERS_KEY, start)
+    for _ in range(MAX_SERVERS_KEYS):
+        if key == -1:
+            return None
+
+        brackets = _brackets(body[pos:key])
+        if brackets is not None:
+            depth += _depth(brackets)
+            pos = key
+            if depth == 1:
+                if _peek(body, _skip_whitespace(body, key + len(SERVERS_KEY))) == b":":
+                    return key
+                if body[:key].rstrip(b" \t\n\r")[-1:] != b":":
+                    raise NotRewritable(f"expected a colon after {key}")
+
+        key = body.find(SERVERS_KEY, key + 1)
+
+    raise NotRewritable("too many mentions of servers")
+
+
+def _servers_bytes(servers, base_path):
+    return json.dumps(rewrite_server_list(servers, base_path)).encode()
+
+
+def _insert_servers(body, pos, base_path):
+    """
+    Inserts servers as the first member of the object opened just before pos.
+    """
+    next_pos = _skip_whitespace(body, pos)
+    empty = _peek(body, next_pos) == b"}"
+    member = b'"servers": ' + _servers_bytes(None, base_path) + (b"" if empty else b",")
+
+    view = memoryview(body)
+    return b"".join([view[:pos], member, view[pos:]])
+
+
+def _rewrite_servers_in_place(body, base_path):
+    if body[:3] == b"\xef\xbb\xbf":
+        raise NotRewritable("byte order mark")
+
+    pos = _skip_whitespace(body, 0)
+    if _peek(body, pos) != b"{" or body.rstrip(b" \t\n\r")[-1:] != b"}":
+        raise NotRewritable("not an object")
+
+    # a body cut short leaves a string or brackets open
+    brackets = _brackets(body)
+    if brackets is None or _depth(brackets) != 0:
+        raise NotRewritable("incomplete object")
+
+    start = pos + 1
+    key = _servers_key(body, start)
+    if key is None:
+        return _insert_servers(body, start, base_path)
+
+    pos = _skip_whitespace(body, key + len(SERVERS_KEY))
+    value_start = _skip_whitespace(body, pos + 1)
+    value_end = _skip_value(body, value_start)
+
+    servers = json.loads(body[value_start:value_end])
+    if servers is not None and not isinstance(servers, list):
+        raise NotRewritable("servers is not an array")
+
+    view = memoryview(body)
+    return b"".join(
+        [view[:value_start], _servers_bytes(servers, base_path), view[value_end:]]
+    )
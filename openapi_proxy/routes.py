@@ -0,0 +1,100 @@
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# Upstreams of the router that requests are sent to, by name
+PROXY_UPSTREAM = "proxy"
+UI_UPSTREAM = "ui"
+
+# How often the routes files are checked for changes
+CHECK_SECONDS = 1
+
+Route = namedtuple("Route", ["backend", "spec_path", "server_host"])
+
+# Where the router sends a request: the upstream or backend, the URI sent to
+# it, and the ServerHost header for spec requests
+Destination = namedtuple("Destination", ["backend", "uri", "server_host"])
+
+
+class RouteTable:
+    """
+    Answers the router's lookups in dynamic mode, using the routes files
+    written by the collector, found by a glob pattern. The files are checked
+    for changes at most every CHECK_SECONDS, so services added or removed are
+    routed without reloading the router.
+    """
+
+    def __init__(self, pattern, clock=time.monotonic):
+        self.pattern = pattern
+        self.clock = clock
+
+        self.routes = {}
+        self._files = None
+        self._checked = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Re-reads the routes files if any changed since they were last read.
+        """
+        try:
+            files = tuple(
+                (path, os.stat(path).st_mtime)
+                for path in sorted(glob.glob(self.pattern))
+            )
+        except FileNotFoundError:
+            # a file was removed while being listed, try again next check
+            return
+
+        if files == self._files:
+            return
+
+        routes = {}
+        for path, _ in files:
+            try:
+                with open(path) as f:
+                    for route in json.load(f).get("routes", []):
+                        routes[route["host"]] = Route(
+                            route["backend"], route["spec_path"], route["server_host"]
+                        )
+            except Exception as e:
+                logger.warning(f"Cannot read routes {path}: {e}")
+                return
+
+        self.routes = routes
+        self._files = files
+        logger.info(f"Routing {len(routes)} services")
+
+    def maybe_load(self):
+        with self._lock:
+            now = self.clock()
+            if self._checked is None or now - self._checked >= CHECK_SECONDS:
+                self._checked = now
+                self.load()
+
+    def destination(self, uri):
+        """
+        Returns where the router should send a request for uri, as it would
+        be routed with a location per service.
+        """
+        self.maybe_load()
+
+        path = uri.split("?", 1)[0]
+        host = path.split("/", 2)[1] if path.startswith("/") else ""
+
+        route = self.routes.get(host)
+        if route is None:
+            return Destination(UI_UPSTREAM, path, None)
+
+        if path == route.spec_path:
+            return Destination(PROXY_UPSTREAM, path, route.server_host)
+
+        if path.startswith(f"/{host}/"):
+            path = "/" + path.split("/", 2)[2]
+        return Destination(route.backend, path, None)
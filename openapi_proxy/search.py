@@ -0,0 +1,279 @@
+import bisect
+import json
+import logging
+import re
+import threading
+from collections import namedtuple
+
+from openapi_proxy.metrics import SEARCH_POSTINGS, SEARCH_SPECS, SKIPPED_SPECS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_POSTINGS = 2_000_000
+DEFAULT_LIMIT = 20
+
+# Only the start of long descriptions is indexed
+MAX_TEXT_LENGTH = 500
+
+HTTP_METHODS = {"get", "put", "post", "delete", "options", "head", "patch", "trace"}
+
+# Weights of the fields a term can match in, the best matching field counts
+NAME_WEIGHT = 3
+PATH_WEIGHT = 2
+TEXT_WEIGHT = 1
+
+TOKEN = re.compile(r"[a-z0-9]+")
+# Splits camelCase and PascalCase words
+CAMEL_CASE = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+
+Document = namedtuple("Document", ["spec", "kind", "name", "method", "path", "summary"])
+
+
+def tokenize(text):
+    """
+    Returns the lower case words of text, with camelCase words split as well
+    as kept whole.
+    """
+    text = (text or "")[:MAX_TEXT_LENGTH]
+    tokens = set(TOKEN.findall(text.lower()))
+    tokens.update(TOKEN.findall(CAMEL_CASE.sub(" ", text).lower()))
+    return tokens
+
+
+def spec_documents(spec_path, spec):
+    """
+    Yields the documents of a spec, operations, tags and schemas, along with
+    their tokens by weight.
+    """
+    for path, path_item in (spec.get("paths") or {}).items():
+        if not isinstance(path_item, dict):
+            continue
+        for method, operation in path_item.items():
+            if method not in HTTP_METHODS or not isinstance(operation, dict):
+                continue
+
+            operation_id = operation.get("operationId")
+            summary = operation.get("summary") or ""
+            yield (
+                Document(
+                    spec_path,
+                    "operation",
+                    operation_id or f"{method.upper()} {path}",
+                    method,
+                    path,
+                    summary,
+                ),
+                {
+                    NAME_WEIGHT: tokenize(operation_id),
+                    PATH_WEIGHT: tokenize(path)
+                    | tokenize(" ".join(map(str, operation.get("tags") or []))),
+                    TEXT_WEIGHT: tokenize(summary)
+                    | tokenize(operation.get("description")),
+                },
+            )
+
+    for tag in spec.get("tags") or []:
+        if isinstance(tag, dict) and tag.get("name"):
+            yield (
+                Document(spec_path, "tag", tag["name"], None, None, ""),
+                {
+                    NAME_WEIGHT: tokenize(tag["name"]),
+                    TEXT_WEIGHT: tokenize(tag.get("description")),
+                },
+            )
+
+    # OpenAPI 3 and Swagger 2
+    schemas = (spec.get("components") or {}).get("schemas") or spec.get("definitions")
+    for name, schema in (schemas or {}).items():
+        description = schema.get("description") if isinstance(schema, dict) else None
+        yield (
+            Document(spec_path, "schema", name, None, None, ""),
+            {NAME_WEIGHT: tokenize(name), TEXT_WEIGHT: tokenize(description)},
+        )
+
+
+class SearchIndex:
+    """
+    Inverted index over the operations, tags and schemas of the specs. Specs
+    are only re-indexed when their content changed, and terms match the
+    words they are a prefix of. The index holds at most max_postings (token,
+    document) pairs, specs that would not fit are not indexed.
+    """
+
+    def __init__(self, max_postings=DEFAULT_MAX_POSTINGS):
+        self.max_postings = max_postings
+
+        self.postings = 0
+        self._tokens = []
+        self._postings = {}
+        self._documents = {}
+        self._specs = {}
+        # the ETags of the specs too large to index, and their postings
+        self._rejected = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def update(self, spec_path, entry):
+        """
+        Indexes the cached entry of the spec at spec_path, unless it is
+        indexed already.
+        """
+        with self._lock:
+            indexed = self._specs.get(spec_path)
+            if indexed is not None and indexed[0] == entry.etag:
+                return
+            rejected = self._rejected.get(spec_path)
+            if rejected is not None and rejected[0] == entry.etag:
+                if self.postings + rejected[1] > self.max_postings:
+                    return
+
+        spec = json.loads(entry.body)
+        if isinstance(spec, dict):
+            documents = list(spec_documents(spec_path, spec))
+        else:
+            logger.warning(f"Not indexing {spec_path}, it is not a JSON object")
+            SKIPPED_SPECS.labels("search").inc()
+            documents = []
+
+        with self._lock:
+            self._remove(spec_path)
+
+            postings = sum(
+                len(tokens) for (_, weights) in documents for tokens in weights.values()
+            )
+            if self.postings + postings > self.max_postings:
+                logger.warning(
+                    f"Not indexing {spec_path}, the search index would hold more than "
+                    f"{self.max_postings} postings"
+                )
+                self._rejected[spec_path] = (entry.etag, postings)
+                self._report()
+                return
+            self._rejected.pop(spec_path, None)
+
+            doc_ids = []
+            spec_tokens = set()
+            new_tokens = []
+            for document, weights in documents:
+                doc_id = self._next_id
+                self._next_id += 1
+                self._documents[doc_id] = document
+                doc_ids.append(doc_id)
+
+                for weight, tokens in weights.items():
+                    for token in tokens:
+                        if self._add_posting(token, doc_id, weight):
+                            new_tokens.append(token)
+                    spec_tokens |= tokens
+
+            if new_tokens:
+                # sorted once, the existing and new tokens being two sorted
+                # runs, rather than shifting the list for every new token
+                self._tokens.extend(sorted(new_tokens))
+                self._tokens.sort()
+            self._specs[spec_path] = (entry.etag, doc_ids, spec_tokens)
+            self._report()
+
+    def _add_posting(self, token, doc_id, weight):
+        """
+        Adds the posting, returning whether the token is new.
+        """
+        postings = self._postings.get(token)
+        new = postings is None
+        if new:
+            postings = self._postings[token] = {}
+
+        if doc_id not in postings:
+            self.postings += 1
+        postings[doc_id] = max(weight, postings.get(doc_id, 0))
+        return new
+
+    def remove(self, spec_path):
+        with self._lock:
+            self._rejected.pop(spec_path, None)
+            self._remove(spec_path)
+            self._report()
+
+    def _remove(self, spec_path):
+        _, doc_ids, tokens = self._specs.pop(spec_path, (None, [], set()))
+
+        removed = set(doc_ids)
+        for doc_id in doc_ids:
+            del self._documents[doc_id]
+
+        removed_tokens = set()
+        for token in tokens:
+            postings = self._postings[token]
+            for doc_id in removed & postings.keys():
+                del postings[doc_id]
+                self.postings -= 1
+            if not postings:
+                del self._postings[token]
+                removed_tokens.add(token)
+
+        if removed_tokens:
+            self._tokens = [
+                token for token in self._tokens if token not in removed_tokens
+            ]
+
+    def _report(self):
+        SEARCH_SPECS.set(len(self._specs))
+        SEARCH_POSTINGS.set(self.postings)
+
+    def _matches(self, term):
+        """
+        Returns the documents matching the term, with the weight of their
+        best matching field.
+        """
+        matches = {}
+        start = bisect.bisect_left(self._tokens, term)
+        for token in self._tokens[start:]:
+            if not token.startswith(term):
+                break
+            for doc_id, weight in self._postings[token].items():
+                if weight > matches.get(doc_id, 0):
+                    matches[doc_id] = weight
+        return matches
+
+    def search(self, query, limit=None):
+        """
+        Returns the first limit (default DEFAULT_LIMIT) documents matching
+        every term of the query, best matches first.
+        """
+        if limit is None:
+            limit = DEFAULT_LIMIT
+
+        terms = TOKEN.findall(query.lower())
+        if not terms:
+            return []
+
+        with self._lock:
+            scores = None
+            for term in terms:
+                matches = self._matches(term)
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {
+                        doc_id: score + matches[doc_id]
+                        for (doc_id, score) in scores.items()
+                        if doc_id in matches
+                    }
+                if not scores:
+                    return []
+
+            ranked = sorted(
+                scores.items(),
+                key=lambda item: (-item[1], self._documents[item[0]].name),
+            )
+            return [self._documents[doc_id] for (doc_id, _) in ranked[:limit]]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "specs": len(self._specs),
+                "documents": len(self._documents),
+                "tokens": len(self._tokens),
+                "postings": self.postings,
+                "max_postings": self.max_postings,
+            }
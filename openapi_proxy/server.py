@@ -0,0 +1,40 @@
+from gunicorn.app.base import BaseApplication
+
+
+def gunicorn_options(args):
+    """
+    Maps the proxy's command line args to gunicorn settings.
+    """
+    return {
+        "bind": f"0.0.0.0:{args.port}",
+        # threads let one slow upstream fetch wait without blocking the
+        # other requests handled by the worker
+        "worker_class": "gthread",
+        "workers": args.workers,
+        "threads": args.threads,
+        "worker_connections": args.max_connections,
+        "max_requests": args.max_requests,
+        "max_requests_jitter": args.max_requests // 10,
+        "timeout": args.timeout,
+        "graceful_timeout": args.graceful_timeout,
+        "keepalive": args.keep_alive,
+        "accesslog": "-" if args.debug else None,
+    }
+
+
+class ProxyServer(BaseApplication):
+    """
+    Serves the proxy app with gunicorn.
+    """
+
+    def __init__(self, app, options):
+        self.application = app
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
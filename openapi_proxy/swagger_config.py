@@ -0,0 +1,49 @@
+import glob
+import json
+import os
+import threading
+
+from openapi_proxy.cache import CacheEntry
+
+
+class SwaggerConfig:
+    """
+    Merges the swagger-ui config fragments written by a sharded collector,
+    found by a glob pattern, into a single config. The merged config is only
+    rebuilt when a fragment changes.
+    """
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self._fragments = None
+        self._entry = None
+        self._lock = threading.Lock()
+
+    def entry(self):
+        paths = sorted(glob.glob(self.pattern))
+        try:
+            fragments = tuple((path, os.stat(path).st_mtime) for path in paths)
+
+            with self._lock:
+                if fragments != self._fragments:
+                    self._entry = self._merge(paths)
+                    self._fragments = fragments
+
+                return self._entry
+
+        except FileNotFoundError:
+            # a fragment was removed while being read, e.g. as the kubelet
+            # swaps a ConfigMap volume's files, the last merged config is
+            # served until the next request
+            if self._entry is None:
+                raise
+            return self._entry
+
+    def _merge(self, paths):
+        urls = []
+        for path in paths:
+            with open(path) as f:
+                urls.extend(json.load(f).get("urls", []))
+        urls.sort(key=lambda url: url["name"])
+
+        return CacheEntry(json.dumps({"urls": urls}).encode())
@@ -0,0 +1,125 @@
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from openapi_proxy.metrics import PHASE_DURATION
+
+try:
+    from opentelemetry import propagate
+    from opentelemetry import trace as otel_trace
+except ImportError:  # pragma: no cover
+    otel_trace = None
+
+# When false, phases are recorded without the service they were for, to
+# keep the number of series down with thousands of services
+metrics_by_service = True
+tracer = None
+
+_local = threading.local()
+
+
+def enable_tracing():
+    """
+    Records OpenTelemetry spans for every traced request, exported as set up
+    by the OpenTelemetry SDK. Returns whether OpenTelemetry is installed.
+    """
+    global tracer
+    if otel_trace is None:
+        return False
+    tracer = otel_trace.get_tracer("openapi_proxy")
+    return True
+
+
+class Trace:
+    """
+    Times the phases of getting a service's spec, recording them as metrics
+    labelled by the service and, with tracing enabled, as spans of a span
+    named name. Phases are recorded by the code they happen in, which finds
+    the trace of the request it runs for with current().
+    """
+
+    def __init__(self, name, service, headers=None):
+        self.name = name
+        self.service = service if metrics_by_service else ""
+        self.headers = headers
+        self.cache_status = None
+        self.durations = {}
+
+    def __enter__(self):
+        self._previous = getattr(_local, "trace", None)
+        _local.trace = self
+        self._span = self.span(self.name, context=self._context())
+        self._span.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        _local.trace = self._previous
+        return self._span.__exit__(*exc_info)
+
+    def _context(self):
+        if tracer is None or self.headers is None:
+            return None
+        return propagate.extract(self.headers)
+
+    def span(self, name, **kwargs):
+        if tracer is None:
+            return nullcontext()
+        attributes = {"openapi.service": self.service}
+        return tracer.start_as_current_span(name, attributes=attributes, **kwargs)
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        with self.span(name):
+            try:
+                yield
+            finally:
+                self.observe(name, time.perf_counter() - start)
+
+    def observe(self, name, duration):
+        self.durations[name] = self.durations.get(name, 0) + duration
+        PHASE_DURATION.labels(self.service, name).observe(duration)
+
+    def inject(self, headers):
+        """
+        Adds the headers propagating the current span to an upstream request.
+        """
+        if tracer is not None:
+            propagate.inject(headers)
+
+
+class _NoTrace(Trace):
+    """
+    Stands in for the trace of work done outside of a traced request, e.g.
+    in tests, recording nothing.
+    """
+
+    def __init__(self):
+        super().__init__(None, "")
+
+    @property
+    def cache_status(self):
+        return None
+
+    @cache_status.setter
+    def cache_status(self, value):
+        pass
+
+    def span(self, name, **kwargs):
+        return nullcontext()
+
+    def observe(self, name, duration):
+        pass
+
+    def inject(self, headers):
+        pass
+
+
+NO_TRACE = _NoTrace()
+
+
+def current():
+    """
+    Returns the trace of the request being handled by this thread.
+    """
+    return getattr(_local, "trace", None) or NO_TRACE
@@ -0,0 +1,157 @@
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ReadTimeoutError
+
+from openapi_proxy import tracing
+from openapi_proxy.metrics import (
+    UPSTREAM_CONNECTIONS,
+    UPSTREAM_REQUESTS,
+    UPSTREAM_TIMEOUTS,
+)
+
+DEFAULT_CONNECT_TIMEOUT = 3
+DEFAULT_READ_TIMEOUT = 30
+DEFAULT_TOTAL_TIMEOUT = 60
+DEFAULT_POOL_SIZE = 10
+DEFAULT_POOL_HOSTS = 100
+
+CHUNK_SIZE = 64 * 1024
+
+
+class UpstreamTimeout(requests.Timeout):
+    """
+    Raised when an upstream response is not fully read within the total
+    timeout.
+    """
+
+
+class TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        with tracing.current().phase("connect"):
+            super().connect()
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        with tracing.current().phase("connect"):
+            super().connect()
+
+
+class CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+    def _new_conn(self):
+        UPSTREAM_CONNECTIONS.inc()
+        return super()._new_conn()
+
+
+class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+    def _new_conn(self):
+        UPSTREAM_CONNECTIONS.inc()
+        return super()._new_conn()
+
+
+class PoolingAdapter(HTTPAdapter):
+    """
+    HTTPAdapter counting the connections its pools open, and timing how long
+    they take to connect.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": CountingHTTPConnectionPool,
+            "https": CountingHTTPSConnectionPool,
+        }
+
+
+class Upstream:
+    """
+    Client for fetching specs from upstream services, sharing a pool of
+    keep-alive connections per upstream host between requests.
+    """
+
+    def __init__(self, **kwargs):
+        self.session = requests.Session()
+        self.configure(**kwargs)
+
+    def configure(
+        self,
+        connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+        read_timeout=DEFAULT_READ_TIMEOUT,
+        total_timeout=DEFAULT_TOTAL_TIMEOUT,
+        pool_size=DEFAULT_POOL_SIZE,
+        pool_hosts=DEFAULT_POOL_HOSTS,
+    ):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+
+        # pool_hosts is the number of upstream hosts with a pool kept open,
+        # pool_size the number of idle connections kept per host
+        adapter = PoolingAdapter(pool_connections=pool_hosts, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, url, **kwargs):
+        """
+        Makes a GET request, reading the whole response body within the
+        total timeout. The time to connect, to the response's headers, and
+        to download the body are recorded in the current trace, which is
+        propagated to the service.
+        """
+        UPSTREAM_REQUESTS.inc()
+        deadline = time.monotonic() + self.total_timeout
+        trace = tracing.current()
+
+        with trace.span("upstream"):
+            headers = dict(kwargs.pop("headers", None) or {})
+            trace.inject(headers)
+
+            start = time.perf_counter()
+            connect = trace.durations.get("connect", 0)
+            try:
+                resp = self.session.get(
+                    url=url,
+                    headers=headers,
+                    timeout=(self.connect_timeout, self.read_timeout),
+                    stream=True,
+                    **kwargs,
+                )
+            except requests.ConnectTimeout:
+                UPSTREAM_TIMEOUTS.labels("connect").inc()
+                raise
+            except requests.ReadTimeout:
+                UPSTREAM_TIMEOUTS.labels("read").inc()
+                raise
+            # the time to first byte, not counting the time to connect
+            connect = trace.durations.get("connect", 0) - connect
+            trace.observe("ttfb", time.perf_counter() - start - connect)
+
+            with resp, trace.phase("download"):
+                chunks = []
+                try:
+                    for chunk in resp.iter_content(CHUNK_SIZE):
+                        if time.monotonic() > deadline:
+                            UPSTREAM_TIMEOUTS.labels("total").inc()
+                            raise UpstreamTimeout(f"Reading {url} took too long")
+                        chunks.append(chunk)
+                except requests.ConnectionError as e:
+                    # read timeouts while streaming surface as connection errors
+                    if e.args and isinstance(e.args[0], ReadTimeoutError):
+                        UPSTREAM_TIMEOUTS.labels("read").inc()
+                        raise requests.ReadTimeout(
+                            *e.args, request=e.request, response=e.response
+                        ) from e
+                    raise
+
+        # the body has been read, make it available as if it had not been
+        # streamed
+        resp._content = b"".join(chunks)
+        return resp
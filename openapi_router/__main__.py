@@ -0,0 +1,3 @@
+from .main import main  # pragma: no cover
+
+main()  # pragma: no cover
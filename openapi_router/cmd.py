@@ -0,0 +1,41 @@
+import argparse
+
+from openapi_router import reload
+
+
+def get_parser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--debug", "-d", help="Debug mode: print more information", action="store_true"
+    )
+    parser.add_argument(
+        "--conf-dir",
+        help="Directory of the generated config to watch (default: /etc/nginx/conf.d)",
+        default="/etc/nginx/conf.d",
+    )
+    parser.add_argument(
+        "--quiet-period",
+        type=float,
+        help=f"Seconds without changes before they are reloaded (default: {reload.DEFAULT_QUIET_PERIOD}s)",
+        default=reload.DEFAULT_QUIET_PERIOD,
+    )
+    parser.add_argument(
+        "--max-wait",
+        type=float,
+        help=f"Seconds after a first change it is reloaded, even if changes continue "
+        f"(default: {reload.DEFAULT_MAX_WAIT}s)",
+        default=reload.DEFAULT_MAX_WAIT,
+    )
+    parser.add_argument(
+        "--min-interval",
+        type=float,
+        help=f"Minimum seconds between two reloads (default: {reload.DEFAULT_MIN_INTERVAL}s)",
+        default=reload.DEFAULT_MIN_INTERVAL,
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="Port metrics are served on, 0 to disable (default: 9101)",
+        default=9101,
+    )
+    return parser
@@ -0,0 +1,86 @@
+import logging
+import os
+import signal
+import subprocess
+import threading
+import time
+
+from openapi_router import __version__, cmd
+from openapi_router.metrics import ReloadMetrics, serve_metrics
+from openapi_router.reload import ReloadController
+
+logger = logging.getLogger(__name__)
+
+# How often the supervisor checks nginx is still running
+TICK_SECONDS = 1
+
+
+def main(args=None):
+    parser = cmd.get_parser()
+    args = parser.parse_args(args)
+
+    logging.basicConfig(
+        format="%(asctime)s %(levelname)s: %(message)s",
+        level=logging.DEBUG if args.debug else logging.INFO,
+    )
+
+    logger.info(f"Router v{__version__} started")
+
+    metrics = ReloadMetrics()
+    if args.metrics_port:
+        serve_metrics(metrics, args.metrics_port)
+
+    logger.info("Wait until conf dir exists...")
+    while not os.path.isdir(args.conf_dir):
+        time.sleep(TICK_SECONDS)
+
+    controller = ReloadController(
+        metrics,
+        quiet_period=args.quiet_period,
+        max_wait=args.max_wait,
+        min_interval=args.min_interval,
+    )
+    # the config is watched, and its hash recorded, before nginx loads it, so
+    # that any change written meanwhile is reloaded
+    watch(args.conf_dir, controller.notify)
+    controller.prime()
+
+    logger.info("Start nginx")
+    nginx = subprocess.Popen(["nginx", "-g", "daemon off;"])
+
+    def stop(signum, frame):
+        logger.info(f"Received signal {signum}, stopping nginx")
+        # nginx finishes in flight requests on quit
+        nginx.send_signal(signal.SIGQUIT)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while nginx.poll() is None:
+        if controller.wait(TICK_SECONDS):
+            controller.reload()
+
+    logger.info(f"nginx exited with {nginx.returncode}")
+    return nginx.returncode
+
+
+def watch(conf_dir, notify):
+    """
+    Calls notify, from a background thread, on every change to the files in
+    conf_dir.
+    """
+    watcher = subprocess.Popen(
+        ["inotifywait", "--monitor", "--quiet", "--exclude", r"\.swp$"]
+        + ["-e", "create", "-e", "modify", "-e", "delete", "-e", "move"]
+        + [conf_dir],
+        stdout=subprocess.PIPE,
+    )
+
+    def read_events():
+        for line in watcher.stdout:
+            logger.debug(f"Config changed: {line.decode().strip()}")
+            notify()
+        logger.error(f"inotifywait exited with {watcher.wait()}")
+
+    threading.Thread(target=read_events, name="watcher", daemon=True).start()
+    return watcher
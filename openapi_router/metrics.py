@@ -0,0 +1,86 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# The router image only has the standard library, so metrics are rendered in
+# the Prometheus text format by hand.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+RELOAD_RESULTS = ["reloaded", "unchanged", "invalid", "failed"]
+
+
+class ReloadMetrics:
+    """
+    Counts config change events and reloads, by result, and how long the
+    reloads took.
+    """
+
+    def __init__(self):
+        self.events = 0
+        self.reloads = {result: 0 for result in RELOAD_RESULTS}
+        self.duration_sum = 0.0
+        self.duration_count = 0
+        self.last_reload = 0.0
+        self._lock = threading.Lock()
+
+    def event(self):
+        with self._lock:
+            self.events += 1
+
+    def reload(self, result, duration, timestamp):
+        with self._lock:
+            self.reloads[result] += 1
+            self.duration_sum += duration
+            self.duration_count += 1
+            if result == "reloaded":
+                self.last_reload = timestamp
+
+    def render(self):
+        with self._lock:
+            lines = [
+                "# HELP openapi_router_config_events_total Changes seen in the config directory",
+                "# TYPE openapi_router_config_events_total counter",
+                f"openapi_router_config_events_total {self.events}",
+                "# HELP openapi_router_reloads_total Reload attempts, by result",
+                "# TYPE openapi_router_reloads_total counter",
+            ]
+            lines += [
+                f'openapi_router_reloads_total{{result="{result}"}} {count}'
+                for (result, count) in self.reloads.items()
+            ]
+            lines += [
+                "# HELP openapi_router_reload_duration_seconds Time taken to test, and reload, the config",
+                "# TYPE openapi_router_reload_duration_seconds summary",
+                f"openapi_router_reload_duration_seconds_sum {self.duration_sum}",
+                f"openapi_router_reload_duration_seconds_count {self.duration_count}",
+                "# HELP openapi_router_last_reload_timestamp_seconds Time of the last applied reload",
+                "# TYPE openapi_router_last_reload_timestamp_seconds gauge",
+                f"openapi_router_last_reload_timestamp_seconds {self.last_reload}",
+            ]
+        return "\n".join(lines) + "\n"
+
+
+def serve_metrics(metrics, port):
+    """
+    Serves the metrics at /metrics on the given port, in a background thread.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,134 @@
+import hashlib
+import logging
+import subprocess
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUIET_PERIOD = 1.0
+DEFAULT_MAX_WAIT = 10.0
+DEFAULT_MIN_INTERVAL = 5.0
+
+
+class ReloadController:
+    """
+    Coalesces bursts of config changes into a single, validated, nginx
+    reload. Changes are reloaded once no other change was seen for the quiet
+    period, or max_wait after the first change of a burst, but never within
+    min_interval of the previous reload. Reloads are skipped when the config
+    nginx would load is unchanged.
+    """
+
+    def __init__(
+        self,
+        metrics,
+        quiet_period=DEFAULT_QUIET_PERIOD,
+        max_wait=DEFAULT_MAX_WAIT,
+        min_interval=DEFAULT_MIN_INTERVAL,
+        run=subprocess.run,
+        clock=time.monotonic,
+    ):
+        self.metrics = metrics
+        self.quiet_period = quiet_period
+        self.max_wait = max_wait
+        self.min_interval = min_interval
+        self.run = run
+        self.clock = clock
+
+        self.config_hash = None
+        self._first_change = None
+        self._last_change = None
+        self._last_reload = None
+        self._changed = threading.Condition()
+
+    def notify(self):
+        """
+        Records a change to the config.
+        """
+        with self._changed:
+            now = self.clock()
+            if self._first_change is None:
+                self._first_change = now
+            self._last_change = now
+            self.metrics.event()
+            self._changed.notify()
+
+    def next_reload(self):
+        """
+        Returns the time the pending changes are due to be reloaded at, or
+        None if there are none.
+        """
+        if self._first_change is None:
+            return None
+
+        due = min(
+            self._last_change + self.quiet_period,
+            self._first_change + self.max_wait,
+        )
+        if self._last_reload is not None:
+            due = max(due, self._last_reload + self.min_interval)
+        return due
+
+    def wait(self, timeout):
+        """
+        Waits up to timeout seconds for pending changes to be due. Returns
+        whether they are, in which case they are no longer pending.
+        """
+        with self._changed:
+            due = self.next_reload()
+            now = self.clock()
+            if due is not None and due <= now:
+                self._first_change = self._last_change = None
+                return True
+
+            if due is not None:
+                timeout = min(timeout, due - now)
+            self._changed.wait(timeout)
+            return False
+
+    def rendered_hash(self):
+        """
+        Tests the config, returning the hash of the full config nginx would
+        load, or None if it is invalid.
+        """
+        result = self.run(["nginx", "-T"], capture_output=True)
+        if result.returncode != 0:
+            logger.error(f"Invalid nginx config: {result.stderr.decode().strip()}")
+            return None
+
+        return hashlib.sha256(result.stdout).hexdigest()
+
+    def prime(self):
+        """
+        Records the hash of the config nginx is about to start with.
+        """
+        self.config_hash = self.rendered_hash()
+
+    def reload(self):
+        """
+        Reloads nginx if its config is valid and changed, returning the
+        result of the attempt.
+        """
+        start = self.clock()
+
+        config_hash = self.rendered_hash()
+        if config_hash is None:
+            result = "invalid"
+
+        elif config_hash == self.config_hash:
+            logger.info("Config unchanged, skipping reload")
+            result = "unchanged"
+
+        elif self.run(["nginx", "-s", "reload"]).returncode != 0:
+            logger.error("Failed to reload nginx")
+            result = "failed"
+
+        else:
+            logger.info("Reloaded nginx")
+            self.config_hash = config_hash
+            self._last_reload = self.clock()
+            result = "reloaded"
+
+        self.metrics.reload(result, self.clock() - start, time.time())
+        return result
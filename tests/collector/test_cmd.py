@@ -6,3 +6,121 @@ def test_get_parser():
     args = parser.parse_args(["--debug", "--interval=10"])
     assert args.debug
     assert 10 == args.interval
+
+
+def test_get_parser_watch():
+    parser = get_parser()
+    assert not parser.parse_args([]).watch
+    assert parser.parse_args(["--watch"]).watch
+
+
+def test_get_parser_discovery():
+    parser = get_parser()
+    args = parser.parse_args(
+        [
+            "--label-selector=openapi/collect=true",
+            "--namespace=ns-1",
+            "--namespace=ns-2",
+            "--exclude-namespace=kube-system",
+            "--page-size=100",
+        ]
+    )
+    assert "openapi/collect=true" == args.label_selector
+    assert ["ns-1", "ns-2"] == args.namespaces
+    assert ["kube-system"] == args.exclude_namespaces
+    assert 100 == args.page_size
+
+
+def test_get_parser_shards():
+    parser = get_parser()
+    assert 1 == parser.parse_args([]).shards
+    assert 4 == parser.parse_args(["--shards=4"]).shards
+
+
+def test_get_parser_router_mode():
+    parser = get_parser()
+
+    args = parser.parse_args([])
+    assert "locations" == args.router_mode
+    assert "cluster.local" == args.cluster_domain
+
+    args = parser.parse_args(["--router-mode=map", "--cluster-domain=example"])
+    assert "map" == args.router_mode
+    assert "example" == args.cluster_domain
+
+    assert "dynamic" == parser.parse_args(["--router-mode=dynamic"]).router_mode
+
+
+def test_get_parser_output_dir():
+    parser = get_parser()
+
+    args = parser.parse_args([])
+    assert args.output_dir is None
+    assert args.configmaps
+
+    args = parser.parse_args(["--output-dir=/var/run/collector", "--no-configmaps"])
+    assert "/var/run/collector" == args.output_dir
+    assert not args.configmaps
+
+
+def test_get_parser_leader_elect():
+    parser = get_parser()
+
+    args = parser.parse_args([])
+    assert not args.leader_elect
+    assert "openapi-collector" == args.leader_elect_lease_name
+    assert 8 == args.leader_elect_lease_duration
+    assert 2 == args.leader_elect_renew_interval
+
+    args = parser.parse_args(
+        [
+            "--leader-elect",
+            "--leader-elect-lease-name=collector",
+            "--leader-elect-lease-duration=15",
+            "--leader-elect-renew-interval=5",
+        ]
+    )
+    assert args.leader_elect
+    assert "collector" == args.leader_elect_lease_name
+    assert 15 == args.leader_elect_lease_duration
+    assert 5 == args.leader_elect_renew_interval
+
+
+def test_get_parser_probe():
+    parser = get_parser()
+
+    args = parser.parse_args([])
+    assert not args.probe
+    assert 10 == args.probe_concurrency
+    assert 3 == args.probe_timeout
+    assert 60 == args.probe_ttl
+
+    args = parser.parse_args(
+        ["--probe", "--probe-concurrency=5", "--probe-timeout=1", "--probe-ttl=30"]
+    )
+    assert args.probe
+    assert 5 == args.probe_concurrency
+    assert 1 == args.probe_timeout
+    assert 30 == args.probe_ttl
+
+
+def test_get_parser_metrics_port():
+    parser = get_parser()
+    assert 9102 == parser.parse_args([]).metrics_port
+    assert 0 == parser.parse_args(["--metrics-port=0"]).metrics_port
+
+
+def test_get_parser_schedule():
+    parser = get_parser()
+
+    args = parser.parse_args([])
+    assert args.min_interval is None
+    assert 300 == args.max_interval
+    assert 3 == args.stretch_after
+
+    args = parser.parse_args(
+        ["--min-interval=5", "--max-interval=600", "--stretch-after=10"]
+    )
+    assert 5 == args.min_interval
+    assert 600 == args.max_interval
+    assert 10 == args.stretch_after
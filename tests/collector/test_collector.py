@@ -2,13 +2,27 @@ import json
 from unittest.mock import MagicMock
 
 import pykube
+from prometheus_client import REGISTRY
 
 from openapi_collector.collector import (
+    PortCache,
+    Spec,
     collect_specs,
+    mirror_configmaps,
+    write_configmaps,
     should_collect,
     parse_port,
     parse_path,
+    spec_from_service,
 )
+from openapi_collector.config_gen import ConfigOptions, build_ui_configmap
+from openapi_collector.metrics import PORT_PARSE_FAILURES, SERVICES
+
+
+def phase_count(phase):
+    return REGISTRY.get_sample_value(
+        "openapi_collector_phase_duration_seconds_count", {"phase": phase}
+    )
 
 
 def test_should_collect_true():
@@ -37,6 +51,11 @@ def test_should_collect_missing():
     assert not should_collect(svc)
 
 
+def test_should_collect_label():
+    svc = pykube.Service(None, {"metadata": {"labels": {"openapi/collect": "true"}}})
+    assert should_collect(svc)
+
+
 def test_parse_port_int():
     svc = pykube.Service(None, {"metadata": {"annotations": {"openapi/port": "8000"}}})
     assert 8000 == parse_port(svc)
@@ -81,6 +100,74 @@ def test_parse_path_default():
     assert "/" == parse_path(svc)
 
 
+def test_spec_from_service_metadata_only_named_port():
+    api_mock = MagicMock(config=MagicMock(namespace="default"))
+    api_mock.get.return_value.json.return_value = {
+        "metadata": {
+            "name": "svc-1",
+            "namespace": "ns-1",
+            "annotations": {"openapi/port": "api-port"},
+        },
+        "spec": {"ports": [{"name": "api-port", "port": 8000}]},
+    }
+    svc = pykube.Service(
+        api_mock,
+        {
+            "metadata": {
+                "name": "svc-1",
+                "namespace": "ns-1",
+                "annotations": {"openapi/port": "api-port"},
+            }
+        },
+    )
+
+    assert Spec("svc-1", "ns-1", 8000, "/") == spec_from_service(svc)
+    _, get_call = api_mock.get.call_args
+    assert "/services/svc-1" == get_call["url"]
+
+
+def test_spec_from_service_named_port_cached():
+    port_cache = PortCache()
+    api_mock = MagicMock(config=MagicMock(namespace="default"))
+
+    def service(resource_version):
+        metadata = {
+            "name": "svc-1",
+            "namespace": "ns-1",
+            "uid": "uid-1",
+            "resourceVersion": resource_version,
+            "annotations": {"openapi/port": "api-port"},
+        }
+        api_mock.get.return_value.json.return_value = {
+            "metadata": metadata,
+            "spec": {"ports": [{"name": "api-port", "port": int(resource_version)}]},
+        }
+        return pykube.Service(api_mock, {"metadata": dict(metadata)})
+
+    assert 8000 == spec_from_service(service("8000"), port_cache).port
+    assert 8000 == spec_from_service(service("8000"), port_cache).port
+    assert 1 == api_mock.get.call_count
+
+    # the service changed
+    assert 8001 == spec_from_service(service("8001"), port_cache).port
+    assert 2 == api_mock.get.call_count
+
+    port_cache.retain([])
+    assert 8001 == spec_from_service(service("8001"), port_cache).port
+    assert 3 == api_mock.get.call_count
+
+
+def test_spec_from_service_metadata_only_numeric_port():
+    api_mock = MagicMock()
+    svc = pykube.Service(
+        api_mock,
+        {"metadata": {"name": "svc-1", "namespace": "ns-1"}},
+    )
+
+    assert Spec("svc-1", "ns-1", 80, "/") == spec_from_service(svc)
+    assert not api_mock.get.called
+
+
 def test_collect_specs_no_cms():
     api_mock = MagicMock(config=MagicMock(namespace="default"))
 
@@ -137,7 +224,7 @@ def test_collect_specs_no_cms():
     assert "swagger-config.json" in swagger_data["data"]
 
 
-def test_collect_specs_cm_replaced():
+def test_collect_specs_cm_patched():
     api_mock = MagicMock(config=MagicMock(namespace="default"))
 
     def get(**kwargs):
@@ -158,26 +245,18 @@ def test_collect_specs_cm_replaced():
 
         elif kwargs.get("url") == "/configmaps/openapi-collector-router-config":
             data = {
-                "items": [
-                    {
-                        "metadata": {"name": "openapi-collector-router-config"},
-                        "data": {"foo.conf": ""},
-                    }
-                ]
+                "metadata": {"name": "openapi-collector-router-config"},
+                "data": {"foo.conf": ""},
             }
 
         elif kwargs.get("url") == "/configmaps/openapi-collector-ui-config":
             data = {
-                "items": [
-                    {
-                        "metadata": {"name": "openapi-collector-ui-config"},
-                        "data": {
-                            "swagger-config.json": """{
-                            "urls": [{"name": "foo", "url": "/foo}]
-                        }"""
-                        },
-                    }
-                ]
+                "metadata": {"name": "openapi-collector-ui-config"},
+                "data": {
+                    "swagger-config.json": json.dumps(
+                        {"urls": [{"name": "foo", "url": "/foo"}]}
+                    )
+                },
             }
 
         else:
@@ -188,32 +267,54 @@ def test_collect_specs_cm_replaced():
 
     api_mock.get = get
 
-    collect_specs(api_mock)
+    assert collect_specs(api_mock)
 
-    assert 2 == api_mock.post.call_count
-    assert 2 == api_mock.delete.call_count
+    assert not api_mock.post.called
+    assert not api_mock.delete.called
+    assert 2 == api_mock.patch.call_count
 
-    _, nginx_call = api_mock.post.call_args_list[0]
-    assert "configmaps" == nginx_call["url"]
+    _, nginx_call = api_mock.patch.call_args_list[0]
+    assert "/configmaps/openapi-collector-router-config" == nginx_call["url"]
     nginx_data = json.loads(nginx_call["data"])
-    assert "openapi-collector-router-config" == nginx_data["metadata"]["name"]
     assert "svc-1-ns-1-location.conf" in nginx_data["data"]
     assert "svc-1-ns-1-upstream.conf" in nginx_data["data"]
-    assert "foo.conf" not in nginx_data["data"]
+    assert nginx_data["data"]["foo.conf"] is None
 
-    _, swagger_call = api_mock.post.call_args_list[1]
-    assert "configmaps" == swagger_call["url"]
+    _, swagger_call = api_mock.patch.call_args_list[1]
+    assert "/configmaps/openapi-collector-ui-config" == swagger_call["url"]
     swagger_data = json.loads(swagger_call["data"])
-    assert "openapi-collector-ui-config" == swagger_data["metadata"]["name"]
-    assert "swagger-config.json" in swagger_data["data"]
     swagger_conf = json.loads(swagger_data["data"]["swagger-config.json"])
     assert "foo" not in set(u["name"] for u in swagger_conf["urls"])
 
-    _, nginx_delete_call = api_mock.delete.call_args_list[0]
-    assert "/configmaps/openapi-collector-router-config" == nginx_delete_call["url"]
 
-    _, swagger_delete_call = api_mock.delete.call_args_list[1]
-    assert "/configmaps/openapi-collector-ui-config" == swagger_delete_call["url"]
+def test_collect_specs_cm_unchanged():
+    api_mock = MagicMock(config=MagicMock(namespace="default"))
+
+    def get(**kwargs):
+        response = MagicMock()
+
+        if kwargs.get("url") == "services":
+            data = {"items": []}
+
+        elif kwargs.get("url") == "/configmaps/openapi-collector-router-config":
+            data = {"metadata": {"name": "openapi-collector-router-config"}}
+
+        elif kwargs.get("url") == "/configmaps/openapi-collector-ui-config":
+            data = build_ui_configmap(api_mock, []).obj
+
+        else:
+            data = {}
+
+        response.json.return_value = data
+        return response
+
+    api_mock.get = get
+
+    assert not collect_specs(api_mock)
+
+    assert not api_mock.post.called
+    assert not api_mock.patch.called
+    assert not api_mock.delete.called
 
 
 def test_collect_specs_no_services():
@@ -320,9 +421,14 @@ def test_collect_specs_skip_no_port():
         return response
 
     api_mock.get = get
+    failures = PORT_PARSE_FAILURES._value.get()
 
     collect_specs(api_mock)
 
+    assert failures + 1 == PORT_PARSE_FAILURES._value.get()
+    assert 2 == SERVICES.labels("scanned")._value.get()
+    assert 1 == SERVICES.labels("collected")._value.get()
+
     assert 2 == api_mock.post.call_count
     assert not api_mock.delete.called
 
@@ -340,3 +446,90 @@ def test_collect_specs_skip_no_port():
     assert "swagger-config.json" in swagger_data["data"]
     swagger_conf = json.loads(swagger_data["data"]["swagger-config.json"])
     assert 1 == len(swagger_conf["urls"])
+
+
+def test_write_configmaps_sharded():
+    api_mock = MagicMock(config=MagicMock(namespace="default"))
+    reconciler = MagicMock()
+    reconciler.apply.return_value = False
+
+    specs = [Spec("svc", f"ns-{i}", 80, "/") for i in range(10)]
+    assert not write_configmaps(api_mock, specs, reconciler, ConfigOptions(shards=2))
+
+    names = [cm.name for ((cm,), _) in reconciler.apply.call_args_list]
+    assert [
+        "openapi-collector-router-config-0",
+        "openapi-collector-router-config-1",
+        "openapi-collector-ui-config-0",
+        "openapi-collector-ui-config-1",
+    ] == names
+    reconciler.prune.assert_called_once_with(
+        api_mock,
+        names,
+        ["openapi-collector-router-config", "openapi-collector-ui-config"],
+    )
+
+
+def test_write_configmaps_dynamic_mode():
+    api_mock = MagicMock(config=MagicMock(namespace="default"))
+    reconciler = MagicMock()
+
+    specs = [Spec("svc", "ns", 80, "/")]
+    write_configmaps(api_mock, specs, reconciler, ConfigOptions(router_mode="dynamic"))
+
+    ((router_cm,), _), ((ui_cm,), _) = reconciler.apply.call_args_list
+    assert ["0-dynamic.map"] == list(router_cm.obj["data"])
+    routes = json.loads(ui_cm.obj["data"]["routes.json"])["routes"]
+    assert "svc.ns.svc.cluster.local:80" == routes[0]["backend"]
+
+
+def test_mirror_configmaps():
+    api_mock = MagicMock(config=MagicMock(namespace="default"))
+    api_mock.get.return_value.json.return_value = {
+        "items": [
+            {"metadata": {"name": "openapi-collector-router-config-0"}, "data": {}},
+            {"metadata": {"name": "openapi-collector-ui-config"}, "data": {}},
+            {"metadata": {"name": "other"}, "data": {}},
+        ]
+    }
+    writer = MagicMock()
+    writer.apply.return_value = True
+
+    assert mirror_configmaps(api_mock, writer)
+
+    names = [cm.name for ((cm,), _) in writer.apply.call_args_list]
+    assert ["openapi-collector-router-config-0", "openapi-collector-ui-config"] == names
+    writer.prune.assert_called_once_with(
+        api_mock,
+        names,
+        ["openapi-collector-router-config", "openapi-collector-ui-config"],
+    )
+
+
+def test_write_configmaps_probed():
+    api_mock = MagicMock(config=MagicMock(namespace="default"))
+    reconciler = MagicMock()
+    specs = [Spec("up", "ns", 80, "/"), Spec("down", "ns", 80, "/")]
+    prober = MagicMock()
+    prober.available.return_value = specs[:1]
+
+    write_configmaps(api_mock, specs, reconciler, prober=prober)
+
+    prober.available.assert_called_once_with(api_mock, specs)
+    ((router_cm,), _), ((ui_cm,), _) = reconciler.apply.call_args_list
+    assert "down-ns-location.conf" in router_cm.obj["data"]
+    urls = json.loads(ui_cm.obj["data"]["swagger-config.json"])["urls"]
+    assert ["ns/up"] == [url["name"] for url in urls]
+
+
+def test_write_configmaps_times_phases():
+    reconciler = MagicMock()
+    prober = MagicMock()
+    prober.available.return_value = []
+    counts = {phase: phase_count(phase) or 0 for phase in ["probe", "render", "write"]}
+
+    write_configmaps(MagicMock(), [], reconciler, prober=prober)
+
+    assert {phase: count + 1 for (phase, count) in counts.items()} == {
+        phase: phase_count(phase) for phase in counts
+    }
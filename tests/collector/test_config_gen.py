@@ -1,3 +1,5 @@
+import base64
+import gzip
 import json
 from unittest.mock import MagicMock
 
@@ -6,9 +8,15 @@ import pykube
 from openapi_collector.collector import Spec
 from openapi_collector.config_gen import (
     ROUTER_CONFIGMAP_NAME,
+    ROUTES_KEY,
+    SPECS_MANIFEST_KEY,
     UI_CONFIGMAP_NAME,
+    ConfigOptions,
     build_router_configmap,
+    build_router_configmaps,
     build_ui_configmap,
+    build_ui_configmaps,
+    shard_for,
 )
 
 
@@ -187,6 +195,17 @@ def test_build_ui_configmap_with_path():
     assert "test-ns/test-svc" == swagger_conf["urls"][0]["name"]
     assert "/test-svc-test-ns/v1/openapi.json" == swagger_conf["urls"][0]["url"]
 
+    compressed = base64.b64decode(cm.obj["binaryData"]["swagger-config.json.gz"])
+    assert swagger_conf == json.loads(gzip.decompress(compressed))
+
+    manifest = json.loads(cm.obj["data"][SPECS_MANIFEST_KEY])
+    assert [
+        {
+            "path": "/test-svc-test-ns/v1/openapi.json",
+            "server_host": "http://test-svc.test-ns:8000",
+        }
+    ] == manifest["specs"]
+
 
 def test_build_ui_configmap_with_path_and_file():
     namespace = "default"
@@ -211,3 +230,103 @@ def test_build_ui_configmap_with_path_and_file():
     assert "url" in swagger_conf["urls"][0]
     assert "test-ns/test-svc" == swagger_conf["urls"][0]["name"]
     assert "/test-svc-test-ns/swagger.json" == swagger_conf["urls"][0]["url"]
+
+
+def test_shard_for_is_stable():
+    shards = [shard_for(f"ns-{i}", 4) for i in range(100)]
+
+    assert shards == [shard_for(f"ns-{i}", 4) for i in range(100)]
+    assert {0, 1, 2, 3} == set(shards)
+    assert {0} == {shard_for(f"ns-{i}", 1) for i in range(100)}
+
+
+def test_build_router_configmaps_single_shard():
+    api_mock = MagicMock(config=MagicMock(namespace="default"))
+
+    cms = build_router_configmaps(api_mock, [Spec("svc", "ns", 80, "/")])
+
+    assert [ROUTER_CONFIGMAP_NAME] == [cm.name for cm in cms]
+
+
+def test_build_configmaps_sharded():
+    api_mock = MagicMock(config=MagicMock(namespace="default"))
+    specs = [Spec("svc", f"ns-{i}", 80, "/") for i in range(20)]
+
+    router_cms = build_router_configmaps(api_mock, specs, ConfigOptions(shards=3))
+    ui_cms = build_ui_configmaps(api_mock, specs, shards=3)
+
+    assert [f"{ROUTER_CONFIGMAP_NAME}-{i}" for i in range(3)] == [
+        cm.name for cm in router_cms
+    ]
+    assert [f"{UI_CONFIGMAP_NAME}-{i}" for i in range(3)] == [cm.name for cm in ui_cms]
+
+    for spec in specs:
+        cm = router_cms[shard_for(spec.namespace, 3)]
+        assert f"svc-{spec.namespace}-upstream.conf" in cm.obj["data"]
+    assert 40 == sum(len(cm.obj["data"]) for cm in router_cms)
+
+    urls = []
+    for (shard, cm) in enumerate(ui_cms):
+        assert {f"swagger-config-{shard}.json", f"specs-{shard}.json"} == set(
+            cm.obj["data"]
+        )
+        urls += json.loads(cm.obj["data"][f"swagger-config-{shard}.json"])["urls"]
+    assert 20 == len(urls)
+
+
+def test_build_router_configmaps_map_mode():
+    api_mock = MagicMock(config=MagicMock(namespace="default"))
+    specs = [Spec("svc-b", "ns", 8000, "/v1"), Spec("svc-a", "ns", 80, "/")]
+
+    (cm,) = build_router_configmaps(
+        api_mock, specs, ConfigOptions(router_mode="map", cluster_domain="example")
+    )
+
+    assert ROUTER_CONFIGMAP_NAME == cm.name
+    assert (
+        'svc-a-ns "svc-a.ns.svc.example:80";\n'
+        'svc-b-ns "svc-b.ns.svc.example:8000";\n'
+    ) == cm.obj["data"]["0-backends.map"]
+    assert (
+        '/svc-a-ns/openapi.json "http://svc-a.ns:80";\n'
+        '/svc-b-ns/v1/openapi.json "http://svc-b.ns:8000";\n'
+    ) == cm.obj["data"]["0-specs.map"]
+
+
+def test_build_configmaps_dynamic_mode():
+    api_mock = MagicMock(config=MagicMock(namespace="default"))
+    specs = [Spec("svc-b", "ns", 8000, "/v1"), Spec("svc-a", "ns", 80, "/")]
+
+    (router_cm,) = build_router_configmaps(
+        api_mock, specs, ConfigOptions(router_mode="dynamic")
+    )
+    (ui_cm,) = build_ui_configmaps(api_mock, specs, cluster_domain="example")
+
+    assert {"0-dynamic.map": '"~^/" 1;\n'} == router_cm.obj["data"]
+    assert [
+        {
+            "host": "svc-a-ns",
+            "backend": "svc-a.ns.svc.example:80",
+            "spec_path": "/svc-a-ns/openapi.json",
+            "server_host": "http://svc-a.ns:80",
+        },
+        {
+            "host": "svc-b-ns",
+            "backend": "svc-b.ns.svc.example:8000",
+            "spec_path": "/svc-b-ns/v1/openapi.json",
+            "server_host": "http://svc-b.ns:8000",
+        },
+    ] == json.loads(ui_cm.obj["data"][ROUTES_KEY])["routes"]
+
+
+def test_build_ui_configmaps_sharded_routes():
+    api_mock = MagicMock(config=MagicMock(namespace="default"))
+    specs = [Spec("svc", f"ns-{i}", 80, "/") for i in range(20)]
+
+    ui_cms = build_ui_configmaps(api_mock, specs, shards=3, cluster_domain="example")
+
+    hosts = []
+    for (shard, cm) in enumerate(ui_cms):
+        routes = json.loads(cm.obj["data"][f"routes-{shard}.json"])["routes"]
+        hosts += [route["host"] for route in routes]
+    assert sorted(f"svc-ns-{i}" for i in range(20)) == sorted(hosts)
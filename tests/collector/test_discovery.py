@@ -0,0 +1,105 @@
+from unittest.mock import MagicMock
+
+from openapi_collector.discovery import ServiceQuery
+
+
+def mock_api(pages):
+    """
+    Returns a mock api serving the given pages of service names, per
+    namespace (None being all namespaces).
+    """
+    api_mock = MagicMock()
+    calls = []
+
+    def get(**kwargs):
+        calls.append(kwargs)
+        namespace_pages = pages[kwargs.get("namespace")]
+        index = int(kwargs["params"].get("continue", 0))
+
+        metadata = {"resourceVersion": str(100 + index)}
+        if index + 1 < len(namespace_pages):
+            metadata["continue"] = str(index + 1)
+
+        response = MagicMock()
+        response.json.return_value = {
+            "metadata": metadata,
+            "items": [
+                {"metadata": {"name": name, "namespace": kwargs.get("namespace")}}
+                for name in namespace_pages[index]
+            ],
+        }
+        return response
+
+    api_mock.get = get
+    api_mock.calls = calls
+    return api_mock
+
+
+def test_params_default():
+    assert {} == ServiceQuery().params()
+
+
+def test_params_selectors():
+    query = ServiceQuery(
+        label_selector="openapi/collect=true",
+        exclude_namespaces=["kube-system", "default", "kube-system"],
+    )
+
+    assert {
+        "labelSelector": "openapi/collect=true",
+        "fieldSelector": "metadata.namespace!=default,metadata.namespace!=kube-system",
+    } == query.params()
+
+
+def test_allows():
+    query = ServiceQuery(namespaces=["ns-1", "ns-2"], exclude_namespaces=["ns-2"])
+
+    assert query.allows("ns-1")
+    assert not query.allows("ns-2")
+    assert not query.allows("ns-3")
+
+    assert ServiceQuery().allows("ns-3")
+    assert not ServiceQuery(exclude_namespaces=["ns-3"]).allows("ns-3")
+
+
+def test_watch_namespace():
+    assert ServiceQuery().watch_namespace() is None
+    assert "ns-1" == ServiceQuery(namespaces=["ns-1"]).watch_namespace()
+    assert ServiceQuery(namespaces=["ns-1", "ns-2"]).watch_namespace() is None
+
+
+def test_list_pages_follows_continue():
+    api_mock = mock_api({None: [["svc-1", "svc-2"], ["svc-3"]]})
+    query = ServiceQuery(page_size=2)
+
+    pages = list(query.list_pages(api_mock))
+
+    assert 2 == len(pages)
+    assert ["svc-3"] == [item["metadata"]["name"] for item in pages[1][0]]
+    assert "101" == pages[1][1]
+
+    assert 2 == api_mock.calls[0]["params"]["limit"]
+    assert "continue" not in api_mock.calls[0]["params"]
+    assert "1" == api_mock.calls[1]["params"]["continue"]
+    assert "PartialObjectMetadataList" in api_mock.calls[0]["headers"]["Accept"]
+
+
+def test_services_all_namespaces():
+    api_mock = mock_api({None: [["svc-1"], ["svc-2"]]})
+
+    names = [svc.name for svc in ServiceQuery().services(api_mock)]
+
+    assert ["svc-1", "svc-2"] == names
+    assert all(call["namespace"] is None for call in api_mock.calls)
+
+
+def test_services_per_namespace():
+    api_mock = mock_api({"ns-1": [["svc-1"]], "ns-2": [["svc-2"]], "ns-3": [[]]})
+    query = ServiceQuery(
+        namespaces=["ns-2", "ns-1", "ns-3"], exclude_namespaces=["ns-3"]
+    )
+
+    names = [svc.name for svc in query.services(api_mock)]
+
+    assert ["svc-1", "svc-2"] == names
+    assert ["ns-1", "ns-2"] == [call["namespace"] for call in api_mock.calls]
@@ -0,0 +1,76 @@
+import os
+from unittest.mock import MagicMock
+
+import pytest
+import requests
+from pykube.exceptions import HTTPError
+
+from openapi_collector import helpers
+from openapi_collector.helpers import KubeClient, is_auth_error
+
+
+@pytest.fixture
+def credentials(tmpdir, monkeypatch):
+    token = tmpdir.join("token")
+    token.write("token")
+    monkeypatch.setattr(helpers, "SERVICE_ACCOUNT_TOKEN_PATH", str(token))
+
+    built = []
+
+    def get_kube_api():
+        built.append(MagicMock())
+        return built[-1]
+
+    monkeypatch.setattr(helpers, "get_kube_api", get_kube_api)
+    return token, built
+
+
+def test_client_reused(credentials):
+    _, built = credentials
+    client = KubeClient()
+
+    assert client.get() is client.get()
+    assert 1 == len(built)
+
+
+def test_client_rebuilt_on_credentials_change(credentials):
+    token, built = credentials
+    client = KubeClient()
+
+    api = client.get()
+    mtime = os.stat(str(token)).st_mtime
+    os.utime(str(token), (mtime + 10, mtime + 10))
+
+    assert client.get() is not api
+    assert 2 == len(built)
+
+
+def test_client_rebuilt_after_auth_failure(credentials):
+    _, built = credentials
+    client = KubeClient()
+
+    api = client.get()
+    client.auth_failed()
+
+    assert client.get() is not api
+    assert 2 == len(built)
+
+
+def test_auth_failed_backoff(monkeypatch):
+    monkeypatch.setattr(helpers, "AUTH_BACKOFF_MAX_SECONDS", 5)
+    client = KubeClient()
+
+    assert [1, 2, 4, 5, 5] == [client.auth_failed() for _ in range(5)]
+
+    client.reset_backoff()
+    assert 1 == client.auth_failed()
+
+
+def test_is_auth_error():
+    assert is_auth_error(HTTPError(401, "Unauthorized"))
+    assert not is_auth_error(HTTPError(403, "Forbidden"))
+
+    response = MagicMock(status_code=401)
+    assert is_auth_error(requests.HTTPError("401", response=response))
+
+    assert not is_auth_error(Exception("boom"))
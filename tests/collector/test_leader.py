@@ -0,0 +1,124 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from openapi_collector.leader import LeaderElector
+
+
+def response(status_code, obj=None):
+    return MagicMock(status_code=status_code, json=MagicMock(return_value=obj))
+
+
+def lease(holder, renew_time="2021-01-01T00:00:00.000000Z"):
+    return {
+        "metadata": {"name": "openapi-collector", "resourceVersion": "1"},
+        "spec": {
+            "holderIdentity": holder,
+            "leaseDurationSeconds": 8,
+            "renewTime": renew_time,
+            "leaseTransitions": 0,
+        },
+    }
+
+
+@pytest.fixture
+def api():
+    api = MagicMock(config=MagicMock(namespace="default"))
+    api.put.side_effect = lambda **kwargs: response(200, json.loads(kwargs["data"]))
+    return api
+
+
+@pytest.fixture
+def elector(api, clock):
+    return LeaderElector(
+        MagicMock(get=MagicMock(return_value=api)),
+        identity="pod-a",
+        lease_duration=8,
+        renew_interval=2,
+        clock=clock,
+    )
+
+
+def test_creates_lease(api, elector):
+    api.get.return_value = response(404)
+    api.post.return_value = response(201, lease("pod-a"))
+
+    assert elector.try_acquire()
+
+    _, kwargs = api.post.call_args
+    assert "coordination.k8s.io/v1" == kwargs["version"]
+    assert '"holderIdentity": "pod-a"' in kwargs["data"]
+
+
+def test_renews_own_lease(api, elector):
+    api.get.return_value = response(200, lease("pod-a"))
+
+    assert elector.try_acquire()
+    assert "pod-a" == json.loads(api.put.call_args[1]["data"])["spec"]["holderIdentity"]
+
+
+def test_takes_over_expired_lease(api, elector):
+    api.get.return_value = response(200, lease("pod-b"))
+
+    assert not elector.try_acquire()
+    elector.clock.now += 5
+    assert not elector.try_acquire()
+    api.put.assert_not_called()
+
+    elector.clock.now += 3
+    assert elector.try_acquire()
+    spec = json.loads(api.put.call_args[1]["data"])["spec"]
+    assert "pod-a" == spec["holderIdentity"]
+    assert 1 == spec["leaseTransitions"]
+
+
+def test_renewed_lease_is_not_taken_over(api, elector):
+    api.get.return_value = response(200, lease("pod-b"))
+    assert not elector.try_acquire()
+
+    elector.clock.now += 5
+    api.get.return_value = response(200, lease("pod-b", "2021-01-01T00:00:05.000000Z"))
+    assert not elector.try_acquire()
+
+    elector.clock.now += 5
+    assert not elector.try_acquire()
+
+
+def test_takes_over_released_lease(api, elector):
+    api.get.return_value = response(200, lease(None))
+
+    assert elector.try_acquire()
+
+
+def test_conflict(api, elector):
+    api.get.return_value = response(200, lease("pod-a"))
+    api.put.side_effect = None
+    api.put.return_value = response(409)
+
+    assert not elector.try_acquire()
+
+
+def test_steps_down_when_renewals_fail(api, elector):
+    api.get.return_value = response(200, lease("pod-a"))
+    elector.run_once()
+    assert elector.is_leader
+
+    api.get.side_effect = Exception("API unavailable")
+    elector.clock.now += 2
+    elector.run_once()
+    assert elector.is_leader
+
+    elector.clock.now += 4
+    elector.run_once()
+    assert not elector.is_leader
+
+
+def test_release(api, elector):
+    api.get.return_value = response(200, lease("pod-a"))
+    elector.run_once()
+
+    elector.release()
+
+    assert not elector.is_leader
+    assert json.loads(api.put.call_args[1]["data"])["spec"]["holderIdentity"] is None
@@ -1,8 +1,26 @@
+import pykube
 import pytest
 
 from unittest.mock import MagicMock
 
-from openapi_collector.main import main
+from openapi_collector.main import (
+    main,
+    observe_loop,
+    run_loop,
+    run_watch,
+    watch_timeout,
+)
+from openapi_collector.metrics import LOOP_OVERRUNS
+from openapi_collector.reconcile import ConfigMapReconciler
+from openapi_collector.schedule import AdaptiveInterval
+from openapi_collector.watch import WATCH_TIMEOUT_SECONDS
+
+
+@pytest.fixture(autouse=True)
+def mock_metrics_server(monkeypatch):
+    start_http_server = MagicMock()
+    monkeypatch.setattr("openapi_collector.main.start_http_server", start_http_server)
+    return start_http_server
 
 
 @pytest.fixture
@@ -51,3 +69,406 @@ def test_main_continue_on_failure(kubeconfig, monkeypatch):
     main(["--interval=0"])
 
     assert len(calls) == 2
+
+
+def test_main_watch_continue_on_failure(kubeconfig, monkeypatch):
+    monkeypatch.setenv("KUBECONFIG", kubeconfig)
+
+    mock_shutdown = MagicMock()
+    mock_handler = MagicMock()
+    mock_handler.shutdown_now = False
+    mock_shutdown.GracefulShutdown.return_value = mock_handler
+
+    calls = []
+
+    class MockWatcher:
+        def __init__(self, query):
+            pass
+
+        def restart(self):
+            pass
+
+        def changes(self, api):
+            calls.append(api)
+            if len(calls) == 1:
+                raise Exception("watch fails on first run")
+            yield ["spec-1"]
+            yield ["spec-2"]
+
+    written = []
+
+    def mock_write_configmaps(api, specs, reconciler, options, prober):
+        written.append(specs)
+        if len(written) == 2:
+            mock_handler.shutdown_now = True
+
+    monkeypatch.setattr("openapi_collector.main.ServiceWatcher", MockWatcher)
+    monkeypatch.setattr(
+        "openapi_collector.main.write_configmaps", mock_write_configmaps
+    )
+    monkeypatch.setattr("openapi_collector.main.shutdown", mock_shutdown)
+
+    main(["--watch", "--interval=0"])
+
+    assert len(calls) == 2
+    assert [["spec-1"], ["spec-2"]] == written
+
+
+@pytest.mark.parametrize(
+    "due,timeout",
+    [(None, WATCH_TIMEOUT_SECONDS), (9.2, 10), (-3, 1), (1000, WATCH_TIMEOUT_SECONDS)],
+)
+def test_watch_timeout(due, timeout):
+    prober = MagicMock()
+    prober.next_due.return_value = due
+
+    assert timeout == watch_timeout(prober)
+    assert WATCH_TIMEOUT_SECONDS == watch_timeout(None)
+
+
+def test_run_watch_probes_when_watch_ends(kubeconfig, monkeypatch):
+    monkeypatch.setenv("KUBECONFIG", kubeconfig)
+
+    mock_shutdown = MagicMock()
+    mock_handler = MagicMock()
+    mock_handler.shutdown_now = False
+    mock_shutdown.GracefulShutdown.return_value = mock_handler
+
+    prober = MagicMock()
+    prober.next_due.return_value = 10
+    timeouts = []
+
+    class MockWatcher:
+        def __init__(self, query):
+            self.index = MagicMock()
+            self.index.specs.return_value = ["spec-1"]
+
+        def restart(self):
+            pass
+
+        def changes(self, api):
+            timeouts.append(self.timeout)
+            if len(timeouts) == 1:
+                yield ["spec-1"]
+
+    written = []
+
+    def mock_write_configmaps(api, specs, reconciler, options, prober):
+        written.append(specs)
+        if len(written) == 3:
+            mock_handler.shutdown_now = True
+
+    monkeypatch.setattr("openapi_collector.main.ServiceWatcher", MockWatcher)
+    monkeypatch.setattr(
+        "openapi_collector.main.write_configmaps", mock_write_configmaps
+    )
+    monkeypatch.setattr("openapi_collector.main.shutdown", mock_shutdown)
+
+    run_watch(0, MagicMock(), prober=prober)
+
+    # no service changed after the first watch, yet specs were probed again
+    assert [["spec-1"]] * 3 == written
+    assert [10, 10] == timeouts
+
+
+def test_main_reuses_client(kubeconfig, monkeypatch):
+    monkeypatch.setenv("KUBECONFIG", kubeconfig)
+
+    mock_shutdown = MagicMock()
+    mock_handler = MagicMock()
+    mock_handler.shutdown_now = False
+    mock_shutdown.GracefulShutdown.return_value = mock_handler
+
+    apis = []
+
+    def mock_collect_specs(api, *args, **kwargs):
+        apis.append(api)
+        if len(apis) == 2:
+            mock_handler.shutdown_now = True
+
+    monkeypatch.setattr("openapi_collector.main.collect_specs", mock_collect_specs)
+    monkeypatch.setattr("openapi_collector.main.shutdown", mock_shutdown)
+
+    main(["--interval=0"])
+
+    assert apis[0] is apis[1]
+
+
+def test_main_no_configmaps_requires_output_dir():
+    with pytest.raises(SystemExit):
+        main(["--no-configmaps"])
+
+
+def test_main_follower_mirrors(kubeconfig, monkeypatch, tmp_path):
+    monkeypatch.setenv("KUBECONFIG", kubeconfig)
+
+    mock_shutdown = MagicMock()
+    mock_handler = MagicMock()
+    mock_handler.shutdown_now = False
+    mock_shutdown.GracefulShutdown.return_value = mock_handler
+
+    mock_elector = MagicMock(is_leader=False)
+    mock_elector.wait_leading.return_value = False
+
+    mirrored = []
+
+    def mock_mirror_configmaps(api, writer):
+        mirrored.append(writer.path)
+        mock_handler.shutdown_now = True
+
+    monkeypatch.setattr(
+        "openapi_collector.main.LeaderElector", lambda *args, **kwargs: mock_elector
+    )
+    monkeypatch.setattr(
+        "openapi_collector.main.mirror_configmaps", mock_mirror_configmaps
+    )
+    monkeypatch.setattr("openapi_collector.main.collect_specs", MagicMock())
+    monkeypatch.setattr("openapi_collector.main.shutdown", mock_shutdown)
+
+    main(["--leader-elect", f"--output-dir={tmp_path}"])
+
+    assert [str(tmp_path)] == mirrored
+    mock_elector.start.assert_called_once_with()
+    mock_elector.stop.assert_called_once_with()
+
+
+def test_main_serves_metrics(kubeconfig, monkeypatch, mock_metrics_server):
+    monkeypatch.setenv("KUBECONFIG", kubeconfig)
+    monkeypatch.setattr("openapi_collector.main.run_loop", MagicMock())
+
+    main(["--metrics-port=9999"])
+    mock_metrics_server.assert_called_once_with(9999)
+
+    mock_metrics_server.reset_mock()
+    main(["--metrics-port=0"])
+    mock_metrics_server.assert_not_called()
+
+
+def test_observe_loop_counts_overruns():
+    overruns = LOOP_OVERRUNS._value.get()
+
+    observe_loop(1, 30)
+    assert overruns == LOOP_OVERRUNS._value.get()
+
+    observe_loop(31, 30)
+    assert overruns + 1 == LOOP_OVERRUNS._value.get()
+
+
+def test_run_loop_adapts_interval(kubeconfig, monkeypatch):
+    monkeypatch.setenv("KUBECONFIG", kubeconfig)
+
+    mock_shutdown = MagicMock()
+    mock_handler = MagicMock()
+    mock_handler.shutdown_now = False
+    mock_shutdown.GracefulShutdown.return_value = mock_handler
+
+    results = [True, Exception("collect_specs fails"), False]
+
+    def mock_collect_specs(*args, **kwargs):
+        result = results.pop(0)
+        if not results:
+            mock_handler.shutdown_now = True
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    sleeps = []
+    schedule = MagicMock()
+    schedule.succeeded.side_effect = lambda changed: 10 if changed else 20
+    schedule.failed.return_value = 0
+    schedule.interval = 30
+
+    monkeypatch.setattr("openapi_collector.main.collect_specs", mock_collect_specs)
+    monkeypatch.setattr("openapi_collector.main.shutdown", mock_shutdown)
+    monkeypatch.setattr("openapi_collector.main.time.sleep", sleeps.append)
+
+    run_loop(30, None, schedule=schedule)
+
+    assert [10, 0] == sleeps
+    assert [((True,),), ((False,),)] == schedule.succeeded.call_args_list
+    schedule.failed.assert_called_once_with()
+
+
+def test_run_loop_overruns_scheduled_interval(kubeconfig, monkeypatch):
+    monkeypatch.setenv("KUBECONFIG", kubeconfig)
+
+    mock_shutdown = MagicMock()
+    mock_handler = MagicMock()
+    mock_handler.shutdown_now = False
+    mock_shutdown.GracefulShutdown.return_value = mock_handler
+
+    results = [False, True, False]
+    overruns = []
+
+    def mock_collect_specs(*args, **kwargs):
+        overruns.append(LOOP_OVERRUNS._value.get())
+        result = results.pop(0)
+        if not results:
+            mock_handler.shutdown_now = True
+        return result
+
+    # the collections take 5s, 3s and 1s
+    clock = iter([0, 5, 100, 103, 200, 201])
+
+    monkeypatch.setattr("openapi_collector.main.collect_specs", mock_collect_specs)
+    monkeypatch.setattr("openapi_collector.main.shutdown", mock_shutdown)
+    monkeypatch.setattr("openapi_collector.main.time.monotonic", lambda: next(clock))
+    monkeypatch.setattr("openapi_collector.main.time.sleep", MagicMock())
+
+    # stretched to 8s after the first collection, back to 2s after the second
+    run_loop(4, None, schedule=AdaptiveInterval(4, 2, stretch_after=1))
+
+    assert [overruns[0], overruns[0], overruns[0] + 1] == overruns
+
+
+def test_run_watch_closes_watch_when_no_longer_leading(kubeconfig, monkeypatch):
+    monkeypatch.setenv("KUBECONFIG", kubeconfig)
+
+    mock_shutdown = MagicMock()
+    mock_handler = MagicMock()
+    mock_handler.shutdown_now = False
+    mock_shutdown.GracefulShutdown.return_value = mock_handler
+
+    mock_elector = MagicMock(is_leader=True)
+    closed = []
+
+    class MockWatcher:
+        def __init__(self, query):
+            pass
+
+        def restart(self):
+            pass
+
+        def changes(self, api):
+            try:
+                mock_elector.is_leader = False
+                yield ["spec-1"]
+                yield ["spec-2"]
+            finally:
+                closed.append(True)
+                mock_handler.shutdown_now = True
+
+    monkeypatch.setattr("openapi_collector.main.ServiceWatcher", MockWatcher)
+    monkeypatch.setattr("openapi_collector.main.write_configmaps", MagicMock())
+    monkeypatch.setattr("openapi_collector.main.shutdown", mock_shutdown)
+
+    run_watch(0, MagicMock(), elector=mock_elector)
+
+    assert [True] == closed
+
+
+def mock_configmap_api(live):
+    """
+    Serves the data in live as the test-cm ConfigMap, and patches it.
+    """
+    api_mock = MagicMock(config=MagicMock(namespace="default"))
+
+    def get(**kwargs):
+        response = MagicMock(status_code=200)
+        response.json.return_value = {"metadata": {"name": "test-cm"}, "data": live}
+        return response
+
+    api_mock.get.side_effect = get
+    return api_mock
+
+
+def test_run_loop_rewrites_after_regaining_lease(kubeconfig, monkeypatch):
+    monkeypatch.setenv("KUBECONFIG", kubeconfig)
+
+    mock_shutdown = MagicMock()
+    mock_handler = MagicMock()
+    mock_handler.shutdown_now = False
+    mock_shutdown.GracefulShutdown.return_value = mock_handler
+
+    live = {"a": "1"}
+    api_mock = mock_configmap_api(live)
+    # leads, loses the lease, and takes it back
+    leading = [True, False, True]
+    mock_elector = MagicMock(is_leader=True)
+    mock_elector.wait_leading.return_value = False
+
+    def mock_collect_specs(api, reconciler, *args):
+        cm = pykube.ConfigMap(
+            api_mock, {"metadata": {"name": "test-cm"}, "data": {"a": "1"}}
+        )
+        reconciler.apply(cm)
+        return False
+
+    def mock_wait(delay, elector):
+        leading.pop(0)
+        if not leading:
+            mock_handler.shutdown_now = True
+            return
+        mock_elector.is_leader = leading[0]
+        if not leading[0]:
+            # the other leader writes its own data meanwhile
+            live["a"] = "2"
+
+    monkeypatch.setattr("openapi_collector.main.collect_specs", mock_collect_specs)
+    monkeypatch.setattr("openapi_collector.main.shutdown", mock_shutdown)
+    monkeypatch.setattr("openapi_collector.main.wait", mock_wait)
+
+    run_loop(0, None, reconciler=ConfigMapReconciler(), elector=mock_elector)
+
+    patch_calls = api_mock.patch.call_args_list
+    assert 1 == len(patch_calls)
+    _, patch_call = patch_calls[0]
+    assert '{"data": {"a": "1"}}' == patch_call["data"]
+
+
+def test_run_watch_rewrites_after_regaining_lease(kubeconfig, monkeypatch):
+    monkeypatch.setenv("KUBECONFIG", kubeconfig)
+
+    mock_shutdown = MagicMock()
+    mock_handler = MagicMock()
+    mock_handler.shutdown_now = False
+    mock_shutdown.GracefulShutdown.return_value = mock_handler
+
+    live = {"a": "1"}
+    api_mock = mock_configmap_api(live)
+    mock_elector = MagicMock(is_leader=True)
+    mock_elector.wait_leading.return_value = False
+    restarts = []
+
+    class MockWatcher:
+        def __init__(self, query):
+            pass
+
+        def restart(self):
+            restarts.append(True)
+
+        def changes(self, api):
+            # the services did not change, but the watch was restarted so
+            # the first call yields the listed specs
+            if restarts:
+                restarts.clear()
+                yield ["spec-1"]
+
+    def mock_write_configmaps(api, specs, reconciler, options, prober):
+        cm = pykube.ConfigMap(
+            api_mock, {"metadata": {"name": "test-cm"}, "data": {"a": "1"}}
+        )
+        reconciler.apply(cm)
+        if live["a"] == "2":
+            mock_handler.shutdown_now = True
+        else:
+            # loses the lease, and the other leader writes its own data
+            mock_elector.is_leader = False
+            live["a"] = "2"
+
+    def mock_wait(delay, elector):
+        # takes the lease back
+        mock_elector.is_leader = True
+
+    monkeypatch.setattr("openapi_collector.main.ServiceWatcher", MockWatcher)
+    monkeypatch.setattr(
+        "openapi_collector.main.write_configmaps", mock_write_configmaps
+    )
+    monkeypatch.setattr("openapi_collector.main.shutdown", mock_shutdown)
+    monkeypatch.setattr("openapi_collector.main.wait", mock_wait)
+
+    run_watch(0, None, reconciler=ConfigMapReconciler(), elector=mock_elector)
+
+    assert api_mock.patch.called
+    _, patch_call = api_mock.patch.call_args
+    assert '{"data": {"a": "1"}}' == patch_call["data"]
@@ -0,0 +1,82 @@
+import gzip
+import os
+from unittest.mock import MagicMock
+
+from openapi_collector.collector import Spec
+from openapi_collector.config_gen import (
+    ROUTER_CONFIGMAP_NAME,
+    UI_CONFIGMAP_NAME,
+    ConfigOptions,
+    build_router_configmaps,
+    build_ui_configmap,
+)
+from openapi_collector.output import DirectoryWriter, MultiWriter
+
+PREFIXES = [ROUTER_CONFIGMAP_NAME, UI_CONFIGMAP_NAME]
+
+
+def test_apply_writes_files(tmp_path):
+    api_mock = MagicMock(config=MagicMock(namespace="default"))
+    cm = build_ui_configmap(api_mock, [Spec("svc", "ns", 80, "/")])
+    writer = DirectoryWriter(str(tmp_path))
+
+    assert writer.apply(cm)
+
+    directory = tmp_path / UI_CONFIGMAP_NAME
+    assert {
+        "swagger-config.json",
+        "swagger-config.json.gz",
+        "specs.json",
+    } == set(os.listdir(directory))
+    config = (directory / "swagger-config.json").read_bytes()
+    assert config == gzip.decompress(
+        (directory / "swagger-config.json.gz").read_bytes()
+    )
+
+
+def test_apply_skips_unchanged(tmp_path):
+    api_mock = MagicMock(config=MagicMock(namespace="default"))
+    cm = build_ui_configmap(api_mock, [Spec("svc", "ns", 80, "/")])
+    writer = DirectoryWriter(str(tmp_path))
+    writer.apply(cm)
+    mtime = os.stat(tmp_path / UI_CONFIGMAP_NAME / "specs.json").st_mtime_ns
+
+    assert not writer.apply(cm)
+    assert mtime == os.stat(tmp_path / UI_CONFIGMAP_NAME / "specs.json").st_mtime_ns
+
+
+def test_prune_deletes_stale_files(tmp_path):
+    api_mock = MagicMock(config=MagicMock(namespace="default"))
+    options = ConfigOptions(shards=2)
+    writer = DirectoryWriter(str(tmp_path))
+    specs = [Spec("svc", f"ns-{i}", 80, "/") for i in range(4)]
+
+    for cm in build_router_configmaps(api_mock, specs, options):
+        writer.apply(cm)
+    writer.prune(api_mock, [], PREFIXES)
+    assert 8 == len(os.listdir(tmp_path / ROUTER_CONFIGMAP_NAME))
+
+    for cm in build_router_configmaps(api_mock, specs[:1], options):
+        writer.apply(cm)
+    writer.prune(api_mock, [], PREFIXES)
+
+    assert {"svc-ns-0-upstream.conf", "svc-ns-0-location.conf"} == set(
+        os.listdir(tmp_path / ROUTER_CONFIGMAP_NAME)
+    )
+
+
+def test_multi_writer():
+    writers = [MagicMock(), MagicMock()]
+    writers[0].apply.return_value = False
+    writers[1].apply.return_value = True
+    cm = MagicMock()
+
+    multi = MultiWriter(writers)
+
+    assert multi.apply(cm)
+    multi.prune("api", ["a"], PREFIXES)
+    multi.forget()
+    for writer in writers:
+        writer.apply.assert_called_once_with(cm)
+        writer.prune.assert_called_once_with("api", ["a"], PREFIXES)
+        writer.forget.assert_called_once_with()
@@ -0,0 +1,101 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from openapi_collector.collector import Spec
+from openapi_collector.probe import FAILURE_TTL_SECONDS, SpecProber, endpoints_ready
+
+READY = {"subsets": [{"addresses": [{"ip": "10.0.0.1"}]}]}
+NOT_READY = {"subsets": [{"notReadyAddresses": [{"ip": "10.0.0.1"}]}]}
+
+
+def endpoints_api(endpoints):
+    """
+    Returns an API mock serving the given Endpoints objects, by service name.
+    """
+    api = MagicMock()
+
+    def get(url, namespace, timeout):
+        name = url.split("/")[1]
+        if name not in endpoints:
+            return MagicMock(status_code=404)
+        return MagicMock(status_code=200, json=MagicMock(return_value=endpoints[name]))
+
+    api.get.side_effect = get
+    return api
+
+
+@pytest.fixture
+def prober(clock):
+    prober = SpecProber(concurrency=4, timeout=1, ttl=60, clock=clock)
+    prober.session = MagicMock()
+    prober.session.get.return_value.__enter__.return_value.status_code = 200
+    return prober
+
+
+@pytest.mark.parametrize(
+    "endpoints,ready",
+    [
+        pytest.param({"svc": READY}, True, id="ready"),
+        pytest.param({"svc": NOT_READY}, False, id="not-ready"),
+        pytest.param({"svc": {}}, False, id="no-subsets"),
+        pytest.param({}, False, id="missing"),
+    ],
+)
+def test_endpoints_ready(endpoints, ready):
+    api = endpoints_api(endpoints)
+
+    assert ready == endpoints_ready(api, Spec("svc", "ns", 80, "/"), 1)
+
+
+def test_available(prober):
+    api = endpoints_api({"a": READY, "b": NOT_READY, "c": READY})
+    specs = [Spec(name, "ns", 80, "/v1") for name in ["c", "b", "a"]]
+
+    assert [specs[0], specs[2]] == prober.available(api, specs)
+
+    urls = sorted(args[0] for (args, _) in prober.session.get.call_args_list)
+    assert ["http://a.ns:80/v1/openapi.json", "http://c.ns:80/v1/openapi.json"] == urls
+
+
+def test_available_spec_error(prober):
+    api = endpoints_api({"a": READY})
+    prober.session.get.return_value.__enter__.return_value.status_code = 404
+
+    assert [] == prober.available(api, [Spec("a", "ns", 80, "/")])
+
+
+def test_available_caches_results(prober):
+    api = endpoints_api({"a": READY})
+    spec = Spec("a", "ns", 80, "/")
+
+    prober.available(api, [spec])
+    prober.available(api, [spec])
+    assert 1 == api.get.call_count
+
+    prober.clock.now += 60
+    prober.available(api, [spec])
+    assert 2 == api.get.call_count
+
+
+def test_available_reprobes_failures_sooner(prober):
+    api = endpoints_api({})
+    spec = Spec("a", "ns", 80, "/")
+    assert [] == prober.available(api, [spec])
+
+    api = endpoints_api({"a": READY})
+    prober.clock.now += FAILURE_TTL_SECONDS
+
+    assert [spec] == prober.available(api, [spec])
+
+
+def test_next_due(prober):
+    assert prober.next_due() is None
+
+    prober.available(endpoints_api({"a": READY}), [Spec("a", "ns", 80, "/")])
+    prober.available(
+        endpoints_api({}), [Spec("a", "ns", 80, "/"), Spec("b", "ns", 80, "/")]
+    )
+    prober.clock.now += 4
+
+    assert FAILURE_TTL_SECONDS - 4 == prober.next_due()
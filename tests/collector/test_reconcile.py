@@ -0,0 +1,163 @@
+import json
+from unittest.mock import MagicMock
+
+import pykube
+
+from openapi_collector.metrics import CONFIGMAP_WRITES
+from openapi_collector.reconcile import ConfigMapReconciler, data_hash, data_patch
+
+
+def configmap(api, data):
+    return pykube.ConfigMap(api, {"metadata": {"name": "test-cm"}, "data": data})
+
+
+def mock_api(live_data=None):
+    api_mock = MagicMock(config=MagicMock(namespace="default"))
+
+    response = MagicMock()
+    if live_data is None:
+        response.status_code = 404
+        response.ok = False
+    else:
+        response.status_code = 200
+        response.json.return_value = {
+            "metadata": {"name": "test-cm"},
+            "data": live_data,
+        }
+
+    api_mock.get.return_value = response
+    return api_mock
+
+
+def writes(result):
+    return CONFIGMAP_WRITES.labels("test-cm", result)._value.get()
+
+
+def test_data_hash_is_order_independent():
+    assert data_hash({"a": "1", "b": "2"}) == data_hash({"b": "2", "a": "1"})
+    assert data_hash({"a": "1"}) != data_hash({"a": "2"})
+
+
+def test_data_patch():
+    live = {"same": "x", "changed": "old", "removed": "y"}
+    new = {"same": "x", "changed": "new", "added": "z"}
+
+    assert {"changed": "new", "added": "z", "removed": None} == data_patch(live, new)
+
+
+def test_apply_creates_missing():
+    api_mock = mock_api()
+
+    assert ConfigMapReconciler().apply(configmap(api_mock, {"a": "1"}))
+
+    assert 1 == api_mock.post.call_count
+    assert not api_mock.patch.called
+
+
+def test_apply_patches_changed():
+    api_mock = mock_api({"a": "1", "b": "2"})
+
+    assert ConfigMapReconciler().apply(configmap(api_mock, {"a": "1", "c": "3"}))
+
+    assert not api_mock.post.called
+    _, patch_call = api_mock.patch.call_args
+    assert {"data": {"b": None, "c": "3"}} == json.loads(patch_call["data"])
+
+
+def test_apply_skips_unchanged_live():
+    api_mock = mock_api({"a": "1"})
+    skipped = writes("skipped")
+
+    assert not ConfigMapReconciler().apply(configmap(api_mock, {"a": "1"}))
+
+    assert not api_mock.post.called
+    assert not api_mock.patch.called
+    assert skipped + 1 == writes("skipped")
+
+
+def test_apply_skips_cached_without_reading():
+    api_mock = mock_api()
+    reconciler = ConfigMapReconciler()
+    applied = writes("applied")
+    skipped = writes("skipped")
+
+    assert reconciler.apply(configmap(api_mock, {"a": "1"}))
+    assert not reconciler.apply(configmap(api_mock, {"a": "1"}))
+
+    assert 1 == api_mock.get.call_count
+    assert applied + 1 == writes("applied")
+    assert skipped + 1 == writes("skipped")
+
+
+def test_apply_resyncs_with_live():
+    api_mock = mock_api()
+    reconciler = ConfigMapReconciler(resync_seconds=0)
+
+    reconciler.apply(configmap(api_mock, {"a": "1"}))
+    reconciler.apply(configmap(api_mock, {"a": "1"}))
+
+    # the ConfigMap was deleted behind our back, so it is created again
+    assert 2 == api_mock.post.call_count
+
+
+def test_apply_after_forget_reads_live():
+    api_mock = mock_api()
+    reconciler = ConfigMapReconciler()
+
+    reconciler.apply(configmap(api_mock, {"a": "1"}))
+    reconciler.forget()
+    reconciler.apply(configmap(api_mock, {"a": "1"}))
+
+    assert 2 == api_mock.get.call_count
+
+
+def test_apply_failure_not_cached():
+    api_mock = mock_api()
+    api_mock.post.side_effect = Exception("create failed")
+    reconciler = ConfigMapReconciler()
+
+    try:
+        reconciler.apply(configmap(api_mock, {"a": "1"}))
+    except Exception:
+        pass
+
+    api_mock.post.side_effect = None
+    assert reconciler.apply(configmap(api_mock, {"a": "1"}))
+
+
+def test_apply_patches_binary_data():
+    api_mock = mock_api({"a": "1"})
+    cm = configmap(api_mock, {"a": "1"})
+    cm.obj["binaryData"] = {"a.gz": "MQ=="}
+
+    assert ConfigMapReconciler().apply(cm)
+
+    _, patch_call = api_mock.patch.call_args
+    assert {"binaryData": {"a.gz": "MQ=="}} == json.loads(patch_call["data"])
+
+
+def test_prune_deletes_stale_shards():
+    api_mock = mock_api()
+    response = MagicMock()
+    response.json.return_value = {
+        "items": [
+            {"metadata": {"name": name, "namespace": "default"}}
+            for name in ["test-cm", "test-cm-0", "test-cm-1", "test-cm-x", "other"]
+        ]
+    }
+    api_mock.get.return_value = response
+    reconciler = ConfigMapReconciler()
+
+    reconciler.prune(api_mock, ["test-cm-0"], ["test-cm"])
+
+    deleted = [kwargs["url"] for (_, kwargs) in api_mock.delete.call_args_list]
+    assert ["/configmaps/test-cm", "/configmaps/test-cm-1"] == deleted
+
+    # the same ConfigMaps are kept, so they are not listed again
+    reconciler.prune(api_mock, ["test-cm-0"], ["test-cm"])
+    assert 1 == api_mock.get.call_count
+
+    # forgotten, so they are listed again
+    reconciler.forget()
+    reconciler.prune(api_mock, ["test-cm-0"], ["test-cm"])
+    assert 2 == api_mock.get.call_count
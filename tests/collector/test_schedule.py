@@ -0,0 +1,65 @@
+import pytest
+
+from openapi_collector.metrics import INTERVAL
+from openapi_collector.schedule import AdaptiveInterval
+
+
+def upper_bound(low, high):
+    return high
+
+
+@pytest.fixture
+def schedule():
+    return AdaptiveInterval(
+        30, min_interval=10, max_interval=100, stretch_after=2, uniform=upper_bound
+    )
+
+
+def test_stretches_while_unchanged(schedule):
+    delays = [schedule.succeeded(False) for _ in range(8)]
+
+    assert [30, 60, 60, 100, 100, 100, 100, 100] == delays
+    assert 100 == INTERVAL._value.get()
+
+
+def test_snaps_back_on_change(schedule):
+    for _ in range(4):
+        schedule.succeeded(False)
+
+    assert 10 == schedule.succeeded(True)
+    assert [10, 20] == [schedule.succeeded(False) for _ in range(2)]
+
+
+def test_backs_off_on_failure(schedule):
+    assert [20, 40, 80, 100, 100] == [schedule.failed() for _ in range(5)]
+    assert 100 == INTERVAL._value.get()
+
+    # the interval is kept across failures
+    assert 30 == schedule.succeeded(False)
+    assert 20 == schedule.failed()
+
+
+def test_failure_full_jitter():
+    bounds = []
+
+    def uniform(low, high):
+        bounds.append((low, high))
+        return low
+
+    schedule = AdaptiveInterval(30, uniform=uniform)
+
+    assert 0 == schedule.failed()
+    assert 0 == schedule.failed()
+    assert [(0, 60), (0, 120)] == bounds
+
+
+@pytest.mark.parametrize(
+    "kwargs, interval",
+    [
+        ({}, 30),
+        ({"min_interval": 60}, 60),
+        ({"max_interval": 10}, 30),
+    ],
+)
+def test_bounds(kwargs, interval):
+    assert interval == AdaptiveInterval(30, **kwargs).interval
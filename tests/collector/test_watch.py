@@ -0,0 +1,267 @@
+import json
+from unittest.mock import MagicMock
+
+import pykube
+import pytest
+from pykube.exceptions import HTTPError
+
+from openapi_collector.collector import Spec
+from openapi_collector.discovery import ServiceQuery
+from openapi_collector.watch import (
+    ResourceExpired,
+    ServiceIndex,
+    ServiceWatcher,
+    watch_services,
+)
+
+
+def service(name, namespace="ns-1", collect="true", resource_version="1", **ann):
+    annotations = {"openapi/collect": collect}
+    annotations.update(ann)
+    return {
+        "metadata": {
+            "name": name,
+            "namespace": namespace,
+            "resourceVersion": resource_version,
+            "annotations": annotations,
+        }
+    }
+
+
+def event(event_type, obj):
+    return json.dumps({"type": event_type, "object": obj}).encode()
+
+
+def mock_api(items, events, list_resource_version="10"):
+    api_mock = MagicMock()
+    calls = []
+
+    def get(**kwargs):
+        calls.append(kwargs)
+        response = MagicMock(status_code=200)
+
+        if kwargs.get("params", {}).get("watch") == "true":
+            response.iter_lines.return_value = events
+        else:
+            response.json.return_value = {
+                "metadata": {"resourceVersion": list_resource_version},
+                "items": items,
+            }
+        return response
+
+    api_mock.get = get
+    api_mock.calls = calls
+    return api_mock
+
+
+def test_index_update_add_and_modify():
+    index = ServiceIndex()
+
+    assert index.update(pykube.Service(None, service("svc-1")))
+    assert [Spec("svc-1", "ns-1", 80, "/")] == index.specs()
+
+    # same spec, different resourceVersion
+    assert not index.update(
+        pykube.Service(None, service("svc-1", resource_version="2"))
+    )
+
+    assert index.update(
+        pykube.Service(None, service("svc-1", **{"openapi/path": "/v1"}))
+    )
+    assert [Spec("svc-1", "ns-1", 80, "/v1")] == index.specs()
+
+
+def test_index_update_no_longer_collected():
+    index = ServiceIndex()
+    index.update(pykube.Service(None, service("svc-1")))
+
+    assert index.update(pykube.Service(None, service("svc-1", collect="false")))
+    assert [] == index.specs()
+
+    assert not index.update(pykube.Service(None, service("svc-1", collect="false")))
+
+
+def test_index_remove():
+    index = ServiceIndex()
+    index.update(pykube.Service(None, service("svc-1")))
+
+    assert index.remove(pykube.Service(None, service("svc-1")))
+    assert not index.remove(pykube.Service(None, service("svc-1")))
+    assert [] == index.specs()
+
+
+def test_index_replace():
+    index = ServiceIndex()
+
+    services = [
+        pykube.Service(None, service("svc-2")),
+        pykube.Service(None, service("svc-1")),
+        pykube.Service(None, service("svc-3", collect="false")),
+    ]
+    assert index.replace(services)
+    assert ["svc-1", "svc-2"] == [spec.name for spec in index.specs()]
+
+    assert not index.replace(services)
+    assert index.replace(services[:1])
+
+
+def test_index_forgets_named_ports():
+    api_mock = MagicMock()
+
+    def named_port_service(name):
+        obj = service(name, **{"openapi/port": "api"})
+        obj["metadata"]["uid"] = f"uid-{name}"
+        api_mock.get.return_value.json.return_value = dict(
+            obj, spec={"ports": [{"name": "api", "port": 8000}]}
+        )
+        return pykube.Service(api_mock, obj)
+
+    index = ServiceIndex()
+    index.replace([named_port_service("svc-1"), named_port_service("svc-2")])
+    assert 2 == api_mock.get.call_count
+
+    # svc-2 is gone from the list, svc-1 is deleted
+    index.replace([named_port_service("svc-1")])
+    index.remove(named_port_service("svc-1"))
+    assert [] == index.specs()
+
+    index.update(named_port_service("svc-1"))
+    index.update(named_port_service("svc-2"))
+    assert 4 == api_mock.get.call_count
+
+    # only the listed services stay cached
+    index.replace([named_port_service("svc-1")])
+    index.update(named_port_service("svc-2"))
+    assert 5 == api_mock.get.call_count
+
+
+def test_watch_services_params():
+    api_mock = mock_api([], [b"", event("ADDED", service("svc-1"))])
+
+    events = list(watch_services(api_mock, ServiceQuery(), "10", timeout=60))
+
+    assert [("ADDED", service("svc-1"))] == events
+    params = api_mock.calls[0]["params"]
+    assert "10" == params["resourceVersion"]
+    assert "true" == params["allowWatchBookmarks"]
+    assert 60 == params["timeoutSeconds"]
+    assert api_mock.calls[0]["stream"]
+
+
+def test_watcher_close_closes_watch():
+    api_mock = MagicMock()
+    api_mock.get.return_value.status_code = 200
+    api_mock.get.return_value.iter_lines.return_value = [
+        event("ADDED", service("svc-1")),
+        event("ADDED", service("svc-2")),
+    ]
+    watcher = ServiceWatcher()
+    watcher.resource_version = "10"
+
+    changes = watcher.changes(api_mock)
+    assert ["svc-1"] == [spec.name for spec in next(changes)]
+    api_mock.get.return_value.close.assert_not_called()
+
+    changes.close()
+    api_mock.get.return_value.close.assert_called_once_with()
+
+
+def test_watch_services_gone():
+    api_mock = MagicMock()
+    api_mock.get.return_value = MagicMock(status_code=410)
+
+    with pytest.raises(ResourceExpired):
+        list(watch_services(api_mock, ServiceQuery(), "10"))
+
+
+def test_watch_services_error_event():
+    gone = {"kind": "Status", "code": 410, "message": "too old resource version"}
+    api_mock = mock_api([], [event("ERROR", gone)])
+    with pytest.raises(ResourceExpired):
+        list(watch_services(api_mock, ServiceQuery(), "10"))
+
+    error = {"kind": "Status", "code": 500, "message": "internal error"}
+    api_mock = mock_api([], [event("ERROR", error)])
+    with pytest.raises(HTTPError):
+        list(watch_services(api_mock, ServiceQuery(), "10"))
+
+
+def test_watcher_initial_list_always_yields():
+    api_mock = mock_api([], [])
+    watcher = ServiceWatcher()
+
+    assert [[]] == list(watcher.changes(api_mock))
+    assert "10" == watcher.resource_version
+
+
+def test_watcher_yields_only_on_change():
+    events = [
+        event("ADDED", service("svc-2", resource_version="11")),
+        event("BOOKMARK", {"metadata": {"resourceVersion": "12"}}),
+        event("MODIFIED", service("svc-2", resource_version="13")),
+        event("ADDED", service("svc-3", collect="false", resource_version="14")),
+        event("DELETED", service("svc-1", resource_version="15")),
+    ]
+    api_mock = mock_api([service("svc-1")], events)
+    watcher = ServiceWatcher()
+
+    changes = [[spec.name for spec in specs] for specs in watcher.changes(api_mock)]
+
+    assert [["svc-1"], ["svc-1", "svc-2"], ["svc-2"]] == changes
+    assert "15" == watcher.resource_version
+
+
+def test_watcher_resumes_and_relists_on_expiry():
+    api_mock = mock_api([service("svc-1")], [])
+    watcher = ServiceWatcher()
+    list(watcher.changes(api_mock))
+
+    # resumes from the last resourceVersion without listing again
+    assert [] == list(watcher.changes(api_mock))
+    assert 3 == len(api_mock.calls)
+    assert "10" == api_mock.calls[2]["params"]["resourceVersion"]
+
+    gone = {"kind": "Status", "code": 410, "message": "too old resource version"}
+    watcher_api = mock_api([service("svc-1")], [event("ERROR", gone)])
+    assert [] == list(watcher.changes(watcher_api))
+    assert watcher.resource_version is None
+
+    # the list is unchanged, so nothing is yielded after re-listing
+    unchanged_api = mock_api([service("svc-1")], [], list_resource_version="20")
+    assert [] == list(watcher.changes(unchanged_api))
+    assert "20" == watcher.resource_version
+
+
+def test_watch_services_query():
+    api_mock = mock_api([], [])
+    query = ServiceQuery(
+        label_selector="openapi/collect=true",
+        namespaces=["ns-1"],
+        exclude_namespaces=["kube-system"],
+    )
+
+    list(watch_services(api_mock, query, "10"))
+
+    call = api_mock.calls[0]
+    assert "ns-1" == call["namespace"]
+    assert "openapi/collect=true" == call["params"]["labelSelector"]
+    assert "metadata.namespace!=kube-system" == call["params"]["fieldSelector"]
+    assert "PartialObjectMetadata;" in call["headers"]["Accept"]
+
+
+def test_watcher_filters_namespaces():
+    events = [
+        event("ADDED", service("svc-2", namespace="ns-2", resource_version="11")),
+        event("ADDED", service("svc-3", namespace="ns-3", resource_version="12")),
+    ]
+    api_mock = mock_api(
+        [service("svc-1", namespace="ns-1"), service("svc-4", namespace="ns-4")],
+        events,
+    )
+    watcher = ServiceWatcher(ServiceQuery(namespaces=["ns-1", "ns-2"]))
+
+    changes = [[spec.name for spec in specs] for specs in watcher.changes(api_mock)]
+
+    assert [["svc-1"], ["svc-1", "svc-2"]] == changes
+    assert api_mock.calls[0]["namespace"] is None
+    assert "12" == watcher.resource_version
@@ -0,0 +1,18 @@
+import pytest
+
+
+class Clock:
+    """
+    A monotonic clock that only moves when a test sets now.
+    """
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
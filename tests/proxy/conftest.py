@@ -0,0 +1,11 @@
+import pytest
+
+from openapi_proxy.main import app, spec_cache
+
+
+@pytest.fixture
+def client():
+    app.config["TESTING"] = True
+    spec_cache.clear()
+    with app.app_context():
+        yield app.test_client()
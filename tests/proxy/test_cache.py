@@ -0,0 +1,204 @@
+import json
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from openapi_proxy.cache import CacheEntry, SpecCache
+from openapi_proxy.main import spec_cache
+
+
+def test_entry_etag():
+    assert CacheEntry(b"{}").etag == CacheEntry(b"{}").etag
+    assert CacheEntry(b"{}").etag != CacheEntry(b"[]").etag
+
+
+def test_cache_lru_eviction():
+    cache = SpecCache(max_bytes=10)
+    cache.put("a", CacheEntry(b"aaaa"))
+    cache.put("b", CacheEntry(b"bbbb"))
+
+    # touch a, so that b is the least recently used
+    assert cache.get("a")
+    cache.put("c", CacheEntry(b"cccc"))
+
+    assert cache.get("a")
+    assert cache.get("b") is None
+    assert cache.get("c")
+    assert 8 == cache.size
+
+
+def test_cache_skips_oversized():
+    cache = SpecCache(max_bytes=2)
+    cache.put("a", CacheEntry(b"aaaa"))
+
+    assert cache.get("a") is None
+    assert 0 == cache.size
+
+
+def test_cache_put_replaces():
+    cache = SpecCache()
+    cache.put("a", CacheEntry(b"aaaa"))
+    cache.put("a", CacheEntry(b"aa"))
+
+    assert b"aa" == cache.get("a").body
+    assert 2 == cache.size
+    assert 1 == len(cache)
+
+
+def test_fetch_fresh_and_stale():
+    cache = SpecCache(ttl=60)
+    load = MagicMock(return_value=CacheEntry(b"{}"))
+
+    entry = cache.fetch("a", load)
+    assert entry is cache.fetch("a", load)
+    load.assert_called_once_with(None)
+
+    cache.ttl = 0
+    cache.fetch("a", load)
+    load.assert_called_with(entry)
+
+
+def test_fetch_collapses_concurrent_misses():
+    cache = SpecCache()
+    started = threading.Event()
+    calls = []
+
+    def load(stale_entry):
+        calls.append(stale_entry)
+        started.set()
+        time.sleep(0.1)
+        return CacheEntry(b"{}")
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.fetch("a", load)))
+        for _ in range(5)
+    ]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert 1 == len(calls)
+    assert 5 == len(results)
+    assert all(entry is results[0] for entry in results)
+
+
+def test_fetch_shares_errors():
+    cache = SpecCache()
+    started = threading.Event()
+
+    def load(stale_entry):
+        started.set()
+        time.sleep(0.1)
+        raise ValueError("upstream failed")
+
+    errors = []
+
+    def fetch():
+        try:
+            cache.fetch("a", load)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=fetch) for _ in range(3)]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert 3 == len(errors)
+    assert cache.get("a") is None
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    mock_session = MagicMock()
+    calls = []
+
+    def get(**kwargs):
+        calls.append(kwargs)
+
+        response = MagicMock(status_code=200, headers={"ETag": '"v1"'})
+        if kwargs["headers"].get("If-None-Match") == '"v1"':
+            response.status_code = 304
+        response.content = json.dumps({"info": {"title": "test"}}).encode()
+        return response
+
+    mock_session.get = get
+    monkeypatch.setattr("openapi_proxy.main.upstream.session", mock_session)
+    return calls
+
+
+def test_get_spec_cached(client, upstream):
+    resp = client.get("/svc-ns/openapi.json", headers={"ServerHost": "svc.ns"})
+    cached_resp = client.get("/svc-ns/openapi.json", headers={"ServerHost": "svc.ns"})
+
+    assert 1 == len(upstream)
+    assert resp.json == cached_resp.json
+    assert resp.headers["ETag"] == cached_resp.headers["ETag"]
+    assert "no-cache" in resp.headers["Cache-Control"]
+
+
+def test_get_spec_not_modified(client, upstream):
+    resp = client.get("/svc-ns/openapi.json", headers={"ServerHost": "svc.ns"})
+
+    not_modified = client.get(
+        "/svc-ns/openapi.json",
+        headers={"ServerHost": "svc.ns", "If-None-Match": resp.headers["ETag"]},
+    )
+
+    assert 304 == not_modified.status_code
+    assert not not_modified.data
+    # the client's validator is not forwarded upstream
+    assert all("If-None-Match" not in call["headers"] for call in upstream)
+
+
+def test_get_spec_revalidates_stale(client, upstream, monkeypatch):
+    monkeypatch.setattr(spec_cache, "ttl", 0)
+
+    resp = client.get("/svc-ns/openapi.json", headers={"ServerHost": "svc.ns"})
+    revalidated = client.get("/svc-ns/openapi.json", headers={"ServerHost": "svc.ns"})
+
+    assert 2 == len(upstream)
+    assert '"v1"' == upstream[1]["headers"]["If-None-Match"]
+    assert resp.json == revalidated.json
+
+
+def test_get_spec_unchanged_without_validators(client, monkeypatch):
+    monkeypatch.setattr(spec_cache, "ttl", 0)
+    # the upstream service sends no validators, so every request gets the
+    # whole spec
+    response = MagicMock(status_code=200, headers={})
+    response.content = json.dumps({"info": {"title": "test"}}).encode()
+    mock_session = MagicMock()
+    mock_session.get.return_value = response
+    monkeypatch.setattr("openapi_proxy.main.upstream.session", mock_session)
+
+    compressed = []
+    monkeypatch.setattr(
+        "openapi_proxy.cache.compress", lambda body: compressed.append(body) or {}
+    )
+
+    for _ in range(3):
+        resp = client.get("/svc-ns/openapi.json", headers={"ServerHost": "svc.ns"})
+
+    assert 3 == mock_session.get.call_count
+    assert 1 == len(compressed)
+    assert "revalidated" == resp.headers["X-Cache-Status"]
+
+
+def test_get_spec_keyed_by_authorization(client, upstream):
+    for token in ["a", "b", "a"]:
+        client.get(
+            "/svc-ns/openapi.json",
+            headers={"ServerHost": "svc.ns", "Authorization": f"Bearer {token}"},
+        )
+
+    assert 2 == len(upstream)
@@ -0,0 +1,95 @@
+from openapi_proxy.cmd import get_parser
+
+
+def test_get_parser():
+    parser = get_parser()
+    args = parser.parse_args(["--debug", "--cache-ttl=10", "--cache-max-bytes=1024"])
+    assert args.debug
+    assert 10 == args.cache_ttl
+    assert 1024 == args.cache_max_bytes
+
+
+def test_get_parser_server():
+    parser = get_parser()
+
+    args = parser.parse_args([])
+    assert "gunicorn" == args.server
+    assert 5000 == args.port
+
+    args = parser.parse_args(["--server=development", "--port=8000"])
+    assert "development" == args.server
+    assert 8000 == args.port
+
+
+def test_get_parser_prefetch():
+    parser = get_parser()
+
+    args = parser.parse_args([])
+    assert args.prefetch_manifest is None
+
+    args = parser.parse_args(
+        [
+            "--prefetch-manifest=/etc/openapi-proxy/specs.json",
+            "--prefetch-interval=10",
+            "--prefetch-concurrency=2",
+        ]
+    )
+    assert "/etc/openapi-proxy/specs.json" == args.prefetch_manifest
+    assert 10 == args.prefetch_interval
+    assert 2 == args.prefetch_concurrency
+
+
+def test_get_parser_swagger_config():
+    parser = get_parser()
+    assert parser.parse_args([]).swagger_config is None
+
+    args = parser.parse_args(
+        ["--swagger-config=/etc/openapi-proxy/swagger-config-*.json"]
+    )
+    assert "/etc/openapi-proxy/swagger-config-*.json" == args.swagger_config
+
+
+def test_get_parser_routes():
+    parser = get_parser()
+    assert parser.parse_args([]).routes is None
+
+    args = parser.parse_args(["--routes=/etc/openapi-proxy/routes*.json"])
+    assert "/etc/openapi-proxy/routes*.json" == args.routes
+
+
+def test_get_parser_search():
+    parser = get_parser()
+    assert not parser.parse_args([]).search
+
+    args = parser.parse_args(["--search", "--search-max-postings=1000"])
+    assert args.search
+    assert 1000 == args.search_max_postings
+
+
+def test_get_parser_merged_spec():
+    parser = get_parser()
+    assert not parser.parse_args([]).merged_spec
+    assert parser.parse_args(["--merged-spec"]).merged_spec
+
+
+def test_get_parser_history():
+    parser = get_parser()
+    assert parser.parse_args([]).history_dir is None
+
+    args = parser.parse_args(
+        ["--history-dir=/var/lib/openapi-proxy", "--history-max-versions=5"]
+    )
+    assert "/var/lib/openapi-proxy" == args.history_dir
+    assert 5 == args.history_max_versions
+
+
+def test_get_parser_tracing():
+    parser = get_parser()
+
+    args = parser.parse_args([])
+    assert args.metrics_by_service
+    assert not args.tracing
+
+    args = parser.parse_args(["--no-metrics-by-service", "--tracing"])
+    assert not args.metrics_by_service
+    assert args.tracing
@@ -0,0 +1,94 @@
+import gzip
+import json
+from unittest.mock import MagicMock
+
+import pytest
+from werkzeug.http import parse_accept_header
+
+from openapi_proxy.cache import CacheEntry
+from openapi_proxy.compress import COMPRESSORS, MIN_SIZE, compress, negotiate
+
+SPEC = {"paths": {f"/things/{i}": {"get": {"summary": "Get"}} for i in range(100)}}
+
+
+def test_compress_small_body():
+    assert {} == compress(b"{}")
+
+
+def test_compress():
+    body = json.dumps(SPEC).encode()
+    assert MIN_SIZE <= len(body)
+
+    variants = compress(body)
+
+    assert set(COMPRESSORS) == set(variants)
+    assert body == gzip.decompress(variants["gzip"])
+    # compression is deterministic
+    assert variants["gzip"] == compress(body)["gzip"]
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [
+        ("", None),
+        ("identity", None),
+        ("gzip, deflate", "gzip"),
+        ("gzip;q=0.5, br", "br"),
+        ("gzip, br;q=0", "gzip"),
+    ],
+)
+def test_negotiate(accept_encoding, expected):
+    variants = {"br": b"", "gzip": b""}
+
+    assert expected == negotiate(parse_accept_header(accept_encoding), variants)
+
+
+def test_entry_size_includes_variants():
+    entry = CacheEntry(json.dumps(SPEC).encode())
+
+    assert len(entry.body) + len(entry.variants["gzip"]) <= entry.size
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    mock_session = MagicMock()
+
+    def get(**kwargs):
+        response = MagicMock(status_code=200, headers={})
+        response.content = json.dumps(SPEC).encode()
+        return response
+
+    mock_session.get = get
+    monkeypatch.setattr("openapi_proxy.main.upstream.session", mock_session)
+
+
+def test_get_spec_gzip(client, upstream):
+    resp = client.get(
+        "/svc-ns/openapi.json",
+        headers={"ServerHost": "svc.ns", "Accept-Encoding": "gzip"},
+    )
+
+    assert 200 == resp.status_code
+    assert "gzip" == resp.headers["Content-Encoding"]
+    assert "Accept-Encoding" in resp.headers["Vary"]
+    assert SPEC["paths"] == json.loads(gzip.decompress(resp.data))["paths"]
+
+    etag = resp.headers["ETag"]
+    resp = client.get(
+        "/svc-ns/openapi.json",
+        headers={
+            "ServerHost": "svc.ns",
+            "Accept-Encoding": "gzip",
+            "If-None-Match": etag,
+        },
+    )
+
+    assert 304 == resp.status_code
+
+
+def test_get_spec_identity(client, upstream):
+    resp = client.get("/svc-ns/openapi.json", headers={"ServerHost": "svc.ns"})
+
+    assert "Content-Encoding" not in resp.headers
+    assert "Accept-Encoding" in resp.headers["Vary"]
+    assert SPEC["paths"] == resp.json["paths"]
@@ -0,0 +1,204 @@
+import itertools
+import json
+import os
+import threading
+
+import pytest
+
+from openapi_proxy.cache import CacheEntry
+from openapi_proxy.history import SpecHistory, diff_specs
+
+SPEC_PATH = "/svc-ns/openapi.json"
+
+
+def entry(spec):
+    return CacheEntry(json.dumps(spec).encode())
+
+
+def spec(version):
+    return {"info": {"version": str(version)}, "paths": {f"/v{version}": {"get": {}}}}
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = SpecHistory(
+        str(tmp_path), max_versions=3, clock=itertools.count(1000).__next__
+    )
+    yield history
+    history.close()
+
+
+def stored_specs(history):
+    return sorted(
+        filename
+        for (_, _, filenames) in os.walk(os.path.join(history.directory, "specs"))
+        for filename in filenames
+    )
+
+
+def test_diff_specs():
+    old = {
+        "info": {"version": "1"},
+        "paths": {"/a": {"get": {}, "post": {}}, "/b/c": {"get": {}}},
+        "tags": ["a"],
+    }
+    new = {
+        "info": {"version": "2"},
+        "paths": {"/a": {"get": {}}, "/b/c": {"get": {"x": 1}}, "/d": {"put": {}}},
+        "tags": ["a", "b"],
+    }
+
+    assert {
+        "operations": {"added": ["PUT /d"], "removed": ["POST /a"]},
+        "changes": [
+            {"op": "changed", "path": "/info/version"},
+            {"op": "removed", "path": "/paths/~1a/post"},
+            {"op": "added", "path": "/paths/~1b~1c/get/x"},
+            {"op": "added", "path": "/paths/~1d"},
+            {"op": "changed", "path": "/tags"},
+        ],
+    } == diff_specs(old, new)
+
+
+def test_record_only_changes(history):
+    assert history.record(SPEC_PATH, entry(spec(1)))
+    assert not history.record(SPEC_PATH, entry(spec(1)))
+    assert history.record(SPEC_PATH, entry(spec(2)))
+
+    versions = history.versions("svc-ns")
+    assert [entry(spec(2)).etag, entry(spec(1)).etag] == [
+        version["hash"] for version in versions
+    ]
+    assert [1001, 1000] == [version["fetched_at"] for version in versions]
+    assert spec(2) == json.loads(history.spec(versions[0]["hash"]))
+
+
+def test_record_deduplicates(history):
+    history.record(SPEC_PATH, entry(spec(1)))
+    history.record(SPEC_PATH, entry(spec(2)))
+    history.record(SPEC_PATH, entry(spec(1)))
+    history.record("/other-ns/openapi.json", entry(spec(1)))
+
+    assert 3 == len(history.versions("svc-ns"))
+    assert 2 == len(stored_specs(history))
+
+
+def test_versions_before(history):
+    for version in range(3):
+        history.record(SPEC_PATH, entry(spec(version)))
+
+    assert [1001, 1000] == [
+        version["fetched_at"] for version in history.versions("svc-ns", before=1002)
+    ]
+    assert [1002] == [
+        version["fetched_at"] for version in history.versions("svc-ns", limit=1)
+    ]
+    assert [] == history.versions("other-ns")
+
+
+def test_eviction(history):
+    for version in range(5):
+        history.record(SPEC_PATH, entry(spec(version)))
+    history.diff(entry(spec(2)).etag, entry(spec(3)).etag)
+
+    history.record(SPEC_PATH, entry(spec(5)))
+
+    assert [1005, 1004, 1003] == [
+        version["fetched_at"] for version in history.versions("svc-ns")
+    ]
+    assert 3 == len(stored_specs(history))
+    assert not history.has_version("svc-ns", entry(spec(2)).etag)
+    assert 0 == history._db.execute("SELECT COUNT(*) FROM diffs").fetchone()[0]
+
+
+def test_eviction_keeps_shared_specs(history):
+    history.record("/other-ns/openapi.json", entry(spec(0)))
+    for version in range(4):
+        history.record(SPEC_PATH, entry(spec(version)))
+
+    assert 4 == len(stored_specs(history))
+    assert spec(0) == json.loads(history.spec(entry(spec(0)).etag))
+
+
+def test_diff_memoized(history, monkeypatch):
+    history.record(SPEC_PATH, entry(spec(1)))
+    history.record(SPEC_PATH, entry(spec(2)))
+    old, new = entry(spec(1)).etag, entry(spec(2)).etag
+
+    diff = history.diff(old, new)
+    assert ["GET /v2"] == json.loads(diff)["operations"]["added"]
+
+    monkeypatch.setattr("openapi_proxy.history.diff_specs", None)
+    assert diff == history.diff(old, new)
+
+
+def test_history_persists(tmp_path):
+    history = SpecHistory(str(tmp_path))
+    history.record(SPEC_PATH, entry(spec(1)))
+    history.close()
+
+    history = SpecHistory(str(tmp_path))
+    assert not history.record(SPEC_PATH, entry(spec(1)))
+    history.close()
+
+
+def test_history_endpoints(client, history, monkeypatch):
+    monkeypatch.setattr("openapi_proxy.main.spec_history", history)
+    history.record(SPEC_PATH, entry(spec(1)))
+    history.record(SPEC_PATH, entry(spec(2)))
+    old, new = entry(spec(1)).etag, entry(spec(2)).etag
+
+    resp = client.get("/-/history/svc-ns?limit=1")
+    assert [new] == [version["hash"] for version in resp.json["versions"]]
+
+    resp = client.get(f"/-/history/svc-ns/{old}")
+    assert spec(1) == resp.json
+    resp = client.get(f"/-/history/svc-ns/{old}", headers={"If-None-Match": old})
+    assert 304 == resp.status_code
+    assert 404 == client.get(f"/-/history/other-ns/{old}").status_code
+
+    resp = client.get("/-/history/svc-ns/diff")
+    assert ["GET /v1"] == resp.json["operations"]["removed"]
+    resp = client.get(f"/-/history/svc-ns/diff?from={new}&to={old}")
+    assert ["GET /v1"] == resp.json["operations"]["added"]
+    assert 404 == client.get("/-/history/other-ns/diff").status_code
+    assert 404 == client.get(f"/-/history/svc-ns/diff?from={old}&to=x").status_code
+
+
+def test_history_endpoints_version_evicted(client, history, monkeypatch):
+    monkeypatch.setattr("openapi_proxy.main.spec_history", history)
+    history.record(SPEC_PATH, entry(spec(1)))
+    history.record(SPEC_PATH, entry(spec(2)))
+    old, new = entry(spec(1)).etag, entry(spec(2)).etag
+    # the version is evicted between looking it up and reading it
+    os.remove(history._spec_path(old))
+
+    assert 404 == client.get(f"/-/history/svc-ns/{old}").status_code
+    assert 404 == client.get(f"/-/history/svc-ns/diff?from={old}&to={new}").status_code
+
+
+def test_history_not_configured(client):
+    assert 404 == client.get("/-/history/svc-ns").status_code
+
+
+def test_record_shared_by_workers(tmp_path):
+    # as gunicorn workers do, each with its own connection
+    workers = [SpecHistory(str(tmp_path)) for _ in range(4)]
+    barrier = threading.Barrier(len(workers))
+    recorded = []
+
+    def record(history):
+        barrier.wait()
+        recorded.append(history.record(SPEC_PATH, entry(spec(1))))
+
+    threads = [threading.Thread(target=record, args=(h,)) for h in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [True, False, False, False] == sorted(recorded, reverse=True)
+    assert 1 == len(workers[0].versions("svc-ns"))
+    assert [] == [name for name in stored_specs(workers[0]) if name.endswith(".tmp")]
+    for history in workers:
+        history.close()
@@ -0,0 +1,232 @@
+import json
+
+import pytest
+
+from openapi_proxy.cache import CacheEntry
+from openapi_proxy.merge import MergedSpec, base_path, namespace, spec_members
+from openapi_proxy.metrics import SKIPPED_SPECS
+from openapi_proxy.rewrite import rewrite_servers
+
+PETS = {
+    "openapi": "3.0.0",
+    "servers": [{"url": "/v1"}],
+    "security": [{"api_key": []}],
+    "paths": {
+        "/pets/{petId}": {
+            "parameters": [{"$ref": "#/components/parameters/PetId"}],
+            "get": {
+                "operationId": "getPet",
+                "responses": {
+                    "200": {
+                        "content": {
+                            "application/json": {
+                                "schema": {"$ref": "#/components/schemas/Pet"}
+                            }
+                        }
+                    }
+                },
+            },
+            "delete": {"security": [], "responses": {}},
+        }
+    },
+    "components": {
+        "schemas": {
+            "Pet": {"properties": {"owner": {"$ref": "#/components/schemas/User"}}},
+            "User": {"type": "object"},
+        },
+        "parameters": {"PetId": {"name": "petId", "in": "path"}},
+        "securitySchemes": {"api_key": {"type": "apiKey"}},
+    },
+}
+
+STORES = {
+    "openapi": "3.0.0",
+    "paths": {"/": {"get": {"operationId": "getPet", "responses": {}}}},
+    "components": {"schemas": {"Pet": {"type": "string"}}},
+}
+
+
+def entry(spec, base):
+    return CacheEntry(rewrite_servers(json.dumps(spec).encode(), base))
+
+
+@pytest.fixture
+def merged():
+    merged = MergedSpec()
+    merged.update("/pets-ns/openapi.json", entry(PETS, "pets-ns/openapi.json"))
+    merged.update("/stores-ns/openapi.json", entry(STORES, "stores-ns/openapi.json"))
+    return merged
+
+
+@pytest.mark.parametrize(
+    "servers, expected",
+    [
+        ([{"url": "/svc-ns/v1/"}], "/svc-ns/v1"),
+        ([{"url": "/svc-ns"}], "/svc-ns"),
+        ([{"url": "/svc-nshttps://example.com/api"}], "/svc-ns/api"),
+        (None, "/svc-ns"),
+    ],
+)
+def test_base_path(servers, expected):
+    assert expected == base_path({"servers": servers}, "svc-ns")
+
+
+def test_namespace():
+    value = {
+        "$ref": "#/components/schemas/Pet",
+        "items": [{"$ref": "other.json#/Pet"}],
+        "discriminator": {
+            "propertyName": "kind",
+            "mapping": {"cat": "#/components/schemas/Cat", "dog": "Dog"},
+        },
+        "example": {"operationId": "getUser"},
+    }
+
+    assert {
+        "$ref": "#/components/schemas/svc-ns.Pet",
+        "items": [{"$ref": "other.json#/Pet"}],
+        "discriminator": {
+            "propertyName": "kind",
+            "mapping": {"cat": "#/components/schemas/svc-ns.Cat", "dog": "svc-ns.Dog"},
+        },
+        "example": {"operationId": "getUser"},
+    } == namespace(value, "svc-ns.")
+
+
+def test_spec_members_property_names():
+    schema = {
+        "properties": {
+            "mapping": {"type": "object", "description": "a map"},
+            "discriminator": {"type": "string"},
+            "operationId": {"type": "string", "example": "getPet"},
+        }
+    }
+    spec = {
+        "paths": {
+            "/": {
+                "get": {
+                    "operationId": "getPet",
+                    "responses": {
+                        "200": {"links": {"self": {"operationId": "getPet"}}}
+                    },
+                    "callbacks": {
+                        "done": {"{$url}": {"post": {"operationId": "done"}}}
+                    },
+                }
+            }
+        },
+        "components": {
+            "schemas": {"M": schema},
+            "links": {"Pet": {"operationId": "getPet"}},
+        },
+    }
+
+    members = spec_members("/svc-ns/openapi.json", spec)
+
+    get = json.loads("{" + members["paths"][0] + "}")["/svc-ns/"]["get"]
+    assert "svc-ns.getPet" == get["operationId"]
+    assert "svc-ns.getPet" == get["responses"]["200"]["links"]["self"]["operationId"]
+    assert "svc-ns.done" == get["callbacks"]["done"]["{$url}"]["post"]["operationId"]
+    assert {"svc-ns.M": schema} == json.loads("{" + members["schemas"][0] + "}")
+    assert {"svc-ns.Pet": {"operationId": "svc-ns.getPet"}} == json.loads(
+        "{" + members["links"][0] + "}"
+    )
+
+
+def test_merged_spec(merged):
+    spec = json.loads(merged.entry().body)
+
+    assert "3.0.3" == spec["openapi"]
+    assert ["/"] == [server["url"] for server in spec["servers"]]
+    assert ["/pets-ns/v1/pets/{petId}", "/stores-ns/"] == list(spec["paths"])
+
+    pet = spec["paths"]["/pets-ns/v1/pets/{petId}"]
+    assert [{"$ref": "#/components/parameters/pets-ns.PetId"}] == pet["parameters"]
+    assert "pets-ns.getPet" == pet["get"]["operationId"]
+    assert [{"pets-ns.api_key": []}] == pet["get"]["security"]
+    assert [] == pet["delete"]["security"]
+    assert (
+        "#/components/schemas/pets-ns.Pet"
+        == pet["get"]["responses"]["200"]["content"]["application/json"]["schema"][
+            "$ref"
+        ]
+    )
+    assert "stores-ns.getPet" == spec["paths"]["/stores-ns/"]["get"]["operationId"]
+
+    assert {
+        "pets-ns.Pet": {
+            "properties": {"owner": {"$ref": "#/components/schemas/pets-ns.User"}}
+        },
+        "pets-ns.User": {"type": "object"},
+        "stores-ns.Pet": {"type": "string"},
+    } == spec["components"]["schemas"]
+    assert ["pets-ns.api_key"] == list(spec["components"]["securitySchemes"])
+
+
+def test_merged_spec_skips_swagger_2():
+    merged = MergedSpec()
+    merged.update(
+        "/svc-ns/swagger.json",
+        entry({"swagger": "2.0", "paths": {"/a": {}}}, "svc-ns/swagger.json"),
+    )
+
+    assert {} == json.loads(merged.entry().body)["paths"]
+
+
+@pytest.mark.parametrize("body", [[PETS], "spec", None])
+def test_merged_spec_skips_non_objects(merged, body):
+    skipped = SKIPPED_SPECS.labels("merge")._value.get()
+
+    merged.update("/pets-ns/openapi.json", CacheEntry(json.dumps(body).encode()))
+    merged.update("/pets-ns/openapi.json", CacheEntry(json.dumps(body).encode()))
+
+    assert ["/stores-ns/"] == list(json.loads(merged.entry().body)["paths"])
+    assert skipped + 1 == SKIPPED_SPECS.labels("merge")._value.get()
+
+
+def test_merged_spec_rebuilt_on_change(merged, monkeypatch):
+    first = merged.entry()
+    assert first is merged.entry()
+
+    calls = []
+    monkeypatch.setattr(
+        "openapi_proxy.merge.spec_members",
+        lambda *args: calls.append(args) or {},
+    )
+
+    # unchanged specs are not merged again
+    merged.update("/pets-ns/openapi.json", entry(PETS, "pets-ns/openapi.json"))
+    assert first is merged.entry()
+    assert [] == calls
+
+    merged.update(
+        "/stores-ns/openapi.json",
+        entry(dict(STORES, paths={}), "stores-ns/openapi.json"),
+    )
+    assert 1 == len(calls)
+    assert first.etag != merged.entry().etag
+
+
+def test_merged_spec_remove(merged):
+    merged.remove("/pets-ns/openapi.json")
+
+    spec = json.loads(merged.entry().body)
+    assert ["/stores-ns/"] == list(spec["paths"])
+    assert ["stores-ns.Pet"] == list(spec["components"]["schemas"])
+
+
+def test_get_merged_spec(client, merged, monkeypatch):
+    monkeypatch.setattr("openapi_proxy.main.merged_spec", merged)
+
+    resp = client.get("/-/merged/openapi.json")
+    assert 200 == resp.status_code
+    assert 2 == len(resp.json["paths"])
+
+    resp = client.get(
+        "/-/merged/openapi.json", headers={"If-None-Match": resp.headers["ETag"]}
+    )
+    assert 304 == resp.status_code
+
+
+def test_get_merged_spec_not_configured(client):
+    assert 404 == client.get("/-/merged/openapi.json").status_code
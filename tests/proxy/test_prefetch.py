@@ -0,0 +1,142 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+import pytest
+
+from openapi_proxy import prefetch
+from openapi_proxy.main import forget_spec, prefetch_spec
+from openapi_proxy.prefetch import Prefetcher, Target, backoff, read_manifest
+
+TARGET = Target("/svc-ns/v1/openapi.json", "http://svc.ns:80")
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    path = tmp_path / "specs.json"
+    path.write_text(json.dumps({"specs": [TARGET._asdict()]}))
+    return path
+
+
+def test_read_manifest(manifest):
+    assert {TARGET} == read_manifest(manifest)
+
+
+@pytest.mark.parametrize("failures", [1, 2, 10, 100])
+def test_backoff(failures):
+    delay = min(prefetch.BACKOFF_BASE_SECONDS * 2 ** (failures - 1), 600)
+
+    assert delay / 2 <= backoff(failures) <= delay
+
+
+def test_load_manifest_spreads_first_fetches(manifest):
+    prefetcher = Prefetcher(str(manifest), MagicMock(), interval=30)
+
+    prefetcher.load_manifest()
+
+    assert {TARGET} == prefetcher.targets
+    assert [] == prefetcher.due(0)
+    assert [TARGET] == prefetcher.due(float("inf"))
+
+
+def test_load_manifest_drops_removed_specs(manifest):
+    removed = MagicMock()
+    prefetcher = Prefetcher(str(manifest), MagicMock(), removed=removed)
+    prefetcher.load_manifest()
+
+    manifest.write_text(json.dumps({"specs": []}))
+    prefetcher._manifests = None
+    prefetcher.load_manifest()
+
+    assert set() == prefetcher.targets
+    assert [] == prefetcher.due(float("inf"))
+    removed.assert_called_once_with(TARGET)
+
+
+def test_load_manifest_shards(tmp_path):
+    other = Target("/svc-other/openapi.json", "http://svc.other:80")
+    for (shard, target) in enumerate([TARGET, other]):
+        path = tmp_path / f"specs-{shard}.json"
+        path.write_text(json.dumps({"specs": [target._asdict()]}))
+
+    prefetcher = Prefetcher(str(tmp_path / "specs*.json"), MagicMock())
+    prefetcher.load_manifest()
+
+    assert {TARGET, other} == prefetcher.targets
+
+
+def test_load_manifest_missing(tmp_path):
+    prefetcher = Prefetcher(str(tmp_path / "specs.json"), MagicMock())
+
+    prefetcher.load_manifest()
+
+    assert set() == prefetcher.targets
+
+
+def test_fetch_schedules_next_fetch(manifest):
+    prefetch_mock = MagicMock()
+    prefetcher = Prefetcher(str(manifest), prefetch_mock, interval=30)
+    prefetcher.load_manifest()
+
+    with ThreadPoolExecutor() as executor:
+        prefetcher._due[TARGET] = 0
+        prefetcher.run_once(executor)
+
+    prefetch_mock.assert_called_once_with(TARGET)
+    assert [] == prefetcher.due(prefetch.time.monotonic() + 29)
+    assert [TARGET] == prefetcher.due(prefetch.time.monotonic() + 34)
+
+
+def test_fetch_backs_off(manifest):
+    prefetcher = Prefetcher(
+        str(manifest), MagicMock(side_effect=ValueError("down")), interval=30
+    )
+    prefetcher.load_manifest()
+
+    for failures in [1, 2, 3]:
+        prefetcher.fetch(TARGET)
+        assert failures == prefetcher._failures[TARGET]
+
+    # the third retry waits 10-20s, sooner than the interval
+    assert [TARGET] == prefetcher.due(prefetch.time.monotonic() + 21)
+
+    prefetcher.prefetch = MagicMock()
+    prefetcher.fetch(TARGET)
+    assert TARGET not in prefetcher._failures
+
+
+def test_prefetch_spec_warms_cache(client, monkeypatch):
+    mock_session = MagicMock()
+    calls = []
+
+    def get(**kwargs):
+        calls.append(kwargs)
+
+        response = MagicMock(status_code=200, headers={})
+        response.content = json.dumps({"servers": [{"url": "/v1"}]}).encode()
+        return response
+
+    mock_session.get = get
+    monkeypatch.setattr("openapi_proxy.main.upstream.session", mock_session)
+
+    prefetch_spec(TARGET)
+
+    resp = client.get(
+        "/svc-ns/v1/openapi.json", headers={"ServerHost": "http://svc.ns:80"}
+    )
+
+    assert 1 == len(calls)
+    assert "http://svc.ns:80/v1/openapi.json" == calls[0]["url"]
+    assert "/svc-ns/v1" == resp.json["servers"][0]["url"]
+
+
+def test_prefetch_spec_merges_and_forgets(monkeypatch):
+    merged = MagicMock()
+    monkeypatch.setattr("openapi_proxy.main.merged_spec", merged)
+    monkeypatch.setattr("openapi_proxy.main.spec_cache", MagicMock())
+
+    prefetch_spec(TARGET)
+    forget_spec(TARGET)
+
+    assert TARGET.path == merged.update.call_args[0][0]
+    merged.remove.assert_called_once_with(TARGET.path)
@@ -1,17 +1,9 @@
+import json
 from unittest.mock import MagicMock
 
 import pytest
 import requests
 
-from openapi_proxy.main import app
-
-
-@pytest.fixture
-def client():
-    app.config["TESTING"] = True
-    with app.app_context():
-        yield app.test_client()
-
 
 def test_healthz_200(client):
     resp = client.get("/healthz")
@@ -23,7 +15,7 @@ def test_healthz_200(client):
     [pytest.param("openapi", id="openapi"), pytest.param("swagger", id="swagger")],
 )
 def test_replace_servers_ok(client, monkeypatch, api_type):
-    mock_requests = MagicMock()
+    mock_session = MagicMock()
 
     calls = []
 
@@ -31,11 +23,11 @@ def test_replace_servers_ok(client, monkeypatch, api_type):
         calls.append(kwargs)
 
         response = MagicMock()
-        response.json.return_value = {}
+        response.content = json.dumps({}).encode()
         return response
 
-    mock_requests.get = get
-    monkeypatch.setattr("openapi_proxy.main.requests", mock_requests)
+    mock_session.get = get
+    monkeypatch.setattr("openapi_proxy.main.upstream.session", mock_session)
 
     resp = client.get(f"/svc-ns/{api_type}.json", headers={"ServerHost": "svc.ns"})
 
@@ -51,7 +43,7 @@ def test_replace_servers_ok(client, monkeypatch, api_type):
 
 
 def test_replace_servers_append_base_to_existing(client, monkeypatch):
-    mock_requests = MagicMock()
+    mock_session = MagicMock()
 
     calls = []
 
@@ -59,11 +51,13 @@ def test_replace_servers_append_base_to_existing(client, monkeypatch):
         calls.append(kwargs)
 
         response = MagicMock()
-        response.json.return_value = {"servers": [{"url": "/v1", "description": "foo"}]}
+        response.content = json.dumps(
+            {"servers": [{"url": "/v1", "description": "foo"}]}
+        ).encode()
         return response
 
-    mock_requests.get = get
-    monkeypatch.setattr("openapi_proxy.main.requests", mock_requests)
+    mock_session.get = get
+    monkeypatch.setattr("openapi_proxy.main.upstream.session", mock_session)
 
     resp = client.get("/svc-ns/openapi.json", headers={"ServerHost": "svc.ns"})
 
@@ -80,7 +74,7 @@ def test_replace_servers_append_base_to_existing(client, monkeypatch):
 
 
 def test_replace_servers_keep_extra_base_path(client, monkeypatch):
-    mock_requests = MagicMock()
+    mock_session = MagicMock()
 
     calls = []
 
@@ -88,11 +82,11 @@ def test_replace_servers_keep_extra_base_path(client, monkeypatch):
         calls.append(kwargs)
 
         response = MagicMock()
-        response.json.return_value = {}
+        response.content = json.dumps({}).encode()
         return response
 
-    mock_requests.get = get
-    monkeypatch.setattr("openapi_proxy.main.requests", mock_requests)
+    mock_session.get = get
+    monkeypatch.setattr("openapi_proxy.main.upstream.session", mock_session)
 
     client.get("/svc-ns/v1/openapi.json", headers={"ServerHost": "svc.ns"})
 
@@ -107,7 +101,7 @@ def test_replace_servers_missing_server_host(client):
 
 
 def test_replace_servers_request_error(client, monkeypatch):
-    mock_requests = MagicMock()
+    mock_session = MagicMock()
 
     calls = []
 
@@ -116,14 +110,14 @@ def test_replace_servers_request_error(client, monkeypatch):
 
         response = MagicMock()
         response.status_code = 404
-        response.json.return_value = {}
+        response.content = json.dumps({}).encode()
         response.raise_for_status.side_effect = requests.exceptions.HTTPError(
             "404 Client Error", response=response
         )
         return response
 
-    mock_requests.get = get
-    monkeypatch.setattr("openapi_proxy.main.requests", mock_requests)
+    mock_session.get = get
+    monkeypatch.setattr("openapi_proxy.main.upstream.session", mock_session)
 
     resp = client.get("/svc-ns/v1/openapi.json", headers={"ServerHost": "svc.ns"})
 
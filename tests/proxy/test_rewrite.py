@@ -0,0 +1,152 @@
+import json
+import time
+
+import pytest
+
+from openapi_proxy.rewrite import replace_servers, rewrite_servers
+
+SPECS = [
+    pytest.param({}, id="empty"),
+    pytest.param({"openapi": "3.0.0", "info": {"title": "t"}}, id="no-servers"),
+    pytest.param(
+        {"openapi": "3.0.0", "servers": [{"url": "/v1", "description": "foo"}]},
+        id="servers",
+    ),
+    pytest.param({"servers": None, "paths": {}}, id="null-servers"),
+    pytest.param({"servers": [], "paths": {}}, id="empty-servers"),
+    pytest.param(
+        {
+            "info": {"description": 'mentions "servers" and \\ a {brace'},
+            "paths": {
+                "/a": {"servers": [{"url": "/nested"}], "get": {"tags": ["x", "]"]}}
+            },
+            "x-numbers": [1, 2.5e3, -3, True, False, None],
+        },
+        id="nested-servers-only",
+    ),
+    pytest.param(
+        {
+            "paths": {"/a": {"servers": [{"url": "/nested"}]}},
+            "x-string": 'é中"\\/',
+            "servers": [{"url": "https://example.com/api"}],
+            "components": {"schemas": {"S": {"type": "object"}}},
+        },
+        id="servers-after-nested",
+    ),
+    pytest.param(
+        {
+            "info": {"title": "servers", "description": '\\"servers": ["{'},
+            "x-escaped": "\\",
+            "servers": [{"url": "/v1"}],
+        },
+        id="servers-in-strings",
+    ),
+]
+
+
+@pytest.mark.parametrize("spec", SPECS)
+@pytest.mark.parametrize("indent", [None, 2])
+def test_rewrite_servers_matches_full_parse(spec, indent):
+    body = json.dumps(spec, indent=indent, ensure_ascii=False).encode()
+
+    rewritten = json.loads(rewrite_servers(body, "svc-ns/v1"))
+
+    assert replace_servers(json.loads(body), "svc-ns/v1") == rewritten
+
+
+ESCAPED_SPECS = [
+    pytest.param(
+        {"info": {"description": "a\nb\tc/d é"}, "servers": [{"url": "/v1"}]},
+        id="escapes",
+    ),
+    pytest.param(
+        {
+            "a\\a": {"}\n": True},
+            "servers": [],
+            "info": {"é\n": 1, '"servers"a': {"servers": 1}},
+        },
+        id="escapes-around-servers",
+    ),
+    pytest.param(
+        {
+            "info": {"description": 'line\n"servers": [{\u00e9', "x": "]\\"},
+            "paths": {"/a\n": {"servers": [{"url": "/nested"}]}},
+        },
+        id="escapes-no-servers",
+    ),
+]
+
+
+@pytest.mark.parametrize("spec", ESCAPED_SPECS)
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+def test_rewrite_servers_escapes_in_place(spec, ensure_ascii, monkeypatch):
+    body = json.dumps(spec, ensure_ascii=ensure_ascii).encode()
+    expected = replace_servers(json.loads(body), "svc-ns")
+
+    def full_parse(spec, base_path):
+        raise AssertionError("parsed in full")
+
+    monkeypatch.setattr("openapi_proxy.rewrite.replace_servers", full_parse)
+    rewritten = rewrite_servers(body, "svc-ns")
+
+    members = json.loads(rewritten, object_pairs_hook=lambda pairs: pairs)
+    assert 1 == [key for (key, _) in members].count("servers")
+    assert expected == json.loads(rewritten)
+
+
+def test_rewrite_servers_keeps_other_bytes():
+    body = b'{\n  "info" : {"title": "caf\xc3\xa9"},\n  "servers": [{"url": "/v1"}],\n  "z": 1}'
+
+    rewritten = rewrite_servers(body, "svc-ns")
+
+    assert rewritten.startswith(
+        b'{\n  "info" : {"title": "caf\xc3\xa9"},\n  "servers": '
+    )
+    assert rewritten.endswith(b',\n  "z": 1}')
+    assert [{"url": "/svc-ns/v1", "description": "Not real base path"}] == json.loads(
+        rewritten
+    )["servers"]
+
+
+def test_rewrite_servers_inserts_first():
+    rewritten = rewrite_servers(b'{"openapi": "3.0.0"}', "svc-ns")
+
+    assert rewritten.startswith(b'{"servers": ')
+    assert "3.0.0" == json.loads(rewritten)["openapi"]
+
+
+def test_rewrite_servers_falls_back_to_full_parse():
+    rewritten = rewrite_servers(b'\xef\xbb\xbf{"openapi": "3.0.0"}', "svc-ns")
+
+    assert "/svc-ns" == json.loads(rewritten)["servers"][0]["url"]
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        pytest.param(b"<html>not found</html>", id="not-json"),
+        pytest.param(b'{"servers" "missing colon"}', id="invalid"),
+        pytest.param(b'{"servers": {"url": "/v1"}}', id="servers-object"),
+        pytest.param(b'{"a": {"servers": "x}}', id="unterminated-string"),
+        pytest.param(b'{"openapi": "3.0.0", "paths": {"/a": {', id="truncated"),
+        pytest.param(
+            b'{"openapi": "3.0.0", "info": {"title": "t', id="truncated-string"
+        ),
+        pytest.param(
+            b'{"paths": {}, "servers": [{"url": "/v1"}', id="truncated-servers"
+        ),
+    ],
+)
+def test_rewrite_servers_invalid(body):
+    with pytest.raises(Exception):
+        rewrite_servers(body, "svc-ns")
+
+
+def test_rewrite_servers_invalid_in_linear_time():
+    body = b'{"a": [' + b"1" * 100000 + b' "servers"'
+
+    start = time.perf_counter()
+    with pytest.raises(Exception):
+        rewrite_servers(body, "svc-ns")
+
+    assert time.perf_counter() - start < 1
@@ -0,0 +1,85 @@
+import json
+import os
+
+import pytest
+
+from openapi_proxy.routes import Destination, RouteTable
+
+ROUTE = {
+    "host": "svc-ns",
+    "backend": "svc.ns.svc.cluster.local:8000",
+    "spec_path": "/svc-ns/v1/openapi.json",
+    "server_host": "http://svc.ns:8000",
+}
+
+
+def write_routes(path, routes, mtime):
+    path.write_text(json.dumps({"routes": routes}))
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def table(tmp_path, clock):
+    write_routes(tmp_path / "routes-0.json", [ROUTE], 1)
+    return RouteTable(str(tmp_path / "routes-*.json"), clock=clock)
+
+
+@pytest.mark.parametrize(
+    "uri,expected",
+    [
+        (
+            "/svc-ns/v1/openapi.json",
+            Destination("proxy", "/svc-ns/v1/openapi.json", "http://svc.ns:8000"),
+        ),
+        (
+            "/svc-ns/v1/things?page=2",
+            Destination("svc.ns.svc.cluster.local:8000", "/v1/things", None),
+        ),
+        ("/svc-ns", Destination("svc.ns.svc.cluster.local:8000", "/svc-ns", None)),
+        ("/other-ns/things", Destination("ui", "/other-ns/things", None)),
+        ("/", Destination("ui", "/", None)),
+    ],
+)
+def test_destination(table, uri, expected):
+    assert expected == table.destination(uri)
+
+
+def test_destination_follows_changes(tmp_path, table):
+    table.destination("/")
+
+    other = dict(ROUTE, host="other-ns", backend="other.ns.svc.cluster.local:80")
+    write_routes(tmp_path / "routes-1.json", [other], 2)
+
+    # not checked again within a second
+    assert "ui" == table.destination("/other-ns/things").backend
+
+    table.clock.now += 1
+    assert "other.ns.svc.cluster.local:80" == table.destination("/other-ns/x").backend
+
+    os.unlink(tmp_path / "routes-0.json")
+    table.clock.now += 1
+    assert "ui" == table.destination("/svc-ns/x").backend
+
+
+def test_destination_keeps_routes_on_invalid_file(tmp_path, table):
+    table.destination("/")
+
+    (tmp_path / "routes-1.json").write_text("{")
+    table.clock.now += 1
+
+    assert "ui" != table.destination("/svc-ns/x").backend
+
+
+def test_get_route(client, table, monkeypatch):
+    monkeypatch.setattr("openapi_proxy.main.route_table", table)
+
+    resp = client.get("/-/route", headers={"X-Original-URI": "/svc-ns/v1/openapi.json"})
+
+    assert 204 == resp.status_code
+    assert "proxy" == resp.headers["X-Openapi-Backend"]
+    assert "/svc-ns/v1/openapi.json" == resp.headers["X-Openapi-Uri"]
+    assert "http://svc.ns:8000" == resp.headers["X-Openapi-Server-Host"]
+
+
+def test_get_route_not_configured(client):
+    assert 404 == client.get("/-/route").status_code
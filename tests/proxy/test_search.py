@@ -0,0 +1,177 @@
+import json
+
+import pytest
+
+from openapi_proxy.cache import CacheEntry
+from openapi_proxy.metrics import SKIPPED_SPECS
+from openapi_proxy.search import Document, SearchIndex, tokenize
+
+SPEC = {
+    "openapi": "3.0.0",
+    "tags": [{"name": "pets", "description": "Everything about pets"}],
+    "paths": {
+        "/pets/{petId}": {
+            "parameters": [],
+            "get": {
+                "operationId": "getPetById",
+                "summary": "Find a pet",
+                "tags": ["pets"],
+            },
+            "delete": {"summary": "Delete a pet"},
+        },
+        "/stores": {"get": {"operationId": "listStores"}},
+    },
+    "components": {"schemas": {"Pet": {"description": "A pet"}, "Store": {}}},
+}
+
+
+def entry(spec):
+    return CacheEntry(json.dumps(spec).encode())
+
+
+@pytest.fixture
+def index():
+    index = SearchIndex()
+    index.update("/petstore-ns/openapi.json", entry(SPEC))
+    return index
+
+
+def test_tokenize():
+    assert {"getpetbyid", "get", "pet", "by", "id"} == tokenize("getPetById")
+    assert {"pets", "petid"} == tokenize("/pets/{petId}") - {"pet", "id"}
+    assert set() == tokenize(None)
+
+
+def test_search_operation(index):
+    (document,) = index.search("getPetById")
+
+    assert (
+        Document(
+            "/petstore-ns/openapi.json",
+            "operation",
+            "getPetById",
+            "get",
+            "/pets/{petId}",
+            "Find a pet",
+        )
+        == document
+    )
+
+
+def test_search_ranks_names_first(index):
+    names = [document.name for document in index.search("pet")]
+
+    assert ["Pet", "getPetById", "pets"] == names[:3]
+    assert "DELETE /pets/{petId}" in names
+
+
+def test_search_prefix_and_terms(index):
+    assert ["listStores"] == [document.name for document in index.search("list sto")]
+    assert ["Store", "listStores"] == [
+        document.name for document in index.search("sto")
+    ]
+    assert [] == index.search("pet store")
+    assert [] == index.search("")
+
+
+def test_search_limit(index):
+    assert 2 == len(index.search("pet", limit=2))
+
+
+def test_update_only_when_changed(index, monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        "openapi_proxy.search.spec_documents",
+        lambda *args: calls.append(args) or [],
+    )
+
+    index.update("/petstore-ns/openapi.json", entry(SPEC))
+    assert [] == calls
+
+    index.update("/petstore-ns/openapi.json", entry(dict(SPEC, paths={})))
+    assert 1 == len(calls)
+
+
+def test_update_replaces_documents(index):
+    index.update("/petstore-ns/openapi.json", entry({"paths": {}}))
+
+    assert [] == index.search("pet")
+    assert {
+        "specs": 1,
+        "documents": 0,
+        "tokens": 0,
+        "postings": 0,
+        "max_postings": index.max_postings,
+    } == index.stats()
+
+
+def test_remove(index):
+    index.update("/other-ns/openapi.json", entry(SPEC))
+
+    index.remove("/petstore-ns/openapi.json")
+
+    assert {"/other-ns/openapi.json"} == {
+        document.spec for document in index.search("pet")
+    }
+    assert 1 == index.stats()["specs"]
+
+
+def test_max_postings():
+    index = SearchIndex(max_postings=20)
+
+    index.update("/petstore-ns/openapi.json", entry(SPEC))
+
+    assert [] == index.search("pet")
+    assert 0 == index.stats()["postings"]
+
+
+@pytest.mark.parametrize("body", [[SPEC], "spec", None])
+def test_update_skips_non_objects(index, body):
+    skipped = SKIPPED_SPECS.labels("search")._value.get()
+
+    index.update("/petstore-ns/openapi.json", entry(body))
+    index.update("/petstore-ns/openapi.json", entry(body))
+
+    assert [] == index.search("pet")
+    assert skipped + 1 == SKIPPED_SPECS.labels("search")._value.get()
+
+
+def test_max_postings_rejection_cached(monkeypatch):
+    index = SearchIndex(max_postings=20)
+    index.update("/petstore-ns/openapi.json", entry(SPEC))
+    loads = []
+    monkeypatch.setattr(
+        "openapi_proxy.search.json.loads", lambda body: loads.append(body) or SPEC
+    )
+
+    # the same spec is not parsed again, unless it may now fit
+    index.update("/petstore-ns/openapi.json", entry(SPEC))
+    assert [] == loads
+    index.max_postings = 1000
+    index.update("/petstore-ns/openapi.json", entry(SPEC))
+    assert 1 == len(loads)
+    assert index.search("pet")
+
+
+def test_tokens_sorted_across_updates(index):
+    index.update("/other-ns/openapi.json", entry({"paths": {"/zebras": {"get": {}}}}))
+    index.update("/another-ns/openapi.json", entry({"paths": {"/apes": {"get": {}}}}))
+    index.remove("/petstore-ns/openapi.json")
+
+    assert sorted(index._tokens) == index._tokens
+    assert set(index._postings) == set(index._tokens)
+    assert ["GET /apes"] == [document.name for document in index.search("ape")]
+
+
+def test_search_endpoint(client, index, monkeypatch):
+    monkeypatch.setattr("openapi_proxy.main.search_index", index)
+
+    resp = client.get("/-/search?q=stores&limit=1")
+
+    assert 200 == resp.status_code
+    assert ["listStores"] == [result["name"] for result in resp.json["results"]]
+    assert 1 == client.get("/-/search/stats").json["specs"]
+
+
+def test_search_endpoint_not_configured(client):
+    assert 404 == client.get("/-/search?q=pet").status_code
@@ -0,0 +1,30 @@
+from openapi_proxy.cmd import get_parser
+from openapi_proxy.main import app
+from openapi_proxy.server import ProxyServer, gunicorn_options
+
+
+def test_gunicorn_options():
+    args = get_parser().parse_args(
+        ["--port=8000", "--workers=2", "--threads=4", "--max-requests=1000"]
+    )
+
+    options = gunicorn_options(args)
+
+    assert "0.0.0.0:8000" == options["bind"]
+    assert "gthread" == options["worker_class"]
+    assert 2 == options["workers"]
+    assert 4 == options["threads"]
+    assert 1000 == options["max_requests"]
+    assert 100 == options["max_requests_jitter"]
+    assert options["accesslog"] is None
+
+
+def test_proxy_server():
+    args = get_parser().parse_args(["--threads=4", "--graceful-timeout=10"])
+
+    server = ProxyServer(app, gunicorn_options(args))
+
+    assert app is server.load()
+    assert 4 == server.cfg.threads
+    assert 10 == server.cfg.graceful_timeout
+    assert "gthread" in str(server.cfg.worker_class_str)
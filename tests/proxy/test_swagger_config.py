@@ -0,0 +1,65 @@
+import json
+import os
+
+from openapi_proxy.swagger_config import SwaggerConfig
+
+
+def write_fragment(path, names, mtime):
+    path.write_text(
+        json.dumps({"urls": [{"name": name, "url": f"/{name}"} for name in names]})
+    )
+    os.utime(path, (mtime, mtime))
+
+
+def test_entry_merges_fragments(tmp_path):
+    write_fragment(tmp_path / "swagger-config-0.json", ["b", "d"], 1)
+    write_fragment(tmp_path / "swagger-config-1.json", ["c", "a"], 1)
+    config = SwaggerConfig(str(tmp_path / "swagger-config-*.json"))
+
+    entry = config.entry()
+
+    names = [url["name"] for url in json.loads(entry.body)["urls"]]
+    assert ["a", "b", "c", "d"] == names
+    assert entry is config.entry()
+
+
+def test_entry_rebuilt_on_change(tmp_path):
+    write_fragment(tmp_path / "swagger-config-0.json", ["a"], 1)
+    config = SwaggerConfig(str(tmp_path / "swagger-config-*.json"))
+    entry = config.entry()
+
+    write_fragment(tmp_path / "swagger-config-0.json", ["b"], 2)
+
+    assert entry.etag != config.entry().etag
+    assert "b" == json.loads(config.entry().body)["urls"][0]["name"]
+
+
+def test_entry_kept_while_fragment_replaced(tmp_path, monkeypatch):
+    write_fragment(tmp_path / "swagger-config-0.json", ["a"], 1)
+    config = SwaggerConfig(str(tmp_path / "swagger-config-*.json"))
+    entry = config.entry()
+
+    # the fragment is listed, but removed before it is read
+    monkeypatch.setattr(
+        "openapi_proxy.swagger_config.glob.glob",
+        lambda pattern: [str(tmp_path / "swagger-config-1.json")],
+    )
+
+    assert entry is config.entry()
+
+
+def test_get_swagger_config_not_configured(client):
+    assert 404 == client.get("/-/swagger-config.json").status_code
+
+
+def test_get_swagger_config(client, tmp_path, monkeypatch):
+    write_fragment(tmp_path / "swagger-config-0.json", ["a"], 1)
+    monkeypatch.setattr(
+        "openapi_proxy.main.swagger_config",
+        SwaggerConfig(str(tmp_path / "swagger-config-*.json")),
+    )
+
+    resp = client.get("/-/swagger-config.json")
+
+    assert 200 == resp.status_code
+    assert {"urls": [{"name": "a", "url": "/a"}]} == resp.json
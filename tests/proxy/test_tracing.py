@@ -0,0 +1,146 @@
+import json
+from contextlib import contextmanager
+from unittest.mock import MagicMock
+
+import pytest
+from prometheus_client import REGISTRY
+
+from openapi_proxy import tracing
+from openapi_proxy.tracing import NO_TRACE, Trace, current
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(f"openapi_proxy_{name}", labels) or 0
+
+
+@pytest.fixture
+def upstream_session(monkeypatch):
+    session = MagicMock()
+    session.calls = []
+
+    def get(**kwargs):
+        session.calls.append(kwargs)
+        response = MagicMock(status_code=200, headers={})
+        response.content = json.dumps({"openapi": "3.0.0"}).encode()
+        response.iter_content.return_value = [response.content]
+        return response
+
+    session.get = get
+    monkeypatch.setattr("openapi_proxy.main.upstream.session", session)
+    return session
+
+
+class FakeTracer:
+    def __init__(self):
+        self.spans = []
+
+    @contextmanager
+    def start_as_current_span(self, name, attributes, context=None):
+        self.spans.append(name)
+        yield
+
+
+class FakePropagate:
+    @staticmethod
+    def extract(headers):
+        return headers.get("traceparent")
+
+    @staticmethod
+    def inject(headers):
+        headers["traceparent"] = "00-trace-span-01"
+
+
+def test_current():
+    assert NO_TRACE is current()
+
+    with Trace("outer", "svc-ns") as outer:
+        assert outer is current()
+        with Trace("inner", "svc-ns") as inner:
+            assert inner is current()
+        assert outer is current()
+
+    assert NO_TRACE is current()
+
+
+def test_phase():
+    count = sample("phase_duration_seconds_count", service="phase-ns", phase="parse")
+
+    with Trace("test", "phase-ns") as trace:
+        with trace.phase("parse"):
+            pass
+        with trace.phase("parse"):
+            pass
+
+    assert {"parse"} == set(trace.durations)
+    assert count + 2 == sample(
+        "phase_duration_seconds_count", service="phase-ns", phase="parse"
+    )
+
+
+def test_no_trace_records_nothing():
+    with NO_TRACE.phase("parse"):
+        NO_TRACE.cache_status = "hit"
+
+    assert {} == NO_TRACE.durations
+    assert NO_TRACE.cache_status is None
+
+
+def test_metrics_by_service(monkeypatch):
+    monkeypatch.setattr("openapi_proxy.tracing.metrics_by_service", False)
+
+    assert "" == Trace("test", "svc-ns").service
+
+
+def test_get_spec_cache_status(client, upstream_session):
+    headers = {"ServerHost": "http://svc.status:80"}
+    misses = sample("cache_results_total", service="svc-status", status="miss")
+    hits = sample("cache_results_total", service="svc-status", status="hit")
+    sizes = sample("response_size_bytes_count", service="svc-status")
+
+    resp = client.get("/svc-status/openapi.json", headers=headers)
+    assert "miss" == resp.headers["X-Cache-Status"]
+
+    resp = client.get("/svc-status/openapi.json", headers=headers)
+    assert "hit" == resp.headers["X-Cache-Status"]
+
+    assert misses + 1 == sample(
+        "cache_results_total", service="svc-status", status="miss"
+    )
+    assert hits + 1 == sample("cache_results_total", service="svc-status", status="hit")
+    assert sizes + 2 == sample("response_size_bytes_count", service="svc-status")
+    for phase in ["ttfb", "download", "rewrite", "compress"]:
+        assert 1 == sample(
+            "phase_duration_seconds_count", service="svc-status", phase=phase
+        )
+
+
+def test_get_spec_error_status(client, monkeypatch):
+    def get(**kwargs):
+        raise Exception("unreachable")
+
+    monkeypatch.setattr("openapi_proxy.main.upstream.get", get)
+    errors = sample("cache_results_total", service="svc-error", status="error")
+
+    resp = client.get("/svc-error/openapi.json", headers={"ServerHost": "svc.error"})
+
+    assert 500 == resp.status_code
+    assert errors + 1 == sample(
+        "cache_results_total", service="svc-error", status="error"
+    )
+
+
+def test_get_spec_spans(client, upstream_session, monkeypatch):
+    tracer = FakeTracer()
+    monkeypatch.setattr("openapi_proxy.tracing.tracer", tracer)
+    monkeypatch.setattr("openapi_proxy.tracing.propagate", FakePropagate, raising=False)
+
+    client.get("/svc-ns/openapi.json", headers={"ServerHost": "http://svc.ns:80"})
+
+    assert ["get_spec", "upstream", "download", "rewrite", "compress"] == tracer.spans
+    assert "00-trace-span-01" == upstream_session.calls[0]["headers"]["traceparent"]
+
+
+def test_enable_tracing_without_opentelemetry(monkeypatch):
+    monkeypatch.setattr("openapi_proxy.tracing.otel_trace", None)
+
+    assert not tracing.enable_tracing()
@@ -0,0 +1,143 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+from prometheus_client import REGISTRY
+
+from openapi_proxy.metrics import UPSTREAM_CONNECTIONS, UPSTREAM_TIMEOUTS
+from openapi_proxy.tracing import Trace
+from openapi_proxy.upstream import Upstream, UpstreamTimeout
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/slow":
+            time.sleep(0.5)
+
+        body = b'{"openapi": "3.0.0"}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+
+        if self.path == "/trickle":
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for _ in range(5):
+                self.wfile.write(b"1\r\n \r\n")
+                self.wfile.flush()
+                time.sleep(0.1)
+            self.wfile.write(b"0\r\n\r\n")
+            return
+
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        if self.path.startswith("/stall"):
+            # stalls in the middle of the body
+            self.wfile.write(body[:10])
+            self.wfile.flush()
+            time.sleep(0.5)
+            self.wfile.write(body[10:])
+            return
+
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def timeouts(timeout):
+    return UPSTREAM_TIMEOUTS.labels(timeout)._value.get()
+
+
+def test_get_reuses_connections(server_url):
+    upstream = Upstream()
+    connections = UPSTREAM_CONNECTIONS._value.get()
+
+    for _ in range(3):
+        resp = upstream.get(f"{server_url}/openapi.json")
+        assert {"openapi": "3.0.0"} == resp.json()
+
+    assert connections + 1 == UPSTREAM_CONNECTIONS._value.get()
+
+
+def test_get_read_timeout(server_url):
+    upstream = Upstream(read_timeout=0.1)
+    read_timeouts = timeouts("read")
+
+    with pytest.raises(requests.Timeout):
+        upstream.get(f"{server_url}/slow")
+
+    assert read_timeouts + 1 == timeouts("read")
+
+
+def test_get_read_timeout_in_body(server_url):
+    upstream = Upstream(read_timeout=0.1)
+    read_timeouts = timeouts("read")
+
+    with pytest.raises(requests.ReadTimeout):
+        upstream.get(f"{server_url}/stall")
+
+    assert read_timeouts + 1 == timeouts("read")
+
+
+def test_get_total_timeout(server_url):
+    upstream = Upstream(total_timeout=0.2)
+    total_timeouts = timeouts("total")
+
+    with pytest.raises(UpstreamTimeout):
+        upstream.get(f"{server_url}/trickle")
+
+    assert total_timeouts + 1 == timeouts("total")
+
+
+def test_get_spec_timeout(client, monkeypatch):
+    def get(**kwargs):
+        raise UpstreamTimeout("too slow")
+
+    monkeypatch.setattr("openapi_proxy.main.upstream.get", get)
+
+    resp = client.get("/svc-ns/openapi.json", headers={"ServerHost": "svc.ns"})
+
+    assert 504 == resp.status_code
+
+
+def test_get_spec_timeout_in_body(client, server_url, monkeypatch):
+    monkeypatch.setattr("openapi_proxy.main.upstream", Upstream(read_timeout=0.1))
+
+    resp = client.get("/svc-ns/stall/openapi.json", headers={"ServerHost": server_url})
+
+    assert 504 == resp.status_code
+
+
+def test_metrics(client):
+    resp = client.get("/metrics")
+
+    assert 200 == resp.status_code
+    assert b"openapi_proxy_upstream_requests_total" in resp.data
+
+
+def test_get_records_phases(server_url):
+    upstream = Upstream()
+
+    with Trace("test", "svc-upstream") as trace:
+        upstream.get(f"{server_url}/openapi.json")
+        upstream.get(f"{server_url}/openapi.json")
+
+    assert {"connect", "ttfb", "download"} == set(trace.durations)
+    assert 2 == REGISTRY.get_sample_value(
+        "openapi_proxy_phase_duration_seconds_count",
+        {"service": "svc-upstream", "phase": "ttfb"},
+    )
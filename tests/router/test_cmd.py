@@ -0,0 +1,29 @@
+from openapi_router.cmd import get_parser
+
+
+def test_get_parser():
+    parser = get_parser()
+
+    args = parser.parse_args([])
+    assert "/etc/nginx/conf.d" == args.conf_dir
+    assert 1 == args.quiet_period
+    assert 10 == args.max_wait
+    assert 5 == args.min_interval
+    assert 9101 == args.metrics_port
+
+    args = parser.parse_args(
+        [
+            "--debug",
+            "--conf-dir=/tmp/conf.d",
+            "--quiet-period=0.5",
+            "--max-wait=3",
+            "--min-interval=2",
+            "--metrics-port=0",
+        ]
+    )
+    assert args.debug
+    assert "/tmp/conf.d" == args.conf_dir
+    assert 0.5 == args.quiet_period
+    assert 3 == args.max_wait
+    assert 2 == args.min_interval
+    assert 0 == args.metrics_port
@@ -0,0 +1,53 @@
+import subprocess
+from unittest.mock import MagicMock
+
+from openapi_router.main import main
+from openapi_router.reload import ReloadController
+
+
+def test_main_reloads_config_written_at_start(tmp_path, monkeypatch):
+    conf = tmp_path / "default.conf"
+    conf.write_text("initial")
+    watchers = []
+    reloads = []
+
+    def run(command, **kwargs):
+        if command == ["nginx", "-T"]:
+            return subprocess.CompletedProcess(command, 0, conf.read_bytes(), b"")
+        reloads.append(command)
+        return subprocess.CompletedProcess(command, 0)
+
+    class MockNginx:
+        def __init__(self, command):
+            # the collector writes its config as nginx starts
+            conf.write_text("collected")
+            for notify in watchers:
+                notify()
+            self.polls = 0
+            self.returncode = 0
+
+        def poll(self):
+            self.polls += 1
+            return None if self.polls < 5 else 0
+
+    monkeypatch.setattr(
+        "openapi_router.main.ReloadController",
+        lambda *args, **kwargs: ReloadController(*args, run=run, **kwargs),
+    )
+    monkeypatch.setattr(
+        "openapi_router.main.watch", lambda conf_dir, notify: watchers.append(notify)
+    )
+    monkeypatch.setattr("openapi_router.main.subprocess.Popen", MockNginx)
+    monkeypatch.setattr("openapi_router.main.signal.signal", MagicMock())
+    monkeypatch.setattr("openapi_router.main.TICK_SECONDS", 0.01)
+
+    main(
+        [
+            f"--conf-dir={tmp_path}",
+            "--quiet-period=0",
+            "--min-interval=0",
+            "--metrics-port=0",
+        ]
+    )
+
+    assert [["nginx", "-s", "reload"]] == reloads
@@ -0,0 +1,114 @@
+import subprocess
+from unittest.mock import MagicMock
+
+import pytest
+
+from openapi_router.metrics import ReloadMetrics
+from openapi_router.reload import ReloadController
+
+
+def completed(returncode=0, stdout=b"", stderr=b""):
+    return subprocess.CompletedProcess([], returncode, stdout, stderr)
+
+
+@pytest.fixture
+def run():
+    return MagicMock(return_value=completed(stdout=b"config"))
+
+
+@pytest.fixture
+def controller(clock, run):
+    return ReloadController(
+        ReloadMetrics(),
+        quiet_period=1,
+        max_wait=10,
+        min_interval=5,
+        run=run,
+        clock=clock,
+    )
+
+
+def test_nothing_pending(controller):
+    assert controller.next_reload() is None
+    assert not controller.wait(0)
+
+
+def test_burst_is_coalesced(controller, clock):
+    controller.notify()
+    clock.now += 0.5
+    controller.notify()
+
+    assert 101.5 == controller.next_reload()
+    assert not controller.wait(0)
+
+    clock.now += 1
+    assert controller.wait(0)
+    assert controller.next_reload() is None
+    assert 2 == controller.metrics.events
+
+
+def test_max_wait(controller, clock):
+    controller.notify()
+    for _ in range(20):
+        clock.now += 0.9
+        controller.notify()
+
+    assert 110 == controller.next_reload()
+
+
+def test_min_interval(controller, clock, run):
+    controller.notify()
+    clock.now += 1
+    assert controller.wait(0)
+    assert "reloaded" == controller.reload()
+
+    controller.notify()
+    assert 106 == controller.next_reload()
+
+
+def test_reload(controller, run):
+    assert "reloaded" == controller.reload()
+
+    run.assert_any_call(["nginx", "-T"], capture_output=True)
+    run.assert_called_with(["nginx", "-s", "reload"])
+    assert 1 == controller.metrics.reloads["reloaded"]
+
+
+def test_reload_unchanged(controller, run):
+    controller.prime()
+
+    assert "unchanged" == controller.reload()
+
+    assert 2 == run.call_count
+    assert 1 == controller.metrics.reloads["unchanged"]
+
+
+def test_reload_invalid(controller, run):
+    run.return_value = completed(returncode=1, stderr=b"emerg")
+
+    assert "invalid" == controller.reload()
+
+    run.assert_called_once_with(["nginx", "-T"], capture_output=True)
+    assert controller.config_hash is None
+
+
+def test_reload_failed(controller, run):
+    run.side_effect = [completed(stdout=b"config"), completed(returncode=1)]
+
+    assert "failed" == controller.reload()
+
+    # the next change retries the reload
+    assert controller.config_hash is None
+    assert controller._last_reload is None
+
+
+def test_metrics_render(controller, run):
+    controller.notify()
+    controller.reload()
+
+    rendered = controller.metrics.render()
+
+    assert "openapi_router_config_events_total 1\n" in rendered
+    assert 'openapi_router_reloads_total{result="reloaded"} 1\n' in rendered
+    assert 'openapi_router_reloads_total{result="invalid"} 0\n' in rendered
+    assert "openapi_router_reload_duration_seconds_count 1\n" in rendered